@@ -1,24 +1,33 @@
 from flask import Flask
 from flask_cors import CORS
-from routes import api
+from routes import api, get_metrics, warm_configured_repos
 from config import logger, ENVIRONMENT
+from timing import TimedJSONProvider
 import os
 
 def create_app():
     """Create and configure the Flask application"""
     app = Flask(__name__)
+    # Time JSON serialization for the Server-Timing header
+    app.json = TimedJSONProvider(app)
     
     # Configure CORS to allow requests from your Vercel frontend
-    CORS(app, resources={r"/api/*": {"origins": "https://changes-five.vercel.app"}})
+    # The frontend reads X-Request-ID so users can quote it when reporting a slow or failed request
+    CORS(app, resources={r"/api/*": {"origins": "https://changes-five.vercel.app"}}, expose_headers=['X-Request-ID'])
     
     # Register blueprints
     app.register_blueprint(api, url_prefix='/api')
+    app.add_url_rule('/metrics', view_func=get_metrics)
+
+    # Warm the cache for the configured repositories without delaying startup
+    warm_configured_repos()
     
     # Log application startup
     logger.info(f"Flask application created successfully in {ENVIRONMENT} environment")
     
     return app
 
+# Development server only; production runs wsgi:app under gunicorn (see gunicorn.conf.py)
 if __name__ == '__main__':
     app = create_app()
     port = int(os.getenv('PORT', 5000))
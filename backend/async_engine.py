@@ -0,0 +1,279 @@
+import asyncio
+import atexit
+import contextvars
+import http
+import json
+import threading
+import time
+from requests.utils import parse_header_links
+from config import (GITHUB_API, github_headers, PER_PAGE, REQUEST_TIMEOUT, ASYNC_MAX_IN_FLIGHT, ASYNC_MAX_CONNECTIONS,
+                    logger, page_logger)
+from controllers import conditional_cache, get_last_page, list_kind, milestones_query, issues_query
+from rate_limit import rate_limiter, current_priority, BACKGROUND
+from token_pool import token_pool
+from single_flight import coalesce
+import metrics
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# Mirrors the Retry policy of http_client.create_session
+RETRY_STATUSES = (500, 502, 503, 504)
+MAX_RETRIES = 3
+
+def parse_links(link_header):
+    """Parse a Link header into the {rel: {'url', 'rel'}} shape of requests' Response.links"""
+    links = {}
+    for link in parse_header_links(link_header or ''):
+        links[link.get('rel') or link.get('url')] = link
+    return links
+
+class AsyncFetchEngine:
+    """
+    Fetches from the GitHub API with aiohttp on one event loop running in a
+    background thread, so hundreds of upstream requests can be in flight at
+    once without a thread each. Sync code calls in through run().
+    """
+
+    def __init__(self, max_in_flight, max_connections):
+        self.max_in_flight = max_in_flight
+        self.max_connections = max_connections
+        self._loop = None
+        self._session = None
+        self._semaphore = None
+        self._interactive_idle = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self):
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    rate_limiter.add_idle_listener(lambda: loop.call_soon_threadsafe(self._wake_background))
+                    threading.Thread(target=loop.run_forever, name='async-fetch-engine', daemon=True).start()
+                    logger.info(f"Started async fetch engine (max_in_flight={self.max_in_flight}, max_connections={self.max_connections})")
+                    self._loop = loop
+        return self._loop
+
+    async def _in_context(self, context, coro):
+        # Tasks copy the loop thread's context, so the caller's rate limit priority and metrics are set again here
+        for var, value in context.items():
+            var.set(value)
+        return await coro
+
+    def run(self, coro):
+        """Run a coroutine on the engine's loop and wait for its result from sync code"""
+        future = asyncio.run_coroutine_threadsafe(self._in_context(contextvars.copy_context(), coro), self._ensure_loop())
+        return future.result()
+
+    def _get_session(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+            )
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+            self._interactive_idle = asyncio.Event()
+        return self._session
+
+    def _wake_background(self):
+        if self._interactive_idle is not None:
+            self._interactive_idle.set()
+
+    def _in_flight_limit(self):
+        self._get_session()
+        return self._semaphore
+
+    async def _acquire(self, token):
+        """Wait on the event loop until the rate limiter allows a request"""
+        if current_priority() == BACKGROUND:
+            # Yield to interactive requests without blocking the loop, until the limiter says the last one is done
+            self._get_session()
+            deadline = time.monotonic() + rate_limiter.background_max_wait
+            while True:
+                # Cleared before the check, so a release in between still wakes the wait below
+                self._interactive_idle.clear()
+                remaining = deadline - time.monotonic()
+                if not rate_limiter.interactive_in_flight() or remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self._interactive_idle.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+        wait, error = rate_limiter.claim(token, defer=False)
+        if not error and wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                # The claim is counted as in flight, and _send only releases it once the request is sent
+                rate_limiter.release(token)
+                raise
+        return error
+
+    async def _send(self, url, params, token, extra_headers):
+        """Send one GET, returning (status, headers, body, rate_limit_error)"""
+        for attempt in range(MAX_RETRIES + 1):
+            limit_error = await self._acquire(token)
+            if limit_error:
+                return None, {}, b'', limit_error
+            started = time.perf_counter()
+            try:
+                headers = dict(github_headers(token), **extra_headers)
+                async with self._get_session().get(url, params=params, headers=headers) as response:
+                    status, response_headers, body = response.status, response.headers, await response.read()
+            except (asyncio.TimeoutError, aiohttp.ClientError):
+                metrics.record_upstream('aiohttp', 'GET', url, 'error', time.perf_counter() - started, params=params)
+                raise
+            finally:
+                rate_limiter.release(token)
+            metrics.record_upstream('aiohttp', 'GET', url, status, time.perf_counter() - started, 1 if attempt else 0,
+                                    params)
+
+            limit_error = rate_limiter.update(token, status, response_headers)
+            if limit_error:
+                if attempt == 0:
+                    # The next _acquire waits for the budget to come back, if it does in time
+                    continue
+                return status, response_headers, body, limit_error
+            if status in RETRY_STATUSES and attempt < MAX_RETRIES:
+                await asyncio.sleep(2 ** attempt)
+                continue
+            return status, response_headers, body, None
+
+    async def fetch_page(self, url, params=None, conditional=True):
+        """Coroutine version of controllers.fetch_github_page, returning (data, status_code, error, links)"""
+        params = {key: str(value) for key, value in (params or {}).items()}
+        cache_key = conditional_cache.make_key(url, params)
+        validators = conditional_cache.conditional_headers(cache_key) if conditional else {}
+        try:
+            async with self._in_flight_limit():
+                token = token_pool.read_token()
+                status, headers, body, limit_error = await self._send(url, params, token, validators)
+                if status in (401, 403) and not limit_error:
+                    token_pool.report_rejected(token, status)
+                    other_token = token_pool.read_token(exclude=(token,))
+                    if other_token:
+                        logger.warning(f"Retrying {url} with another token after {status}")
+                        status, headers, body, limit_error = await self._send(url, params, other_token, validators)
+        except asyncio.TimeoutError:
+            error_msg = f"Request timed out after {REQUEST_TIMEOUT} seconds for URL: {url}"
+            logger.error(error_msg)
+            return None, http.HTTPStatus.REQUEST_TIMEOUT, error_msg, {}
+        except aiohttp.ClientError as e:
+            error_msg = f"Connection error occurred for URL: {url} - {str(e)}"
+            logger.error(error_msg)
+            return None, http.HTTPStatus.SERVICE_UNAVAILABLE, error_msg, {}
+
+        if limit_error:
+            logger.error(f"Rate limited for {url}: {limit_error}")
+            return None, http.HTTPStatus.TOO_MANY_REQUESTS, limit_error, {}
+        if status == 304:
+            cached = conditional_cache.not_modified(cache_key)
+            if cached is not None:
+                page_logger.debug("Not modified, serving cached response for %s", url)
+                data, links = cached
+                return data, http.HTTPStatus.OK, None, links
+            # The entry was evicted while the request was in flight; fetch it in full
+            return await self.fetch_page(url, params, conditional=False)
+        if status == 404:
+            logger.error(f"Resource not found: {url} - Status: {status}")
+            return None, status, "Resource not found", {}
+        if status == 403:
+            logger.error(f"Access denied for {url} - Status: {status}, Response: {body[:200]}")
+            return None, status, "Access denied", {}
+        if status != 200:
+            text = body.decode('utf-8', 'replace')
+            logger.error(f"GitHub API error for {url} - Status: {status}, Response: {text[:200]}")
+            return None, status, text, {}
+
+        data = json.loads(body)
+        links = parse_links(headers.get('Link'))
+        conditional_cache.store_parts(cache_key, headers, data, links, len(body))
+        return data, http.HTTPStatus.OK, None, links
+
+    async def fetch_all_pages(self, url, params, label='items'):
+        """
+        Coroutine version of controllers.fetch_all_pages. After page 1 every
+        remaining page is requested at once; the engine's semaphore bounds
+        how many are actually in flight.
+        """
+        data, status_code, error, links = await self.fetch_page(url, dict(params, per_page=PER_PAGE, page=1))
+        if data is None:
+            logger.error(f"Failed to fetch {label} on page 1: {error}")
+            return None, status_code, error
+        all_items = list(data)
+
+        last_page = get_last_page(links)
+        if last_page is None:
+            # No Link header; walk pages one at a time until a short page
+            page = 1
+            while len(data) == PER_PAGE:
+                page += 1
+                data, status_code, error, _ = await self.fetch_page(url, dict(params, per_page=PER_PAGE, page=page))
+                if data is None:
+                    logger.error(f"Failed to fetch {label} on page {page}: {error}")
+                    return None, status_code, error
+                all_items.extend(data)
+            metrics.pages_per_fetch.observe(page, list_kind(url))
+            return all_items, http.HTTPStatus.OK, None
+
+        logger.debug(f"Fetching {last_page} pages of {label} on the event loop")
+        results = await asyncio.gather(*(self.fetch_page(url, dict(params, per_page=PER_PAGE, page=page))
+                                         for page in range(2, last_page + 1)))
+        for page, (data, status_code, error, _) in enumerate(results, start=2):
+            if data is None:
+                logger.error(f"Failed to fetch {label} on page {page}: {error}")
+                return None, status_code, error
+            all_items.extend(data)
+        metrics.pages_per_fetch.observe(last_page, list_kind(url))
+        return all_items, http.HTTPStatus.OK, None
+
+    async def fetch_many(self, urls):
+        """Fetch several single resources concurrently, returning [(data, status_code, error), ...] in order"""
+        results = await asyncio.gather(*(self.fetch_page(url) for url in urls))
+        return [(data, status_code, error) for data, status_code, error, _ in results]
+
+    async def _close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def close(self):
+        """Close the engine's HTTP session and stop its loop"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+
+engine = AsyncFetchEngine(ASYNC_MAX_IN_FLIGHT, ASYNC_MAX_CONNECTIONS)
+atexit.register(engine.close)
+
+def available():
+    """Check whether the optional aiohttp dependency is installed"""
+    return aiohttp is not None
+
+@coalesce
+def get_all_branches(owner, repo):
+    """Drop-in replacement for controllers.get_all_branches running on the event loop"""
+    url = f"{GITHUB_API}/repos/{owner}/{repo}/branches"
+    return engine.run(engine.fetch_all_pages(url, {}, label=f"branches for {owner}/{repo}"))
+
+@coalesce
+def get_all_milestones(owner, repo):
+    """Drop-in replacement for controllers.get_all_milestones running on the event loop"""
+    url, params = milestones_query(owner, repo)
+    return engine.run(engine.fetch_all_pages(url, params, label=f"milestones for {owner}/{repo}"))
+
+@coalesce
+def get_all_issues(owner, repo, milestone):
+    """Drop-in replacement for controllers.get_all_issues running on the event loop"""
+    url, params = issues_query(owner, repo, milestone)
+    return engine.run(engine.fetch_all_pages(url, params, label=f"issues for {owner}/{repo} milestone {milestone}"))
+
+def get_issues(owner, repo, numbers):
+    """Fetch several single issues concurrently, returning [(issue, status_code, error), ...] in order"""
+    return engine.run(engine.fetch_many([f"{GITHUB_API}/repos/{owner}/{repo}/issues/{number}" for number in numbers]))
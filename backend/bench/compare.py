@@ -0,0 +1,59 @@
+import argparse
+import json
+import sys
+
+METRICS = (
+    ('p50 ms', lambda result: result['latency_ms']['p50']),
+    ('p99 ms', lambda result: result['latency_ms']['p99']),
+    ('upstream/req', lambda result: result['upstream_calls_per_request']),
+    ('peak KiB', lambda result: result['peak_traced_bytes'] / 1024)
+)
+
+def load(path):
+    with open(path) as f:
+        report = json.load(f)
+    return {(result['repo'], result['endpoint'], result['scenario']): result for result in report['results']}
+
+def change(before, after):
+    if before == after:
+        return 0.0
+    if not before:
+        return float('inf')
+    return (after - before) / before
+
+def main():
+    """Compare two benchmark result files and flag regressions"""
+    parser = argparse.ArgumentParser(description='Compare two bench.run result files')
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Relative p50 or upstream call increase reported as a regression')
+    parser.add_argument('--min-ms', type=float, default=1.0,
+                        help='Smallest absolute p50 increase reported as a regression, to ignore timer noise')
+    args = parser.parse_args()
+
+    baseline, candidate = load(args.baseline), load(args.candidate)
+    regressions = []
+    print(f"{'repo':<16} {'endpoint':<22} {'scenario':<10} " + ' '.join(f"{name:>22}" for name, _ in METRICS))
+    for key in sorted(baseline.keys() & candidate.keys()):
+        cells = []
+        for name, metric in METRICS:
+            before, after = metric(baseline[key]), metric(candidate[key])
+            relative = change(before, after)
+            cells.append(f"{before:>8.2f} -> {after:>8.2f} {relative:>+4.0%}")
+            if name == 'p50 ms' and after - before < args.min_ms:
+                continue
+            if name in ('p50 ms', 'upstream/req') and relative > args.threshold:
+                regressions.append((key, name, relative))
+        print(f"{key[0]:<16} {key[1]:<22} {key[2]:<10} " + ' '.join(f"{cell:>22}" for cell in cells))
+
+    for key in sorted(baseline.keys() ^ candidate.keys()):
+        print(f"Only in {'baseline' if key in baseline else 'candidate'}: {' '.join(key)}")
+    if regressions:
+        print(f"\n{len(regressions)} regressions above {args.threshold:.0%}:")
+        for key, name, relative in regressions:
+            print(f"  {' '.join(key)}: {name} {relative:+.0%}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
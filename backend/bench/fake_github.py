@@ -0,0 +1,253 @@
+import argparse
+import base64
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, urlencode
+
+RELEASE_NOTE = "## Release note\n\n- Fixed issue {number} in the changelog generator\n"
+INIT_CONTENT = '"""Auditree central."""\n\n__version__ = \'1.0.0\'\n'
+
+class FakeRepo:
+    """Synthetic repository: every issue belongs to milestone 1, the other milestones are empty"""
+
+    def __init__(self, issues, branches, milestones):
+        self.branches = [{'name': f"branch-{i:05d}", 'commit': {'sha': f"{i:040x}"}, 'protected': False}
+                         for i in range(branches)]
+        self.milestones = [{'number': number, 'title': f"Milestone {number}", 'description': '', 'state': 'open'}
+                           for number in range(1, milestones + 1)]
+        self.issues = [{
+            'number': number,
+            'title': f"Issue {number}",
+            'state': 'closed' if number % 3 else 'open',
+            'created_at': '2024-01-01T00:00:00Z',
+            'closed_at': '2024-02-01T00:00:00Z' if number % 3 else None,
+            'updated_at': f"2024-03-{1 + number % 28:02d}T00:00:00Z",
+            'html_url': f"https://github.example.com/o/r/issues/{number}",
+            'body': RELEASE_NOTE.format(number=number),
+            'milestone': {'number': 1},
+            'user': {'login': 'bench'},
+            'labels': []
+        } for number in range(issues, 0, -1)]
+        self.refs = {'refs/heads/main'}
+        self.next_number = 1
+
+class FakeGitHub:
+    """
+    Local stand-in for the GitHub Enterprise REST API: paginated lists with
+    Link headers, ETags and 304s, rate limit headers, the Git Data and pull
+    request endpoints used by create-pull-request, plus injected latency
+    and 502 errors. GET /_bench/stats reports the requests it served.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, rate_limit=5000, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.repos = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._remaining = rate_limit
+        self._reset_at = int(time.time()) + 3600
+        self._counts = {'requests': 0, 'not_modified': 0, 'errors': 0, 'rate_limited': 0}
+        self._server = None
+
+    def add_repo(self, owner, name, issues, branches, milestones):
+        self.repos[f"{owner}/{name}".lower()] = FakeRepo(issues, branches, milestones)
+
+    def start(self, port=0):
+        """Serve in a background thread and return the API base URL"""
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; without this Nagle adds ~40ms to every response
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                fake.handle(self, 'GET')
+
+            def do_POST(self):
+                fake.handle(self, 'POST')
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self._server.server_port}/api/v3"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts, rate_limit_remaining=self._remaining)
+
+    def _send(self, handler, status, payload=None, headers=None):
+        body = json.dumps(payload).encode() if payload is not None else b''
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _rate_limit_headers(self):
+        return {
+            'X-RateLimit-Limit': str(self.rate_limit),
+            'X-RateLimit-Remaining': str(max(self._remaining, 0)),
+            'X-RateLimit-Reset': str(self._reset_at),
+            'X-RateLimit-Resource': 'core'
+        }
+
+    def handle(self, handler, method):
+        url = urlparse(handler.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        length = int(handler.headers.get('Content-Length') or 0)
+        body = json.loads(handler.rfile.read(length) or b'null') if length else None
+
+        if url.path == '/_bench/stats':
+            return self._send(handler, 200, self.stats())
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self._lock:
+            self._counts['requests'] += 1
+            if self._remaining <= 0:
+                self._counts['rate_limited'] += 1
+                return self._send(handler, 403, {'message': 'API rate limit exceeded'}, self._rate_limit_headers())
+            if method == 'GET' and self._random.random() < self.error_rate:
+                self._counts['errors'] += 1
+                return self._send(handler, 502, {'message': 'Injected error'})
+
+        base = f"http://{handler.headers.get('Host')}/api/v3"
+        status, payload, links = self.route(method, url.path.replace('/api/v3', '', 1), query, body, base)
+        headers = {}
+        if links:
+            headers['Link'] = links
+        if status == 200 and method == 'GET':
+            etag = '"' + hashlib.sha1(json.dumps(payload).encode()).hexdigest() + '"'
+            headers['ETag'] = etag
+            if handler.headers.get('If-None-Match') == etag:
+                # Like GitHub, a 304 doesn't count against the rate limit
+                with self._lock:
+                    self._counts['not_modified'] += 1
+                    headers.update(self._rate_limit_headers())
+                return self._send(handler, 304, None, headers)
+        with self._lock:
+            self._remaining -= 1
+            headers.update(self._rate_limit_headers())
+        self._send(handler, status, payload, headers)
+
+    def _page(self, items, query, base, path):
+        per_page = int(query.get('per_page', 30))
+        page = int(query.get('page', 1))
+        last = max((len(items) + per_page - 1) // per_page, 1)
+        links = []
+        for rel, number in (('next', page + 1), ('last', last)):
+            if page < last:
+                links.append(f'<{base}{path}?{urlencode(dict(query, page=number))}>; rel="{rel}"')
+        return items[(page - 1) * per_page:page * per_page], ', '.join(links)
+
+    def route(self, method, path, query, body, base):
+        """Return (status, payload, Link header) for an API request"""
+        if path == '/user':
+            return 200, {'login': 'bench', 'id': 1}, None
+        match = re.match(r'^/repos/([^/]+)/([^/]+)(/.*)?$', path)
+        repo = match and self.repos.get(f"{match.group(1)}/{match.group(2)}".lower())
+        if repo is None:
+            return 404, {'message': 'Not Found'}, None
+        repo_url = f"{base}/repos/{match.group(1)}/{match.group(2)}"
+        rest = match.group(3) or ''
+
+        if method == 'GET':
+            if rest == '':
+                return 200, {'id': 1, 'name': match.group(2), 'full_name': f"{match.group(1)}/{match.group(2)}",
+                             'url': repo_url, 'default_branch': 'main'}, None
+            if rest == '/branches':
+                page, links = self._page(repo.branches, query, base, path)
+                return 200, page, links
+            if rest == '/milestones':
+                page, links = self._page(repo.milestones, query, base, path)
+                return 200, page, links
+            if rest == '/issues':
+                issues = repo.issues if str(query.get('milestone')) == '1' else []
+                page, links = self._page(issues, query, base, path)
+                return 200, page, links
+            if rest.startswith('/issues/'):
+                number = int(rest.rsplit('/', 1)[1])
+                issue = next((issue for issue in repo.issues if issue['number'] == number), None)
+                return (200, issue, None) if issue else (404, {'message': 'Not Found'}, None)
+            if rest.startswith('/branches/'):
+                # Like GitHub, the nested git commit has no sha of its own, only its URL
+                return 200, {'name': rest.split('/', 2)[2], 'commit': {
+                    'sha': 'c' * 40, 'url': f"{repo_url}/commits/{'c' * 40}",
+                    'commit': {'url': f"{repo_url}/git/commits/{'c' * 40}", 'message': 'Base',
+                               'tree': {'sha': 't' * 40, 'url': f"{repo_url}/git/trees/{'t' * 40}"}}
+                }}, None
+            if rest.startswith('/git/commits/'):
+                sha = rest.rsplit('/', 1)[1]
+                return 200, {'sha': sha, 'url': f"{repo_url}/git/commits/{sha}", 'message': 'Base',
+                             'tree': {'sha': 't' * 40, 'url': f"{repo_url}/git/trees/{'t' * 40}"}}, None
+            if rest.startswith('/git/trees/'):
+                return 200, {'sha': 't' * 40, 'truncated': False, 'tree': [
+                    {'path': 'CHANGES.md', 'mode': '100644', 'type': 'blob', 'sha': 'a' * 40},
+                    {'path': 'auditree_central/__init__.py', 'mode': '100644', 'type': 'blob', 'sha': 'b' * 40}
+                ]}, None
+            if rest.startswith('/git/blobs/'):
+                content = INIT_CONTENT if rest.endswith('b' * 40) else '# Changes\n' * 200
+                return 200, {'sha': rest.rsplit('/', 1)[1], 'encoding': 'base64',
+                             'content': base64.b64encode(content.encode()).decode()}, None
+            return 404, {'message': 'Not Found'}, None
+
+        if rest == '/git/trees':
+            return 201, {'sha': hashlib.sha1(json.dumps(body).encode()).hexdigest(), 'tree': []}, None
+        if rest == '/git/commits':
+            sha = hashlib.sha1(json.dumps(body).encode()).hexdigest()
+            return 201, {'sha': sha, 'url': f"{repo_url}/git/commits/{sha}", 'message': body['message'],
+                         'tree': {'sha': body['tree']}}, None
+        if rest == '/git/refs':
+            with self._lock:
+                if body['ref'] in repo.refs:
+                    return 422, {'message': 'Reference already exists'}, None
+                repo.refs.add(body['ref'])
+            return 201, {'ref': body['ref'], 'object': {'sha': body['sha'], 'type': 'commit'}}, None
+        if rest == '/pulls':
+            with self._lock:
+                number, repo.next_number = repo.next_number, repo.next_number + 1
+            return 201, {'number': number, 'title': body['title'], 'html_url': f"{repo_url}/pull/{number}",
+                         'state': 'open'}, None
+        return 404, {'message': 'Not Found'}, None
+
+def main():
+    """Run the fake GitHub API in the foreground"""
+    parser = argparse.ArgumentParser(description='Serve a fake GitHub REST API for benchmarks')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--repo', action='append', default=[],
+                        help='owner/name:issues:branches:milestones, e.g. bench/small:100:50:5 (repeatable)')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every request')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of GETs answered with a 502')
+    parser.add_argument('--rate-limit', type=int, default=5000)
+    args = parser.parse_args()
+
+    fake = FakeGitHub(args.latency, args.error_rate, args.rate_limit)
+    for spec in args.repo or ['bench/small:100:50:5']:
+        full_name, issues, branches, milestones = spec.split(':')
+        owner, name = full_name.split('/')
+        fake.add_repo(owner, name, int(issues), int(branches), int(milestones))
+    print(f"Fake GitHub API at {fake.start(args.port)}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        fake.stop()
+
+if __name__ == '__main__':
+    main()
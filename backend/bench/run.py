@@ -0,0 +1,200 @@
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+import requests
+from bench.fake_github import FakeGitHub
+
+OWNER = 'bench'
+
+def serve_fake(repos, latency, error_rate, rate_limit, ready):
+    """Run the fake API in its own process, so its data doesn't count towards the app's memory"""
+    fake = FakeGitHub(latency, error_rate, rate_limit)
+    for name, issues, branches, milestones in repos:
+        fake.add_repo(OWNER, name, issues, branches, milestones)
+    ready.put(fake.start())
+    while True:
+        time.sleep(3600)
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    return sorted_values[max(math.ceil(p / 100 * len(sorted_values)) - 1, 0)]
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+class Bench:
+    """Drives the Flask app against the fake API and collects one result per (repo, endpoint, scenario)"""
+
+    def __init__(self, client, stats_url, requests_per_scenario):
+        self.client = client
+        self.stats_url = stats_url
+        self.requests_per_scenario = requests_per_scenario
+        self.results = []
+
+    def upstream_requests(self):
+        return requests.get(self.stats_url, timeout=10).json()['requests']
+
+    def clear_caches(self):
+        # Imported here because config must see the benchmark's environment first
+        import routes
+        from controllers import conditional_cache
+        from github_registry import github_registry
+        routes.response_cache.clear()
+        routes.body_cache.clear()
+        conditional_cache.clear()
+        github_registry.clear()
+
+    def send(self, call, cold):
+        if cold:
+            self.clear_caches()
+        before = self.upstream_requests()
+        started = time.perf_counter()
+        response = call()
+        elapsed = time.perf_counter() - started
+        response.get_data()
+        return elapsed, self.upstream_requests() - before, response.status_code
+
+    def measure(self, repo, size, endpoint, scenario, call, cold=False):
+        """Time call() over the configured number of requests, then trace one more for peak memory"""
+        # One untimed request primes whatever the scenario expects to be warm
+        call()
+        latencies, upstream, errors = [], [], 0
+        for _ in range(self.requests_per_scenario):
+            elapsed, calls, status = self.send(call, cold)
+            latencies.append(elapsed * 1000)
+            upstream.append(calls)
+            errors += status >= 400
+
+        tracemalloc.start()
+        try:
+            self.send(call, cold)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        latencies.sort()
+        result = {
+            'repo': repo,
+            'issues': size['issues'],
+            'branches': size['branches'],
+            'endpoint': endpoint,
+            'scenario': scenario,
+            'requests': len(latencies),
+            'errors': errors,
+            'latency_ms': {
+                'p50': round(percentile(latencies, 50), 3),
+                'p90': round(percentile(latencies, 90), 3),
+                'p99': round(percentile(latencies, 99), 3),
+                'max': round(latencies[-1], 3),
+                'mean': round(sum(latencies) / len(latencies), 3)
+            },
+            'upstream_calls_per_request': round(sum(upstream) / len(upstream), 2),
+            'peak_traced_bytes': peak
+        }
+        self.results.append(result)
+        print(f"{repo:<16} {endpoint:<22} {scenario:<10} p50={result['latency_ms']['p50']:>9.2f}ms "
+              f"p99={result['latency_ms']['p99']:>9.2f}ms upstream/req={result['upstream_calls_per_request']:>7.2f} "
+              f"peak={peak / 1024 / 1024:>7.2f}MiB errors={errors}")
+
+    def run_repo(self, repo, size):
+        query = f"owner={OWNER}&repo={repo}"
+        reads = {
+            'branches': f"/api/branches?{query}",
+            'milestones': f"/api/milestones?{query}",
+            'issues': f"/api/issues?{query}&milestone=1"
+        }
+        for endpoint, url in reads.items():
+            self.measure(repo, size, endpoint, 'cold', lambda url=url: self.client.get(url), cold=True)
+            # The response cache is bypassed but the ETag cache turns unchanged pages into 304s
+            self.measure(repo, size, endpoint, 'revalidate', lambda url=url: self.client.get(f"{url}&refresh=true"))
+            self.measure(repo, size, endpoint, 'cached', lambda url=url: self.client.get(url))
+
+        counter = iter(range(1_000_000))
+        def create_pull_request():
+            number = next(counter)
+            return self.client.post('/api/create-pull-request', json={
+                'owner': OWNER, 'repo': repo, 'branch': 'main', 'content': f"## Bench {number}\n\n- Change",
+                'version': '1.0.1', 'prTitle': f"Bench {number}", 'prBody': 'Benchmark', 'milestone': f"bench {number}"
+            })
+        self.measure(repo, size, 'create-pull-request', 'cold', create_pull_request, cold=True)
+        self.measure(repo, size, 'create-pull-request', 'warm', create_pull_request)
+
+def main():
+    """Benchmark the API routes against a local fake GitHub at several repository sizes"""
+    parser = argparse.ArgumentParser(description='Benchmark the backend against a local fake GitHub API')
+    parser.add_argument('--issues', default='10,1000,10000', help='Comma-separated milestone sizes in issues')
+    parser.add_argument('--branches', type=int, default=1000, help='Branches per repository')
+    parser.add_argument('--milestones', type=int, default=10, help='Milestones per repository')
+    parser.add_argument('--requests', type=int, default=10, help='Timed requests per scenario')
+    parser.add_argument('--latency', type=float, default=0.01, help='Seconds the fake API adds to every request')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of fake GETs answered with a 502')
+    parser.add_argument('--rate-limit', type=int, default=10_000_000, help='Rate limit budget of the fake API')
+    parser.add_argument('--output', default='bench-results.json', help='Where to write the JSON results')
+    args = parser.parse_args()
+
+    sizes = [{'issues': int(issues), 'branches': args.branches} for issues in args.issues.split(',')]
+    repos = [(f"issues-{size['issues']}", size['issues'], size['branches'], args.milestones) for size in sizes]
+
+    ready = multiprocessing.Queue()
+    fake = multiprocessing.Process(target=serve_fake, daemon=True,
+                                   args=(repos, args.latency, args.error_rate, args.rate_limit, ready))
+    fake.start()
+    base_url = ready.get(timeout=30)
+
+    # Point the app at the fake API; background work is disabled so it can't skew upstream counts
+    os.environ['GITHUB_API'] = base_url
+    os.environ.setdefault('GITHUB_TOKEN', 'bench-token')
+    os.environ.setdefault('PREFETCH_MILESTONES', '0')
+    os.environ['PREFETCH_REPOS'] = ''
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    from app import create_app
+    import config
+
+    bench = Bench(create_app().test_client(), base_url.replace('/api/v3', '/_bench/stats'), args.requests)
+    started = time.time()
+    try:
+        for (repo, *_), size in zip(repos, sizes):
+            bench.run_repo(repo, size)
+    finally:
+        fake.terminate()
+
+    report = {
+        'meta': {
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'duration_seconds': round(time.time() - started, 1),
+            'max_rss_kib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            'settings': {
+                'requests_per_scenario': args.requests,
+                'latency': args.latency,
+                'error_rate': args.error_rate,
+                'milestones': args.milestones,
+                'upstream_engine': config.UPSTREAM_ENGINE,
+                'issue_fetch_engine': config.ISSUE_FETCH_ENGINE,
+                'issue_sync_mode': config.ISSUE_SYNC_MODE,
+                'response_cache_backend': config.RESPONSE_CACHE_BACKEND
+            }
+        },
+        'results': bench.results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Wrote {len(bench.results)} results to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,271 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# Items serialized to size a long list; the rest are assumed to be about as large
+SIZE_SAMPLE = 16
+
+def estimate_size(payload):
+    """Approximate len(json.dumps(payload)), serializing an evenly spaced sample of a long list"""
+    if isinstance(payload, list) and len(payload) > SIZE_SAMPLE:
+        step = len(payload) / SIZE_SAMPLE
+        sample = [payload[int(i * step)] for i in range(SIZE_SAMPLE)]
+        return len(json.dumps(sample)) * len(payload) // SIZE_SAMPLE
+    return len(json.dumps(payload))
+
+class LRUCache:
+    """Thread-safe LRU cache bounded by both entry count and total size in bytes"""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._bytes = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for key (marking it recently used), or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, size):
+        """Store value under key, evicting least recently used entries to stay in bounds"""
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                # Never cache something that would flush the whole cache on its own
+                return False
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._evictions += 1
+            return True
+
+    def pop(self, key):
+        """Remove key from the cache and return its value, or None"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            self._bytes -= entry[1]
+            return entry[0]
+
+    def items(self):
+        """Return a snapshot of (key, value) pairs, least recently used first"""
+        with self._lock:
+            return [(key, entry[0]) for key, entry in self._entries.items()]
+
+    def remove_where(self, predicate):
+        """Remove every entry whose key satisfies predicate and return how many were removed"""
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                self._bytes -= self._entries.pop(key)[1]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'evictions': self._evictions
+            }
+
+class ConditionalRequestCache:
+    """
+    Remembers ETag/Last-Modified validators and parsed bodies of GitHub
+    responses so unchanged resources can be revalidated with a 304
+    """
+
+    def __init__(self, max_entries, max_bytes):
+        self._lru = LRUCache(max_entries, max_bytes)
+        self._lock = threading.Lock()
+        self._counts = {'hits': 0, 'misses': 0, 'revalidations': 0}
+
+    @staticmethod
+    def make_key(url, params):
+        return (url, tuple(sorted((str(k), str(v)) for k, v in (params or {}).items())))
+
+    def _record(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def conditional_headers(self, key):
+        """Return the If-None-Match/If-Modified-Since headers for key, or {} on a miss"""
+        entry = self._lru.get(key)
+        if entry is None:
+            self._record('misses')
+            return {}
+        self._record('revalidations')
+        headers = {}
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def not_modified(self, key):
+        """Return the stored (data, links) for a 304 response, or None if it was evicted meanwhile"""
+        entry = self._lru.get(key)
+        if entry is None:
+            return None
+        self._record('hits')
+        return entry['data'], entry['links']
+
+    def store(self, key, response, data):
+        """Remember a 200 response if it carries a validator"""
+        self.store_parts(key, response.headers, data, response.links, len(response.content))
+
+    def store_parts(self, key, headers, data, links, size):
+        """Remember a 200 response given as its headers, parsed body, parsed Link header and size"""
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+        self._lru.set(key, {
+            'etag': etag,
+            'last_modified': last_modified,
+            'data': data,
+            'links': links
+        }, size)
+
+    def clear(self):
+        self._lru.clear()
+
+    def stats(self):
+        stats = self._lru.stats()
+        with self._lock:
+            stats.update(self._counts)
+        return stats
+
+class ResponseCache:
+    """
+    TTL cache of the shaped JSON payloads served by the list endpoints,
+    keyed by (kind, owner, repo, milestone) with a TTL per kind. Past its
+    TTL a payload stays available to lookup() as stale for the kind's
+    stale TTL, so it can be served while it is refreshed.
+    """
+
+    def __init__(self, ttls, max_entries, max_bytes, stale_ttls=None):
+        self.ttls = ttls
+        self.stale_ttls = stale_ttls or {}
+        self._lru = LRUCache(max_entries, max_bytes)
+        self._lock = threading.Lock()
+        self._counts = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'expired': 0, 'bypassed': 0, 'invalidations': 0}
+
+    @staticmethod
+    def make_key(kind, owner, repo, milestone=None):
+        # GitHub owner and repository names are case-insensitive
+        return (kind, owner.lower(), repo.lower(), str(milestone) if milestone is not None else None)
+
+    def _record(self, name, count=1):
+        with self._lock:
+            self._counts[name] += count
+
+    def lookup(self, kind, owner, repo, milestone=None):
+        """
+        Return (payload, stale): the payload with stale=False within its TTL,
+        with stale=True within its stale TTL, or (None, False) otherwise
+        """
+        key = self.make_key(kind, owner, repo, milestone)
+        entry = self._lru.get(key)
+        if entry is None:
+            self._record('misses')
+            return None, False
+        now = time.monotonic()
+        if entry['expires_at'] > now:
+            self._record('hits')
+            return entry['payload'], False
+        if entry['stale_until'] > now:
+            self._record('stale_hits')
+            return entry['payload'], True
+        self._lru.pop(key)
+        self._record('expired')
+        return None, False
+
+    def lookup_many(self, kind, owner, repo, milestones):
+        """Return {milestone: (payload, stale)} like lookup() for each milestone"""
+        return {milestone: self.lookup(kind, owner, repo, milestone) for milestone in milestones}
+
+    def get(self, kind, owner, repo, milestone=None):
+        """Return the cached payload, or None if it is missing, stale or expired"""
+        payload, stale = self.lookup(kind, owner, repo, milestone)
+        return None if stale else payload
+
+    def set(self, kind, owner, repo, payload, milestone=None):
+        """Cache payload for the TTL configured for kind"""
+        key = self.make_key(kind, owner, repo, milestone)
+        size = estimate_size(payload)
+        expires_at = time.monotonic() + self.ttls[kind]
+        self._lru.set(key, {
+            'payload': payload,
+            'expires_at': expires_at,
+            'stale_until': expires_at + self.stale_ttls.get(kind, 0)
+        }, size)
+
+    def set_many(self, kind, owner, repo, payloads):
+        """Cache {milestone: payload}, e.g. every issue body of a milestone"""
+        for milestone, payload in payloads.items():
+            self.set(kind, owner, repo, payload, milestone)
+
+    def patch(self, kind, owner, repo, patch_fn):
+        """
+        Apply patch_fn(milestone, payload) to every cached payload of kind for
+        a repository, keeping each entry's expiry time. patch_fn returns the
+        new payload, the same payload when nothing changed, or None to evict
+        the entry. Returns the number of entries changed.
+        """
+        owner, repo = owner.lower(), repo.lower()
+        changed = 0
+        for key, entry in self._lru.items():
+            if key[0] != kind or key[1] != owner or key[2] != repo:
+                continue
+            payload = patch_fn(key[3], entry['payload'])
+            if payload is entry['payload']:
+                continue
+            if payload is None:
+                self._lru.pop(key)
+            else:
+                self._lru.set(key, dict(entry, payload=payload), estimate_size(payload))
+            changed += 1
+        return changed
+
+    def delete(self, kind, owner, repo, milestone=None):
+        self._lru.pop(self.make_key(kind, owner, repo, milestone))
+
+    def record_bypass(self):
+        self._record('bypassed')
+
+    def invalidate_repo(self, owner, repo):
+        """Drop every cached payload for a repository"""
+        owner, repo = owner.lower(), repo.lower()
+        removed = self._lru.remove_where(lambda key: key[1] == owner and key[2] == repo)
+        self._record('invalidations', removed)
+        return removed
+
+    def clear(self):
+        self._lru.clear()
+
+    def stats(self):
+        stats = self._lru.stats()
+        with self._lock:
+            stats.update(self._counts)
+        stats['ttls'] = dict(self.ttls)
+        stats['stale_ttls'] = dict(self.stale_ttls)
+        return stats
@@ -0,0 +1,245 @@
+import re
+import threading
+from cache import LRUCache
+from config import CHANGELOG_MEMO_MAX_ENTRIES, CHANGELOG_MEMO_MAX_BYTES
+
+# Port of the frontend's releaseNoteUtils.js / changelogUtils.js, so the
+# rendered section matches what the UI produces. JavaScript's `$` without the
+# m flag only matches at the very end of the input, which is `\Z` here.
+
+VALID_TYPES = ('ADDED', 'CHANGED', 'DEPRECATED', 'REMOVED', 'FIXED', 'SECURITY')
+TYPE_ORDER = ('ADDED', 'FIXED')
+
+CATEGORY_PATTERN = re.compile(
+    r'\[([^\]]+)\](?:\s*\n-\s*|\[)\[([^\]]+)\](?:\s*\n\s*-\s*|\[)\[([^\]]+)\](?:\s*\n\s*-\s*|\s+)([\s\S]*?)'
+    r'(?=(?:\s*\[(?:ADDED|CHANGED|DEPRECATED|REMOVED|FIXED|SECURITY)\]|\s*\Z))',
+    re.IGNORECASE
+)
+FALLBACK_PATTERNS = (
+    (re.compile(r'###\s*Release\s*Notes?\s*(?:\(.*?\))?\s*\n', re.IGNORECASE), re.compile(r'\n###|\n##|\n#|\Z')),
+    (re.compile(r'##\s*Release\s*Notes?\s*(?:\(.*?\))?\s*\n', re.IGNORECASE), re.compile(r'\n##|\n#|\Z')),
+    (re.compile(r'Release\s*Notes?\s*:\s*', re.IGNORECASE), re.compile(r'\n#|\Z')),
+    (re.compile(r'```\s*release-note\s*\n', re.IGNORECASE), re.compile(r'```')),
+)
+LEADING_CATEGORY_PATTERN = re.compile(r'\s*\[([^\]]+)\]\s*(?:\[([^\]]+)\])?\s*(?:\[([^\]]+)\])?\s*([\s\S]*)')
+ANY_NOTE_PATTERN = re.compile(r'(?:release note|changelog|changes?)(?:\s*:|>|\n)\s*([\s\S]+?)(?=\n#|\Z)', re.IGNORECASE)
+BLANK_LINES_PATTERN = re.compile(r'\n\s*\n')
+BRACKETED_PATTERN = re.compile(r'\[([^\]]+)\]')
+PLAIN_TEXT_PATTERN = re.compile(r'[^\[\]\s-]+')
+
+MARKDOWN_ISSUE_PATTERN = re.compile(r'Issue\s+\[#(\d+)\]\((https://[^\s)]+)\)', re.IGNORECASE)
+PLAIN_ISSUE_PATTERN = re.compile(r'Issue\s+(https://[^\s:)]+)', re.IGNORECASE)
+ISSUE_NUMBER_IN_URL_PATTERN = re.compile(r'/issues/(\d+)')
+PR_NUMBER_PATTERN = re.compile(r'PR\s+(?:#(\d+)(?:,\s*#(\d+))*)|\bPR\s+#(\d+)(?:,\s*#(\d+))*\b', re.IGNORECASE)
+PR_DIRECT_PATTERN = re.compile(r'PR\s+(https://[^\s)]+)', re.IGNORECASE)
+HASH_NUMBER_PATTERN = re.compile(r'#(\d+)')
+PR_NUMBER_IN_URL_PATTERN = re.compile(r'/pull/(\d+)')
+REPO_URL_PATTERN = re.compile(r'(https://[^/]+/[^/]+/[^/]+)')
+ISSUE_REFERENCE_PATTERN = re.compile(
+    r'(Issue\s+(?:https://[^\s:)]+|(?:\[#\d+\]\([^)]+\)))(?:\s*:\s*PR\s*(?:#\d+)(?:,\s*#\d+)*)?)',
+    re.IGNORECASE
+)
+EMPTY_PARENS_PATTERN = re.compile(r'\(\s*\)')
+
+def _clean_text(text):
+    if not text:
+        return ''
+    return BLANK_LINES_PATTERN.sub('\n', text.replace('\r\n', '\n')).strip()
+
+def _format_note(note_type, component, category, description):
+    note_type = note_type.strip().upper() if note_type else 'ADDED'
+    if note_type not in VALID_TYPES:
+        note_type = 'ADDED'
+    component = _clean_text(component) if component else 'General'
+    category = _clean_text(category) if category else 'Other'
+    description = _clean_text(description) or 'No detailed description available'
+    return f"[{note_type}]\n- [{component}]\n     - [{category}] \n        - {description}"
+
+def _default_note(description):
+    return f"[ADDED]\n- [General]\n     - [Other] \n        - {description}"
+
+def extract_release_note(body):
+    """Extract the release note from an issue body, like extractReleaseNote in the frontend"""
+    if not body:
+        return _default_note('No release note available')
+
+    matches = list(CATEGORY_PATTERN.finditer(body))
+    if matches:
+        return '\n\n'.join(_format_note(*match.groups()) for match in matches)
+
+    for section_pattern, end_pattern in FALLBACK_PATTERNS:
+        start = section_pattern.search(body)
+        if not start:
+            continue
+        remaining = body[start.start():]
+        end = end_pattern.search(remaining)
+        content = remaining if end is None else remaining[:end.start()]
+        if not content:
+            continue
+        cleaned = _clean_text(section_pattern.sub('', content, count=1))
+        if cleaned:
+            category_match = LEADING_CATEGORY_PATTERN.match(cleaned)
+            if category_match:
+                return _format_note(*category_match.groups())
+            return _default_note(cleaned)
+
+    last_resort = ANY_NOTE_PATTERN.search(body)
+    if last_resort and last_resort.group(1):
+        return _default_note(_clean_text(last_resort.group(1)))
+
+    return _default_note('No release note section found')
+
+def parse_note(content):
+    """
+    Split an extracted note into {'type', 'component', 'category', 'description'},
+    like the first strategy of extractNoteCategories. Returns None if it can't.
+    """
+    type_match = BRACKETED_PATTERN.search(content)
+    if not type_match:
+        return None
+    note_type = type_match.group(1)
+    after_type = content[content.index(f'[{note_type}]') + len(note_type) + 2:]
+
+    component_match = BRACKETED_PATTERN.search(after_type)
+    if not component_match:
+        return None
+    component = component_match.group(1)
+    after_component = after_type[after_type.index(f'[{component}]') + len(component) + 2:]
+
+    category_match = BRACKETED_PATTERN.search(after_component)
+    if not category_match:
+        return None
+    category = category_match.group(1)
+    description = after_component[after_component.index(f'[{category}]') + len(category) + 2:].strip()
+
+    if not description:
+        description = ' '.join(PLAIN_TEXT_PATTERN.findall(content)).strip()
+    if not description:
+        return None
+    return {'type': note_type, 'component': component, 'category': category, 'description': description}
+
+def extract_issue_and_pr_links(content):
+    """Return (issue_link, pr_links, issue_number) referenced in a note description"""
+    issue_link = None
+    issue_number = None
+    pr_links = []
+
+    markdown_match = MARKDOWN_ISSUE_PATTERN.search(content)
+    if markdown_match:
+        issue_number, issue_link = markdown_match.group(1), markdown_match.group(2)
+    else:
+        plain_match = PLAIN_ISSUE_PATTERN.search(content)
+        if plain_match:
+            issue_link = plain_match.group(1)
+            number_match = ISSUE_NUMBER_IN_URL_PATTERN.search(issue_link)
+            issue_number = number_match.group(1) if number_match else None
+
+    for match in PR_DIRECT_PATTERN.finditer(content):
+        if match.group(1) not in pr_links:
+            pr_links.append(match.group(1))
+
+    base_url = REPO_URL_PATTERN.search(issue_link) if issue_link else None
+    for match in PR_NUMBER_PATTERN.finditer(content):
+        for pr_number in HASH_NUMBER_PATTERN.findall(match.group(0)):
+            if base_url and not any(f'/pull/{pr_number}' in link for link in pr_links):
+                constructed = f'{base_url.group(1)}/pull/{pr_number}'
+                if constructed not in pr_links:
+                    pr_links.append(constructed)
+
+    return issue_link, pr_links, issue_number
+
+def format_description(description):
+    """Rewrite issue/PR references in a description as markdown links"""
+    issue_link, pr_links, issue_number = extract_issue_and_pr_links(description)
+    if issue_number and pr_links:
+        description = ISSUE_REFERENCE_PATTERN.sub('', description, count=1).strip()
+        pr_numbers = [match.group(1) for match in map(PR_NUMBER_IN_URL_PATTERN.search, pr_links) if match]
+        description += f" (Issue [#{issue_number}]({issue_link}) : PR {', '.join(f'#{number}' for number in pr_numbers)})"
+    return EMPTY_PARENS_PATTERN.sub('', description).strip()
+
+def _type_sort_key(note_type):
+    if note_type in TYPE_ORDER:
+        return (0, TYPE_ORDER.index(note_type), '')
+    return (1, 0, note_type.lower())
+
+def render_changelog(notes, milestone_title, date, important_text='', announcement_text=''):
+    """Render parsed notes as a CHANGES.md section, like generateChangelogContent"""
+    grouped = {}
+    for note in notes:
+        descriptions = grouped.setdefault(note['type'], {}).setdefault(note['component'], {}).setdefault(note['category'], {})
+        # A dict keeps first-seen order while dropping duplicate descriptions
+        descriptions[note['description']] = None
+
+    parts = [f"# {milestone_title}\n\n{date}\n\n"]
+    if important_text:
+        parts.append(f"#### _Important_ **\n - {important_text}\n\n")
+    if announcement_text:
+        parts.append(f"#### _Announcement_ **\n - {announcement_text}\n\n")
+    parts.append("\n\n## Changes\n\n")
+
+    for note_type in sorted(grouped, key=_type_sort_key):
+        parts.append(f"- [{note_type}]\n")
+        for component, categories in grouped[note_type].items():
+            parts.append(f"  - **{component}**\n")
+            for category, descriptions in categories.items():
+                for description in descriptions:
+                    parts.append(f"      - {category} : {format_description(description)}\n")
+        parts.append('\n')
+
+    parts.append('---')
+    return ''.join(parts)
+
+class ChangelogEngine:
+    """Renders changelog sections, memoizing each issue's parsed note by number and updated_at"""
+
+    def __init__(self, max_entries, max_bytes):
+        self._memo = LRUCache(max_entries, max_bytes)
+        self._lock = threading.Lock()
+        self._counts = {'hits': 0, 'misses': 0}
+
+    def _record(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def parse_issue(self, owner, repo, issue):
+        """Return the parsed note for an issue, or None if it has no usable note"""
+        key = (owner.lower(), repo.lower(), issue['number'], issue.get('updated_at'))
+        if key[3] is not None:
+            cached = self._memo.get(key)
+            if cached is not None:
+                self._record('hits')
+                return cached['note']
+        self._record('misses')
+
+        note = parse_note(extract_release_note(issue.get('body')))
+        if key[3] is not None:
+            self._memo.set(key, {'note': note}, len(issue.get('body') or '') + 64)
+        return note
+
+    def render(self, owner, repo, issues, milestone_title, date, important_text='', announcement_text=''):
+        """
+        Render the changelog section for issues.
+        Returns (content, invalid_notes); content is None when no issue has a usable note.
+        """
+        notes = []
+        invalid_notes = []
+        # The frontend walks notes keyed by issue number, which JavaScript orders numerically
+        for issue in sorted(issues, key=lambda issue: issue['number']):
+            note = self.parse_issue(owner, repo, issue)
+            if note is None:
+                invalid_notes.append(f"Issue #{issue['number']}: Could not extract a valid release note. "
+                                     f"Please ensure it has at least a type in brackets [TYPE] and some description text.")
+            else:
+                notes.append(note)
+
+        if not notes:
+            return None, invalid_notes
+        return render_changelog(notes, milestone_title, date, important_text, announcement_text), invalid_notes
+
+    def stats(self):
+        stats = self._memo.stats()
+        with self._lock:
+            stats.update(self._counts)
+        return stats
+
+changelog_engine = ChangelogEngine(CHANGELOG_MEMO_MAX_ENTRIES, CHANGELOG_MEMO_MAX_BYTES)
@@ -1,8 +1,14 @@
 import os
 from dotenv import load_dotenv
+import atexit
+import contextvars
+import copy
+import json
 import logging
+import queue
+import random
 import sys
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 
 # Load environment variables
 load_dotenv()
@@ -10,18 +16,186 @@ load_dotenv()
 # GitHub Configuration
 GITHUB_TOKEN = os.getenv('GITHUB_TOKEN')
 GITHUB_BACKUP_TOKEN = os.getenv('GITHUB_BACKUP_TOKEN')
-GITHUB_API = "https://github.ibm.com/api/v3"
+GITHUB_WEBHOOK_SECRET = os.getenv('GITHUB_WEBHOOK_SECRET')
+# Read traffic is spread over every token; GITHUB_EXTRA_TOKENS is a comma-separated list
+GITHUB_TOKENS = [token for token in dict.fromkeys(
+    [GITHUB_TOKEN, GITHUB_BACKUP_TOKEN] + [token.strip() for token in os.getenv('GITHUB_EXTRA_TOKENS', '').split(',')]
+) if token]
+GITHUB_WRITE_TOKEN = os.getenv('GITHUB_WRITE_TOKEN', GITHUB_TOKEN)  # commits, pull requests and gists use this token
+TOKEN_QUARANTINE_SECONDS = int(os.getenv('TOKEN_QUARANTINE_SECONDS', 900))  # rotation pause after a 401/403
+GITHUB_CLIENT_TTL = int(os.getenv('GITHUB_CLIENT_TTL', 600))  # seconds a token's login and repository metadata are trusted
+GITHUB_CLIENT_POOL_SIZE = int(os.getenv('GITHUB_CLIENT_POOL_SIZE', 8))  # idle PyGithub clients kept per token
+# PyGithub's own spacing between calls (defaults 0.25s and 1s per client); the rate limit scheduler paces
+# reads, and a pull request's few writes don't need a second apart
+GITHUB_SECONDS_BETWEEN_REQUESTS = float(os.getenv('GITHUB_SECONDS_BETWEEN_REQUESTS', 0))
+GITHUB_SECONDS_BETWEEN_WRITES = float(os.getenv('GITHUB_SECONDS_BETWEEN_WRITES', 0.1))
+GITHUB_API = os.getenv('GITHUB_API', "https://github.ibm.com/api/v3")
+GITHUB_GRAPHQL_API = os.getenv('GITHUB_GRAPHQL_API', "https://github.ibm.com/api/graphql")
 VERSION_INIT_FILE_URL = "https://raw.github.ibm.com/auditree/auditree-central/master/auditree_central/__init__.py"
 # API Configuration
 PER_PAGE = 100
+FETCH_CONCURRENCY = int(os.getenv('FETCH_CONCURRENCY', 4))  # pages fetched in parallel per list
 REQUEST_TIMEOUT = 30
 
+# Upstream engine: 'threads' (blocking requests) or 'asyncio' (aiohttp on one event loop)
+UPSTREAM_ENGINE = os.getenv('UPSTREAM_ENGINE', 'threads')
+ASYNC_MAX_IN_FLIGHT = int(os.getenv('ASYNC_MAX_IN_FLIGHT', 200))  # upstream requests in flight on the event loop
+ASYNC_MAX_CONNECTIONS = int(os.getenv('ASYNC_MAX_CONNECTIONS', 100))
+
+# Production Server Configuration (gunicorn.conf.py)
+PORT = int(os.getenv('PORT', 5000))
+WEB_WORKERS = int(os.getenv('WEB_WORKERS', 2 * (os.cpu_count() or 1) + 1))
+WEB_THREADS = int(os.getenv('WEB_THREADS', 8))  # request threads per worker process
+WEB_TIMEOUT = int(os.getenv('WEB_TIMEOUT', 120))  # seconds before a silent worker is restarted
+
+# Connection Pool Configuration
+POOL_CONNECTIONS = int(os.getenv('POOL_CONNECTIONS', 10))  # number of hosts to keep pools for
+POOL_MAXSIZE = int(os.getenv('POOL_MAXSIZE', 20))  # keep-alive connections per host
+POOL_BLOCK = os.getenv('POOL_BLOCK', 'false').lower() == 'true'
+
+# Rate Limit Scheduler Configuration
+RATE_LIMIT_PACE_BELOW = float(os.getenv('RATE_LIMIT_PACE_BELOW', 0.2))  # pace requests once this fraction of the budget is left
+RATE_LIMIT_RESERVE = float(os.getenv('RATE_LIMIT_RESERVE', 0.1))  # fraction kept for interactive requests only
+RATE_LIMIT_MAX_WAIT = float(os.getenv('RATE_LIMIT_MAX_WAIT', 30))  # seconds an interactive request may wait for budget
+RATE_LIMIT_BACKGROUND_MAX_WAIT = float(os.getenv('RATE_LIMIT_BACKGROUND_MAX_WAIT', 60))
+
+# Conditional Request (ETag) Cache Configuration
+CONDITIONAL_CACHE_MAX_ENTRIES = int(os.getenv('CONDITIONAL_CACHE_MAX_ENTRIES', 2000))
+CONDITIONAL_CACHE_MAX_BYTES = int(os.getenv('CONDITIONAL_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+# Response Cache Configuration (TTLs in seconds)
+RESPONSE_CACHE_TTLS = {
+    'branches': int(os.getenv('RESPONSE_CACHE_TTL_BRANCHES', 60)),
+    'milestones': int(os.getenv('RESPONSE_CACHE_TTL_MILESTONES', 120)),
+    'issues': int(os.getenv('RESPONSE_CACHE_TTL_ISSUES', 60)),
+    'issue_body': int(os.getenv('RESPONSE_CACHE_TTL_ISSUE_BODY', 300))
+}
+# Past its TTL a payload is served stale for up to this long while it is refreshed in the background;
+# after that requests wait for a fresh fetch
+RESPONSE_CACHE_STALE_TTLS = {
+    'branches': int(os.getenv('RESPONSE_CACHE_STALE_TTL_BRANCHES', 600)),
+    'milestones': int(os.getenv('RESPONSE_CACHE_STALE_TTL_MILESTONES', 600)),
+    'issues': int(os.getenv('RESPONSE_CACHE_STALE_TTL_ISSUES', 600)),
+    'issue_body': int(os.getenv('RESPONSE_CACHE_STALE_TTL_ISSUE_BODY', 600))
+}
+REFRESH_WORKERS = int(os.getenv('REFRESH_WORKERS', 2))  # threads refreshing stale entries
+REFRESH_MAX_PENDING = int(os.getenv('REFRESH_MAX_PENDING', 100))
+
+# Prefetch: issues of the newest open milestones are warmed when a repository's milestones are loaded,
+# and PREFETCH_REPOS (comma-separated owner/repo) are warmed at startup; both run on the refresh workers
+PREFETCH_MILESTONES = int(os.getenv('PREFETCH_MILESTONES', 3))  # 0 disables milestone prefetch
+PREFETCH_REPOS = [repo.strip() for repo in os.getenv('PREFETCH_REPOS', '').split(',') if repo.strip()]
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 500))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', 128 * 1024 * 1024))
+ISSUE_BODY_CACHE_MAX_ENTRIES = int(os.getenv('ISSUE_BODY_CACHE_MAX_ENTRIES', 20000))
+ISSUE_BODY_CACHE_MAX_BYTES = int(os.getenv('ISSUE_BODY_CACHE_MAX_BYTES', 128 * 1024 * 1024))
+MAX_ISSUE_BODIES_PER_REQUEST = 100
+# 'memory' keeps the response caches in each process; 'sqlite' shares them between every worker on the host
+RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', 'memory')
+SHARED_CACHE_DIR = os.getenv('SHARED_CACHE_DIR', os.path.join('data', 'cache'))
+
+# Pagination of our own API (?limit=&cursor=)
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+
+# Batch endpoint: repositories per request and how many are fetched at once
+MAX_BATCH_REPOS = int(os.getenv('MAX_BATCH_REPOS', 50))
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', 4))
+
+# Changelog Configuration: parsed release notes memoized per issue revision
+CHANGELOG_MEMO_MAX_ENTRIES = int(os.getenv('CHANGELOG_MEMO_MAX_ENTRIES', 20000))
+CHANGELOG_MEMO_MAX_BYTES = int(os.getenv('CHANGELOG_MEMO_MAX_BYTES', 64 * 1024 * 1024))
+
+# Issue Sync Configuration: 'full' refetches a milestone on every request,
+# 'incremental' keeps a local store current using the `since` parameter
+ISSUE_SYNC_MODE = os.getenv('ISSUE_SYNC_MODE', 'full')
+ISSUE_STORE_PATH = os.getenv('ISSUE_STORE_PATH', os.path.join('data', 'issues.db'))
+# Engine used by 'full' mode: 'rest' (paginated v3 API) or 'graphql' (v4 API)
+ISSUE_FETCH_ENGINE = os.getenv('ISSUE_FETCH_ENGINE', 'rest')
+
 # Environment Configuration
 ENVIRONMENT = os.getenv('ENVIRONMENT', 'development')
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO' if ENVIRONMENT == 'production' else 'DEBUG')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')  # 'text' or 'json' (one object per line)
+# Fraction of per-page upstream debug events that are logged; large lists log one per page fetched
+LOG_PAGE_SAMPLE_RATE = float(os.getenv('LOG_PAGE_SAMPLE_RATE', 1.0))
+
+# Request Timing: a Server-Timing header on every API response, and a warning with the breakdown
+# for requests slower than SLOW_REQUEST_THRESHOLD seconds (0 turns the log off)
+SLOW_REQUEST_THRESHOLD = float(os.getenv('SLOW_REQUEST_THRESHOLD', 0))
+SERVER_TIMING_MAX_UPSTREAM = int(os.getenv('SERVER_TIMING_MAX_UPSTREAM', 10))  # slowest upstream calls listed
+
+# ID of the API request being served, set by the routes and added to every log record
+request_id = contextvars.ContextVar('request_id', default='-')
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+class SampleFilter(logging.Filter):
+    """Let a random fraction of records through"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return self.rate >= 1 or random.random() < self.rate
+
+class JsonFormatter(logging.Formatter):
+    """Format each record as one JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, self.datefmt),
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', '-'),
+            'function': record.funcName,
+            'line': record.lineno,
+            'message': record.getMessage()
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+class LocalQueueHandler(QueueHandler):
+    """
+    Queue records for a listener in this process. The message is merged
+    with its arguments in the logging thread, but the traceback is kept so
+    the output formatters render it (the JSON format as its own field).
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+_log_listener = None
+
+def start_log_listener(queue_handler, handlers):
+    """Start the thread that writes queued records to the console and file handlers"""
+    global _log_listener
+    # Unbounded, so a burst of records never blocks or drops on a request thread
+    queue_handler.queue = queue.Queue()
+    _log_listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _log_listener.start()
+
+def stop_logging():
+    """Write out every queued record and stop the logging thread"""
+    global _log_listener
+    if _log_listener is not None:
+        listener, _log_listener = _log_listener, None
+        listener.stop()
 
 def setup_logging():
-    """Configure logging with proper formatting and handlers"""
+    """
+    Configure logging with proper formatting and handlers. Records are
+    put on a queue and written by a listener thread, so request threads
+    never wait on console or file I/O.
+    """
     # Create logger
     logger = logging.getLogger('changes_app')
     logger.setLevel(getattr(logging, LOG_LEVEL.upper()))
@@ -31,16 +205,18 @@ def setup_logging():
         return logger
     
     # Create formatter
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(funcName)s:%(lineno)d - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
+    if LOG_FORMAT == 'json':
+        formatter = JsonFormatter(datefmt='%Y-%m-%dT%H:%M:%S%z')
+    else:
+        formatter = logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] - %(funcName)s:%(lineno)d - %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
     
     # Console handler
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(getattr(logging, LOG_LEVEL.upper()))
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
     
     # File handler - create logs directory if it doesn't exist
     logs_dir = 'logs'
@@ -55,7 +231,18 @@ def setup_logging():
     )
     file_handler.setLevel(logging.INFO)
     file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
+
+    queue_handler = LocalQueueHandler(queue.Queue())
+    # The queue handler's filters run in the thread that logs, where the request ID is set
+    queue_handler.addFilter(RequestIdFilter())
+    logger.addHandler(queue_handler)
+    start_log_listener(queue_handler, (console_handler, file_handler))
+    # gunicorn workers fork from a master that has already imported this module, without its listener thread
+    os.register_at_fork(after_in_child=lambda: start_log_listener(queue_handler, (console_handler, file_handler)))
+    atexit.register(stop_logging)
+
+    # Per-page events can number in the thousands per request, so only a sample is logged
+    logging.getLogger('changes_app.pages').addFilter(SampleFilter(LOG_PAGE_SAMPLE_RATE))
     
     # Set third-party loggers to WARNING to reduce noise
     logging.getLogger('urllib3').setLevel(logging.WARNING)
@@ -66,10 +253,11 @@ def setup_logging():
 
 # Initialize logger
 logger = setup_logging()
+page_logger = logging.getLogger('changes_app.pages')
 
-def github_headers():
+def github_headers(token=None):
     return {
-        'Authorization': f'token {GITHUB_TOKEN}', 
+        'Authorization': f'token {token or GITHUB_TOKEN}', 
         'Accept': 'application/vnd.github.v3+json'
     } 
     
@@ -1,163 +1,270 @@
+import contextvars
 import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-from config import GITHUB_API, github_headers, PER_PAGE, REQUEST_TIMEOUT, logger
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
+from config import (GITHUB_API, github_headers, PER_PAGE, FETCH_CONCURRENCY, REQUEST_TIMEOUT,
+                    CONDITIONAL_CACHE_MAX_ENTRIES, CONDITIONAL_CACHE_MAX_BYTES, logger, page_logger)
+from http_client import send_github_request
+from token_pool import token_pool
+from cache import ConditionalRequestCache
+from single_flight import coalesce
+import metrics
 import http
 
-def create_session():
-    """Create a requests session with retry logic"""
-    session = requests.Session()
-    retry_strategy = Retry(
-        total=3,  # number of retries
-        backoff_factor=1,  # wait 1, 2, 4 seconds between retries
-        status_forcelist=[429, 500, 502, 503, 504],  # HTTP status codes to retry on
-    )
-    adapter = HTTPAdapter(max_retries=retry_strategy)
-    session.mount("http://", adapter)
-    session.mount("https://", adapter)
-    return session
+# ETag/Last-Modified cache; 304 responses don't count against the rate limit
+conditional_cache = ConditionalRequestCache(CONDITIONAL_CACHE_MAX_ENTRIES, CONDITIONAL_CACHE_MAX_BYTES)
 
 def make_github_request(url, params=None, headers=None):
     """Make a GitHub API request with proper error handling"""
-    session = create_session()
+    data, status_code, error, _ = fetch_github_page(url, params, headers)
+    return data, status_code, error
+
+def send_github_get(url, params, headers, token, extra_headers=None):
+    """Send a GET authenticated with token, returning (response, rate_limit_error)"""
+    request_headers = github_headers(token)
+    request_headers.update(headers or {})
+    request_headers.update(extra_headers or {})
+    return send_github_request(
+        'GET',
+        url,
+        token,
+        headers=request_headers,
+        params=params,
+        verify=True,
+        timeout=REQUEST_TIMEOUT
+    )
+
+def fetch_github_page(url, params=None, headers=None):
+    """
+    Make a GitHub API request and also return the parsed Link header,
+    as (data, status_code, error, links)
+
+    Requests are made conditional on a previously cached ETag/Last-Modified,
+    and a 304 response is answered from the cached body. The request uses
+    the pooled token with the most quota left, and is retried once with
+    another token if GitHub rejects the first one.
+    """
+    cache_key = conditional_cache.make_key(url, params)
+    validators = conditional_cache.conditional_headers(cache_key)
     try:
-        response = session.get(
-            url,
-            headers=headers or github_headers(),
-            params=params,
-            verify=True,
-            timeout=REQUEST_TIMEOUT
-        )
+        token = token_pool.read_token()
+        response, limit_error = send_github_get(url, params, headers, token, validators)
+        # A rate-limited 403 is the budget running out, which the scheduler already waits out
+        if response is not None and response.status_code in (401, 403) and not limit_error:
+            token_pool.report_rejected(token, response.status_code)
+            other_token = token_pool.read_token(exclude=(token,))
+            if other_token:
+                logger.warning(f"Retrying {url} with another token after {response.status_code}")
+                token = other_token
+                response, limit_error = send_github_get(url, params, headers, token, validators)
+        if limit_error:
+            logger.error(f"Rate limited for {url}: {limit_error}")
+            return None, http.HTTPStatus.TOO_MANY_REQUESTS, limit_error, {}
         
+        if response.status_code == 304:
+            cached = conditional_cache.not_modified(cache_key)
+            if cached is not None:
+                # Logged once per page, so the message is only built if the sampled record is kept
+                page_logger.debug("Not modified, serving cached response for %s", url)
+                data, links = cached
+                return data, http.HTTPStatus.OK, None, links
+            # The entry was evicted while the request was in flight; fetch it in full
+            response, limit_error = send_github_get(url, params, headers, token)
+            if limit_error:
+                logger.error(f"Rate limited for {url}: {limit_error}")
+                return None, http.HTTPStatus.TOO_MANY_REQUESTS, limit_error, {}
+
         if response.status_code == 404:
             logger.error(f"Resource not found: {url} - Status: {response.status_code}")
-            return None, response.status_code, "Resource not found"
+            return None, response.status_code, "Resource not found", {}
         elif response.status_code == 403:
-            logger.error(f"Rate limit exceeded or access denied for {url} - Status: {response.status_code}, Response: {response.text[:200]}")
-            return None, response.status_code, "Rate limit exceeded or access denied"
+            # Rate-limited 403s are reported by send_github_request, so this is a permissions problem
+            logger.error(f"Access denied for {url} - Status: {response.status_code}, Response: {response.text[:200]}")
+            return None, response.status_code, "Access denied", {}
         elif response.status_code != 200:
             logger.error(f"GitHub API error for {url} - Status: {response.status_code}, Response: {response.text[:200]}")
-            return None, response.status_code, response.text
+            return None, response.status_code, response.text, {}
             
-        return response.json(), http.HTTPStatus.OK, None
+        data = response.json()
+        conditional_cache.store(cache_key, response, data)
+        return data, http.HTTPStatus.OK, None, response.links
         
     except requests.exceptions.Timeout:
         error_msg = f"Request timed out after {REQUEST_TIMEOUT} seconds for URL: {url}"
         logger.error(error_msg)
-        return None, http.HTTPStatus.REQUEST_TIMEOUT, error_msg
+        return None, http.HTTPStatus.REQUEST_TIMEOUT, error_msg, {}
     except requests.exceptions.ConnectionError as e:
         error_msg = f"Connection error occurred for URL: {url} - {str(e)}"
         logger.error(error_msg)
-        return None, http.HTTPStatus.SERVICE_UNAVAILABLE, error_msg
+        return None, http.HTTPStatus.SERVICE_UNAVAILABLE, error_msg, {}
     except requests.exceptions.RequestException as e:
         error_msg = f"Request failed for URL: {url} - {str(e)}"
         logger.error(error_msg)
-        return None, http.HTTPStatus.INTERNAL_SERVER_ERROR, error_msg
+        return None, http.HTTPStatus.INTERNAL_SERVER_ERROR, error_msg, {}
+
+def get_last_page(links):
+    """Return the page number of the rel="last" Link, or None if there is none"""
+    last_url = links.get('last', {}).get('url')
+    if not last_url:
+        return None
+    page = parse_qs(urlparse(last_url).query).get('page')
+    return int(page[0]) if page else None
+
+def list_kind(url):
+    """Name a list endpoint by its last path segment, e.g. branches or issues, for metrics"""
+    return url.rstrip('/').rsplit('/', 1)[-1]
+
+def iter_pages(url, params, headers=None, label='items'):
+    """
+    Yield (items, status_code, error) for each page of a paginated GitHub
+    list endpoint, in page order, recording how many pages were fetched
+    """
+    pages = 0
+    try:
+        for result in _iter_pages(url, params, headers, label):
+            pages += 1
+            yield result
     finally:
-        session.close()
+        metrics.pages_per_fetch.observe(pages, list_kind(url))
+
+def _iter_pages(url, params, headers=None, label='items'):
+    """
+    Yield (items, status_code, error) for each page of a paginated GitHub
+    list endpoint, in page order.
 
+    Page 1 is fetched first; when its Link header names a last page the
+    remaining pages are fetched concurrently, with at most FETCH_CONCURRENCY
+    pages in flight so only a small window is held in memory. A failed page
+    is yielded as (None, status_code, error) and ends the iteration.
+    """
+    data, status_code, error, links = fetch_github_page(url, dict(params, per_page=PER_PAGE, page=1), headers)
+    if data is None:
+        logger.error(f"Failed to fetch {label} on page 1: {error}")
+        yield None, status_code, error
+        return
+    yield data, http.HTTPStatus.OK, None
+
+    last_page = get_last_page(links)
+    if last_page is None:
+        # No Link header; walk pages one at a time until a short page
+        page = 1
+        while len(data) == PER_PAGE:
+            page += 1
+            data, status_code, error = make_github_request(url, dict(params, per_page=PER_PAGE, page=page), headers)
+            if data is None:
+                logger.error(f"Failed to fetch {label} on page {page}: {error}")
+                yield None, status_code, error
+                return
+            yield data, http.HTTPStatus.OK, None
+        return
+
+    logger.debug(f"Fetching {last_page} pages of {label} with {FETCH_CONCURRENCY} workers")
+    with ThreadPoolExecutor(max_workers=FETCH_CONCURRENCY) as executor:
+        in_flight = deque()
+        next_page = 2
+        try:
+            while next_page <= last_page or in_flight:
+                while next_page <= last_page and len(in_flight) < FETCH_CONCURRENCY:
+                    # Worker threads inherit the caller's rate limit priority
+                    future = executor.submit(contextvars.copy_context().run, make_github_request,
+                                             url, dict(params, per_page=PER_PAGE, page=next_page), headers)
+                    in_flight.append((next_page, future))
+                    next_page += 1
+
+                page, future = in_flight.popleft()
+                data, status_code, error = future.result()
+                if data is None:
+                    logger.error(f"Failed to fetch {label} on page {page}: {error}")
+                    yield None, status_code, error
+                    return
+                yield data, http.HTTPStatus.OK, None
+        finally:
+            # Don't start pages that are still queued once the consumer stops or a page fails
+            for _, future in in_flight:
+                future.cancel()
+
+def fetch_all_pages(url, params, headers=None, label='items'):
+    """
+    Fetch every page of a paginated GitHub list endpoint with iter_pages.
+    Items are returned in page order and any failed page fails the whole fetch.
+    """
+    all_items = []
+    for data, status_code, error in iter_pages(url, params, headers, label):
+        if data is None:
+            return None, status_code, error
+        all_items.extend(data)
+    return all_items, http.HTTPStatus.OK, None
+
+@coalesce
 def get_all_branches(owner, repo):
     """
     Fetch all branches for a given repository with pagination
     """
     logger.debug(f"Starting to fetch branches for {owner}/{repo}")
-    all_branches = []
-    page = 1
-
-    while True:
-        url = f"{GITHUB_API}/repos/{owner}/{repo}/branches"
-        params = {
-            'per_page': PER_PAGE,
-            'page': page
-        }
-        
-        logger.debug(f"Fetching branches page {page} for {owner}/{repo}")
-        data, status_code, error = make_github_request(url, params)
-        if data is None:
-            logger.error(f"Failed to fetch branches for {owner}/{repo} on page {page}: {error}")
-            return None, status_code, error
-            
-        if not data:
-            logger.debug(f"No more branches found for {owner}/{repo} on page {page}")
-            break
-            
-        all_branches.extend(data)
-        logger.debug(f"Added {len(data)} branches from page {page} for {owner}/{repo}")
-        
-        if len(data) < PER_PAGE:
-            break
-            
-        page += 1
+    url = f"{GITHUB_API}/repos/{owner}/{repo}/branches"
+    all_branches, status_code, error = fetch_all_pages(url, {}, label=f"branches for {owner}/{repo}")
+    if all_branches is None:
+        return None, status_code, error
     
     logger.info(f"Successfully fetched {len(all_branches)} total branches for {owner}/{repo}")
     return all_branches, http.HTTPStatus.OK, None
 
+@coalesce
 def get_all_milestones(owner, repo):
     """
     Fetch all milestones (both active and closed) for a given repository with pagination
     """
-    all_milestones = []
-    page = 1
-
-    while True:
-        url = f"{GITHUB_API}/repos/{owner}/{repo}/milestones"
-        params = {
-            'state': 'active',  # Fetch both active and closed milestones
-            'per_page': PER_PAGE,
-            'page': page,
-            'sort': 'due_date',  # Sort by due date
-            'direction': 'desc'  # Most recent first
-        }
-        
-        data, status_code, error = make_github_request(url, params)
-        if data is None:
-            return None, status_code, error
-            
-        if not data:
-            break
-            
-        all_milestones.extend(data)
-        
-        if len(data) < PER_PAGE:
-            break
-            
-        page += 1
-    
-    return all_milestones, http.HTTPStatus.OK, None
+    url, params = milestones_query(owner, repo)
+    return fetch_all_pages(url, params, label=f"milestones for {owner}/{repo}")
+
+def milestones_query(owner, repo):
+    """Return the URL and params listing a repository's milestones"""
+    url = f"{GITHUB_API}/repos/{owner}/{repo}/milestones"
+    params = {
+        'state': 'active',  # Fetch both active and closed milestones
+        'sort': 'due_date',  # Sort by due date
+        'direction': 'desc'  # Most recent first
+    }
+    return url, params
+
+def issues_query(owner, repo, milestone):
+    """Return the URL and params listing a milestone's issues (both open and closed)"""
+    url = f"{GITHUB_API}/repos/{owner}/{repo}/issues"
+    params = {
+        'milestone': milestone,
+        'state': 'all',
+        'sort': 'updated',  # Sort by last updated
+        'direction': 'desc'  # Most recently updated first
+    }
+    return url, params
+
+def iter_issue_pages(owner, repo, milestone):
+    """
+    Yield (issues, status_code, error) for each page of a milestone's issues as it arrives
+    """
+    url, params = issues_query(owner, repo, milestone)
+    return iter_pages(url, params, label=f"issues for {owner}/{repo} milestone {milestone}")
 
+@coalesce
 def get_all_issues(owner, repo, milestone):
     """
     Fetch all issues (both open and closed) for a given repository and milestone with pagination
     """
-    all_issues = []
-    page = 1
-    
-    while True:
-        url = f"{GITHUB_API}/repos/{owner}/{repo}/issues"
-        params = {
-            'milestone': milestone,
-            'state': 'all',
-            'per_page': PER_PAGE,
-            'page': page,
-            'sort': 'updated',  # Sort by last updated
-            'direction': 'desc'  # Most recently updated first
-        }
-        
-        # Add Cache-Control header to prevent caching
-        headers = github_headers()
-        headers['Cache-Control'] = 'no-cache'
-        
-        data, status_code, error = make_github_request(url, params, headers)
-        if data is None:
-            return None, status_code, error
-            
-        if not data:
-            break
-            
-        all_issues.extend(data)
-        if len(data) < PER_PAGE:
-            break
-            
-        page += 1
-    
-    return all_issues, http.HTTPStatus.OK, None 
\ No newline at end of file
+    url, params = issues_query(owner, repo, milestone)
+    # Every page is revalidated with its ETag, so unchanged pages come back as 304s
+    return fetch_all_pages(url, params, label=f"issues for {owner}/{repo} milestone {milestone}")
+
+def get_issue(owner, repo, number):
+    """
+    Fetch a single issue
+    """
+    url = f"{GITHUB_API}/repos/{owner}/{repo}/issues/{number}"
+    return make_github_request(url)
+
+def get_milestone(owner, repo, number):
+    """
+    Fetch a single milestone
+    """
+    url = f"{GITHUB_API}/repos/{owner}/{repo}/milestones/{number}"
+    return make_github_request(url)
@@ -0,0 +1,97 @@
+import base64
+import re
+import time
+from github import GithubException, InputGitTreeElement
+from config import logger
+
+# Where the version module may live, in the order they are preferred
+INIT_FILE_PATHS = ('auditree-central/__init__.py', 'auditree_central/__init__.py', '__init__.py')
+CHANGES_FILE_PATH = 'CHANGES.md'
+
+def set_version(content, new_version):
+    """Return __init__.py content with every __version__ replaced by one new_version after the docstring"""
+    # Find docstring position if it exists
+    docstring_end = content.find('"""', content.find('"""') + 3) if '"""' in content else -1
+
+    # Remove all version declarations
+    cleaned_content = re.sub(r"__version__\s*=\s*['\"]([^'\"]+)['\"]", "", content)
+
+    # Determine where to insert the version
+    if docstring_end != -1:
+        # Find position after docstring
+        insert_position = docstring_end + 3
+        while insert_position < len(cleaned_content) and cleaned_content[insert_position] in ['\n', '\r', ' ', '\t']:
+            insert_position += 1
+
+        # Insert version after docstring with proper spacing
+        new_content = cleaned_content[:insert_position] + f"\n\n__version__ = '{new_version}'" + cleaned_content[insert_position:]
+    else:
+        # No docstring found, add at beginning
+        new_content = f"__version__ = '{new_version}'\n\n" + cleaned_content
+
+    # Clean up any excessive newlines
+    return re.sub(r'\n{3,}', '\n\n', new_content)
+
+def read_blob(repo, sha):
+    """Return the decoded text of a blob"""
+    blob = repo.get_git_blob(sha)
+    if blob.encoding == 'base64':
+        return base64.b64decode(blob.content).decode('utf-8')
+    return blob.content
+
+def create_changelog_commit(repo, base_branch, changelog, new_version=None):
+    """
+    Create one commit on top of base_branch that prepends changelog to
+    CHANGES.md and, if new_version is given, sets it in __init__.py.
+    The files are located from a single recursive tree listing and written
+    with one new tree, instead of one contents API commit per file.
+    Returns (commit, init_path); init_path is None if no version was set.
+    The commit is not on any branch until a ref is pointed at it.
+    """
+    # The branch payload carries the head commit's sha; the nested commit objects are incomplete, and PyGithub
+    # would fetch them lazily, so the sha is read from the raw payload and the commit fetched once, with its tree
+    head_sha = repo.get_branch(base_branch).raw_data['commit']['sha']
+    base_commit = repo.get_git_commit(head_sha)
+    base_tree = repo.get_git_tree(base_commit.tree.sha, recursive=True)
+    blobs = {element.path: element.sha for element in base_tree.tree if element.type == 'blob'}
+    if base_tree.raw_data.get('truncated'):
+        logger.warning(f"Tree listing of {base_branch} is truncated; files outside it are treated as missing")
+
+    elements = []
+    if CHANGES_FILE_PATH in blobs:
+        existing_content = read_blob(repo, blobs[CHANGES_FILE_PATH])
+        logger.info(f"New content length: {len(changelog)}")
+        logger.info(f"Existing content length: {len(existing_content)}")
+        updated_content = f"{changelog}\n\n{existing_content}"
+    else:
+        updated_content = changelog
+    elements.append(InputGitTreeElement(CHANGES_FILE_PATH, '100644', 'blob', content=updated_content))
+
+    init_path = None
+    if new_version:
+        init_path = next((path for path in INIT_FILE_PATHS if path in blobs), None)
+        if init_path:
+            elements.append(InputGitTreeElement(init_path, '100644', 'blob',
+                                                content=set_version(read_blob(repo, blobs[init_path]), new_version)))
+        else:
+            logger.warning("Could not find __init__.py file in any of the expected locations")
+
+    message = f"Update CHANGES.md and version to {new_version}" if init_path else "Update CHANGES.md"
+    tree = repo.create_git_tree(elements, base_tree)
+    commit = repo.create_git_commit(message, tree, [base_commit])
+    logger.info(f"Created commit {commit.sha} updating {CHANGES_FILE_PATH}{f' and {init_path}' if init_path else ''}")
+    return commit, init_path
+
+def create_branch(repo, branch_name, sha):
+    """Create branch_name at sha, adding a timestamp if the name is taken. Returns the name used."""
+    try:
+        repo.create_git_ref(f"refs/heads/{branch_name}", sha)
+        return branch_name
+    except GithubException as e:
+        # GitHub answers 422 "Reference already exists"
+        if e.status != 422:
+            raise e
+    unique_name = f"{branch_name}-{int(time.time())}"
+    logger.info(f"Branch already exists, using unique name: {unique_name}")
+    repo.create_git_ref(f"refs/heads/{unique_name}", sha)
+    return unique_name
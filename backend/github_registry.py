@@ -0,0 +1,174 @@
+import functools
+import http
+import threading
+import time
+from importlib.metadata import version
+from urllib.parse import urlparse
+from urllib3.util.retry import Retry
+from github import Github, GithubException
+from github.Repository import Repository
+from github.Requester import Requester, HTTPRequestsConnectionClass, HTTPSRequestsConnectionClass
+from config import (REQUEST_TIMEOUT, GITHUB_CLIENT_TTL, GITHUB_CLIENT_POOL_SIZE, GITHUB_SECONDS_BETWEEN_REQUESTS,
+                    GITHUB_SECONDS_BETWEEN_WRITES, logger)
+from rate_limit import rate_limiter, token_label
+import metrics
+
+class _TimedConnectionMixin:
+    """
+    Send every request PyGithub makes through the rate limit scheduler and
+    record it in the upstream metrics
+    """
+
+    def __init__(self, *args, api_prefix='', **kwargs):
+        super().__init__(*args, **kwargs)
+        # Path of the API root, e.g. /api/v3 on GitHub Enterprise, which request paths start with
+        self.api_prefix = api_prefix.rstrip('/')
+
+    def resource(self):
+        path = self.url[len(self.api_prefix):] if self.url.startswith(self.api_prefix) else self.url
+        return 'search' if path.startswith('/search/') else 'core'
+
+    def getresponse(self):
+        # PyGithub authenticates with an 'Authorization: token <token>' header
+        token = self.headers.get('Authorization', '').partition(' ')[2]
+        resource = self.resource()
+        with rate_limiter.request(token, resource) as limit_error:
+            if limit_error:
+                raise GithubException(http.HTTPStatus.TOO_MANY_REQUESTS, {'message': limit_error}, None)
+            started = time.perf_counter()
+            try:
+                response = super().getresponse()
+            except Exception:
+                metrics.record_upstream('pygithub', self.verb, self.url, 'error', time.perf_counter() - started)
+                raise
+        metrics.record_upstream('pygithub', self.verb, self.url, response.status, time.perf_counter() - started)
+        # A rate-limited response is raised by PyGithub; the next call waits for the budget to come back
+        rate_limiter.update(token, response.status, response.headers, resource)
+        return response
+
+class TimedHTTPConnection(_TimedConnectionMixin, HTTPRequestsConnectionClass):
+    pass
+
+class TimedHTTPSConnection(_TimedConnectionMixin, HTTPSRequestsConnectionClass):
+    pass
+
+# PyGithub has no supported way to hook the requests it sends, so the connection class of each client this
+# registry creates is swapped. Only those clients are affected, and a PyGithub that stores its connection
+# class differently fails here instead of silently sending requests around the scheduler.
+_CONNECTION_CLASS_ATTR = '_Requester__connectionClass'
+_REQUESTER_ATTR = '_Github__requester'
+if not hasattr(Requester, '_Requester__createConnection'):
+    raise RuntimeError(f"Unsupported PyGithub version {version('PyGithub')}: Requester no longer creates "
+                       f"connections in __createConnection; update github_registry for it")
+
+def use_timed_connections(client, base_url):
+    """Route the requests of a PyGithub client through TimedHTTPConnection/TimedHTTPSConnection"""
+    requester = getattr(client, _REQUESTER_ATTR, None)
+    connection_class = getattr(requester, _CONNECTION_CLASS_ATTR, None)
+    timed_classes = {HTTPRequestsConnectionClass: TimedHTTPConnection, HTTPSRequestsConnectionClass: TimedHTTPSConnection}
+    if connection_class not in timed_classes:
+        raise RuntimeError(f"Unsupported PyGithub version {version('PyGithub')}: cannot find the connection class "
+                           f"of its Requester; update github_registry for it")
+    setattr(requester, _CONNECTION_CLASS_ATTR,
+            functools.partial(timed_classes[connection_class], api_prefix=urlparse(base_url).path))
+    return client
+
+# Only server errors are retried; PyGithub's default retry sleeps out rate limits behind the scheduler's back
+SERVER_ERROR_RETRY = Retry(total=3, backoff_factor=1, status_forcelist=[500, 502, 503, 504])
+
+class GithubClientRegistry:
+    """
+    Shares authenticated PyGithub clients between requests. Clients are
+    pooled per (base_url, token) and checked out by one request at a time,
+    since a client's connection is not safe to use from two threads at once.
+    The authenticated login and repository metadata are cached per
+    (base_url, token) for a TTL, so routes don't re-validate them on every call.
+    """
+
+    def __init__(self, ttl, max_idle_clients):
+        self.ttl = ttl
+        self.max_idle_clients = max_idle_clients
+        self._idle = {}  # (base_url, token) -> [Github, ...]
+        self._logins = {}  # (base_url, token) -> (login, expires_at)
+        self._repos = {}  # (base_url, token, full_name) -> (raw_data, raw_headers, expires_at)
+        self._lock = threading.Lock()
+        self._counts = {'clients_created': 0, 'clients_reused': 0, 'login_hits': 0, 'login_misses': 0,
+                        'repo_hits': 0, 'repo_misses': 0}
+
+    def checkout(self, base_url, token):
+        """Return an idle client for (base_url, token), creating one if none is idle"""
+        with self._lock:
+            idle = self._idle.get((base_url, token))
+            if idle:
+                self._counts['clients_reused'] += 1
+                return idle.pop()
+            self._counts['clients_created'] += 1
+        logger.debug(f"Creating GitHub client for {base_url} with token {token_label(token)}")
+        return use_timed_connections(Github(base_url=base_url, login_or_token=token, timeout=REQUEST_TIMEOUT,
+                                            seconds_between_requests=GITHUB_SECONDS_BETWEEN_REQUESTS,
+                                            seconds_between_writes=GITHUB_SECONDS_BETWEEN_WRITES,
+                                            retry=SERVER_ERROR_RETRY), base_url)
+
+    def checkin(self, base_url, token, client):
+        """Return a client to the pool, closing it if the pool is full"""
+        with self._lock:
+            idle = self._idle.setdefault((base_url, token), [])
+            if len(idle) < self.max_idle_clients:
+                idle.append(client)
+                return
+        client.close()
+
+    def authenticated_login(self, client, base_url, token):
+        """Return the login the token authenticates as, checking with GitHub at most once per TTL"""
+        key = (base_url, token)
+        with self._lock:
+            cached = self._logins.get(key)
+            if cached and cached[1] > time.monotonic():
+                self._counts['login_hits'] += 1
+                return cached[0]
+            self._counts['login_misses'] += 1
+        # Raises GithubException for a rejected token, which is never cached
+        login = client.get_user().login
+        with self._lock:
+            self._logins[key] = (login, time.monotonic() + self.ttl)
+        return login
+
+    def get_repo(self, client, base_url, token, full_name):
+        """
+        Return a Repository handle bound to client, fetching its metadata
+        from GitHub at most once per TTL
+        """
+        key = (base_url, token, full_name.lower())
+        with self._lock:
+            cached = self._repos.get(key)
+            if cached and cached[2] > time.monotonic():
+                self._counts['repo_hits'] += 1
+                return client.create_from_raw_data(Repository, cached[0], cached[1])
+            self._counts['repo_misses'] += 1
+        # Raises GithubException (e.g. 404), which is never cached
+        repo = client.get_repo(full_name)
+        with self._lock:
+            self._repos[key] = (repo.raw_data, repo.raw_headers, time.monotonic() + self.ttl)
+        return repo
+
+    def clear(self):
+        with self._lock:
+            idle = [client for clients in self._idle.values() for client in clients]
+            self._idle.clear()
+            self._logins.clear()
+            self._repos.clear()
+        for client in idle:
+            client.close()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counts)
+            stats.update({
+                'idle_clients': sum(len(clients) for clients in self._idle.values()),
+                'cached_logins': len(self._logins),
+                'cached_repos': len(self._repos),
+                'ttl': self.ttl
+            })
+            return stats
+
+github_registry = GithubClientRegistry(GITHUB_CLIENT_TTL, GITHUB_CLIENT_POOL_SIZE)
@@ -0,0 +1,164 @@
+import http
+import requests
+from config import GITHUB_GRAPHQL_API, github_headers, PER_PAGE, REQUEST_TIMEOUT, logger
+from http_client import send_github_request
+from token_pool import token_pool
+from controllers import get_all_issues
+from single_flight import coalesce
+
+# Exactly the fields /api/issues emits, plus updatedAt for ordering
+ISSUE_FRAGMENTS = """
+fragment IssueFields on Issue { number title state createdAt closedAt updatedAt url body }
+fragment PullRequestFields on PullRequest { number title state createdAt closedAt updatedAt url body }
+"""
+
+# The REST issues endpoint lists pull requests too, so both connections are read
+CONNECTIONS = (('issues', 'IssueFields'), ('pullRequests', 'PullRequestFields'))
+
+def send_graphql_request(token, query, variables):
+    """POST one GraphQL query with token, returning (response, rate_limit_error)"""
+    return send_github_request(
+        'POST',
+        GITHUB_GRAPHQL_API,
+        token,
+        resource='graphql',
+        headers=github_headers(token),
+        json={'query': query, 'variables': variables},
+        verify=True,
+        timeout=REQUEST_TIMEOUT
+    )
+
+def make_graphql_request(query, variables):
+    """
+    Run a GraphQL query, returning (data, status_code, error) like make_github_request.
+    Like fetch_github_page, the query is retried once with another token if
+    GitHub rejects the first one.
+    """
+    try:
+        token = token_pool.read_token('graphql')
+        response, limit_error = send_graphql_request(token, query, variables)
+        if response is not None and response.status_code in (401, 403) and not limit_error:
+            token_pool.report_rejected(token, response.status_code)
+            other_token = token_pool.read_token('graphql', exclude=(token,))
+            if other_token:
+                logger.warning(f"Retrying GraphQL query with another token after {response.status_code}")
+                response, limit_error = send_graphql_request(other_token, query, variables)
+        if limit_error:
+            logger.error(f"GraphQL request rate limited: {limit_error}")
+            return None, http.HTTPStatus.TOO_MANY_REQUESTS, limit_error
+        if response.status_code != 200:
+            logger.error(f"GitHub GraphQL error - Status: {response.status_code}, Response: {response.text[:200]}")
+            return None, response.status_code, response.text
+
+        result = response.json()
+        if result.get('errors'):
+            messages = '; '.join(error.get('message', str(error)) for error in result['errors'])
+            logger.error(f"GitHub GraphQL query failed: {messages}")
+            return None, http.HTTPStatus.BAD_GATEWAY, messages
+        return result['data'], http.HTTPStatus.OK, None
+
+    except requests.exceptions.Timeout:
+        error_msg = f"GraphQL request timed out after {REQUEST_TIMEOUT} seconds"
+        logger.error(error_msg)
+        return None, http.HTTPStatus.REQUEST_TIMEOUT, error_msg
+    except requests.exceptions.RequestException as e:
+        error_msg = f"GraphQL request failed - {str(e)}"
+        logger.error(error_msg)
+        return None, http.HTTPStatus.SERVICE_UNAVAILABLE, error_msg
+
+def to_rest_issue(node):
+    """Convert a GraphQL Issue/PullRequest node to the REST field names routes expect"""
+    return {
+        'number': node['number'],
+        'title': node['title'],
+        # Pull requests can be MERGED, which REST reports as closed
+        'state': 'open' if node['state'] == 'OPEN' else 'closed',
+        'created_at': node['createdAt'],
+        'closed_at': node['closedAt'],
+        'updated_at': node['updatedAt'],
+        'html_url': node['url'],
+        # REST reports an empty body as null
+        'body': node['body'] or None
+    }
+
+def build_milestones_query(pending):
+    """
+    Build a query reading the next page of every pending connection.
+    pending maps (alias, connection) -> cursor for connections with more pages.
+    """
+    aliases = sorted({alias for alias, _ in pending})
+    declarations = ['$owner: String!', '$name: String!', '$first: Int!']
+    milestone_fields = []
+    for alias in aliases:
+        declarations.append(f'${alias}_number: Int!')
+        connections = []
+        for connection, fragment in CONNECTIONS:
+            if (alias, connection) not in pending:
+                continue
+            declarations.append(f'${alias}_{connection}: String')
+            connections.append(
+                f'{connection}(first: $first, after: ${alias}_{connection}, '
+                f'orderBy: {{field: UPDATED_AT, direction: DESC}}) '
+                f'{{ pageInfo {{ hasNextPage endCursor }} nodes {{ ...{fragment} }} }}'
+            )
+        milestone_fields.append(f'{alias}: milestone(number: ${alias}_number) {{ {" ".join(connections)} }}')
+
+    return (f'query({", ".join(declarations)}) {{ '
+            f'repository(owner: $owner, name: $name) {{ {" ".join(milestone_fields)} }} }}'
+            + ISSUE_FRAGMENTS)
+
+def get_milestones_issues_graphql(owner, repo, milestones):
+    """
+    Fetch the issues and pull requests of several milestones with cursor
+    pagination, batching every milestone's next page into one query.
+    Returns ({milestone: [issue, ...]}, status_code, error); issue lists are
+    ordered most recently updated first, matching the REST engine.
+    """
+    numbers = {f'm{i}': int(milestone) for i, milestone in enumerate(milestones)}
+    collected = {(alias, connection): [] for alias in numbers for connection, _ in CONNECTIONS}
+    pending = {key: None for key in collected}
+
+    while pending:
+        variables = {'owner': owner, 'name': repo, 'first': PER_PAGE}
+        for alias, connection in pending:
+            variables[f'{alias}_number'] = numbers[alias]
+            variables[f'{alias}_{connection}'] = pending[(alias, connection)]
+
+        data, status_code, error = make_graphql_request(build_milestones_query(pending), variables)
+        if data is None:
+            return None, status_code, error
+        if data.get('repository') is None:
+            return None, http.HTTPStatus.NOT_FOUND, "Resource not found"
+
+        next_pending = {}
+        for alias, connection in pending:
+            milestone_data = data['repository'].get(alias)
+            if milestone_data is None:
+                logger.error(f"Milestone {numbers[alias]} not found in {owner}/{repo}")
+                return None, http.HTTPStatus.NOT_FOUND, "Resource not found"
+            page = milestone_data[connection]
+            collected[(alias, connection)].extend(to_rest_issue(node) for node in page['nodes'])
+            if page['pageInfo']['hasNextPage']:
+                next_pending[(alias, connection)] = page['pageInfo']['endCursor']
+        pending = next_pending
+
+    results = {}
+    for i, milestone in enumerate(milestones):
+        issues = collected[(f'm{i}', 'issues')] + collected[(f'm{i}', 'pullRequests')]
+        issues.sort(key=lambda issue: issue['updated_at'], reverse=True)
+        results[milestone] = issues
+    return results, http.HTTPStatus.OK, None
+
+@coalesce
+def get_all_issues_graphql(owner, repo, milestone):
+    """Drop-in replacement for get_all_issues that reads one milestone over GraphQL"""
+    if not str(milestone).isdigit():
+        # Milestone filters such as '*' and 'none' have no GraphQL equivalent
+        return get_all_issues(owner, repo, milestone)
+
+    results, status_code, error = get_milestones_issues_graphql(owner, repo, [milestone])
+    if results is None:
+        return None, status_code, error
+    issues = results[milestone]
+    logger.info(f"Fetched {len(issues)} issues for {owner}/{repo} milestone {milestone} over GraphQL")
+    return issues, http.HTTPStatus.OK, None
@@ -0,0 +1,20 @@
+from config import PORT, WEB_WORKERS, WEB_THREADS, WEB_TIMEOUT, stop_logging
+
+bind = f"0.0.0.0:{PORT}"
+workers = WEB_WORKERS
+# Requests mostly wait on GitHub, so each worker serves several at once on threads
+worker_class = 'gthread'
+threads = WEB_THREADS
+timeout = WEB_TIMEOUT
+graceful_timeout = 30
+# Each worker builds its own app after forking, so thread pools, event loops and
+# connections are never shared across a fork; use RESPONSE_CACHE_BACKEND=sqlite to share cached data
+preload_app = False
+accesslog = '-'
+# Metrics are kept per worker and labelled with its pid, and each scrape of /metrics reaches one worker.
+# Aggregate with sum without (worker) (rate(...[5m])); series of workers a scrape missed go stale until the next
+# scrape that reaches them, so run one worker where exact totals matter.
+
+def worker_exit(server, worker):
+    # Write out the worker's queued log records before it exits
+    stop_logging()
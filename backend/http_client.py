@@ -0,0 +1,140 @@
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+from config import POOL_CONNECTIONS, POOL_MAXSIZE, POOL_BLOCK, logger
+from rate_limit import rate_limiter
+import metrics
+
+class PoolStats:
+    """Thread-safe counters describing how the shared connection pool is used"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {'opened': 0, 'reused': 0, 'waited': 0, 'overflowed': 0}
+
+    def record(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+    def reset(self):
+        with self._lock:
+            for name in self._counts:
+                self._counts[name] = 0
+
+pool_stats = PoolStats()
+
+class _CountingPoolMixin:
+    """Record whether each checked-out connection was freshly opened or reused"""
+
+    def _get_conn(self, timeout=None):
+        # An empty queue means every connection is checked out by another thread. A blocking pool waits
+        # for one to come back; otherwise urllib3 opens an extra connection and discards it after use
+        if self.pool is not None and self.pool.empty():
+            pool_stats.record('waited' if self.block else 'overflowed')
+        conn = super()._get_conn(timeout=timeout)
+        # A connection without a socket (new, or dropped and reset) will connect again
+        if getattr(conn, 'sock', None) is None:
+            pool_stats.record('opened')
+        else:
+            pool_stats.record('reused')
+        return conn
+
+class CountingHTTPConnectionPool(_CountingPoolMixin, HTTPConnectionPool):
+    pass
+
+class CountingHTTPSConnectionPool(_CountingPoolMixin, HTTPSConnectionPool):
+    pass
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose per-host pools report usage to pool_stats"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': CountingHTTPConnectionPool,
+            'https': CountingHTTPSConnectionPool,
+        }
+
+def create_session():
+    """Create a requests session with retry logic and a keep-alive connection pool"""
+    session = requests.Session()
+    retry_strategy = Retry(
+        total=3,  # number of retries
+        backoff_factor=1,  # wait 1, 2, 4 seconds between retries
+        status_forcelist=[500, 502, 503, 504],  # HTTP status codes to retry on; rate limits are left to rate_limiter
+    )
+    adapter = PooledHTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,  # number of hosts to keep pools for
+        pool_maxsize=POOL_MAXSIZE,  # connections kept alive per host
+        pool_block=POOL_BLOCK,  # wait for a free connection instead of opening an extra one
+        max_retries=retry_strategy
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """Return the process-wide pooled session, creating it on first use"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                logger.info(f"Creating pooled HTTP session (pool_connections={POOL_CONNECTIONS}, pool_maxsize={POOL_MAXSIZE}, pool_block={POOL_BLOCK})")
+                _session = create_session()
+    return _session
+
+def send_github_request(method, url, token, resource='core', **kwargs):
+    """
+    Send a request with the pooled session once the rate limiter allows it,
+    returning (response, rate_limit_error). A request rejected by a rate
+    limit is retried once if its budget comes back within the allowed wait.
+    """
+    session = get_session()
+    for attempt in range(2):
+        with rate_limiter.request(token, resource) as limit_error:
+            if limit_error:
+                return None, limit_error
+            started = time.perf_counter()
+            try:
+                response = session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException:
+                metrics.record_upstream('requests', method, url, 'error', time.perf_counter() - started,
+                                        params=kwargs.get('params'))
+                raise
+            elapsed = time.perf_counter() - started
+        # The Retry adapter's retries of server errors are recorded on the urllib3 response
+        retries = getattr(response.raw, 'retries', None)
+        metrics.record_upstream('requests', method, url, response.status_code, elapsed,
+                                len(retries.history) if retries else 0, kwargs.get('params'))
+        limit_error = rate_limiter.update(token, response.status_code, response.headers, resource)
+        if not limit_error:
+            return response, None
+    return response, limit_error
+
+def close_session():
+    """Close the pooled session so the next call to get_session starts fresh"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+def get_pool_stats():
+    """Return connection pool counters and configuration"""
+    stats = pool_stats.snapshot()
+    stats.update({
+        'pool_connections': POOL_CONNECTIONS,
+        'pool_maxsize': POOL_MAXSIZE,
+        'pool_block': POOL_BLOCK
+    })
+    return stats
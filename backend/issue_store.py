@@ -0,0 +1,157 @@
+import json
+import os
+import sqlite3
+import threading
+import http
+from contextlib import contextmanager
+from config import GITHUB_API, ISSUE_STORE_PATH, logger
+from controllers import fetch_all_pages
+from payloads import shape_issue
+from single_flight import coalesce
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS issues (
+    owner TEXT NOT NULL,
+    repo TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    milestone INTEGER,
+    updated_at TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (owner, repo, number)
+);
+CREATE INDEX IF NOT EXISTS issues_by_milestone ON issues (owner, repo, milestone, updated_at);
+CREATE TABLE IF NOT EXISTS sync_state (
+    owner TEXT NOT NULL,
+    repo TEXT NOT NULL,
+    high_water TEXT,
+    PRIMARY KEY (owner, repo)
+);
+"""
+
+class IssueStore:
+    """
+    SQLite-backed copy of every issue in a repository, kept current by
+    fetching only issues updated since the last sync's high-water mark
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._sync_locks = {}
+        self._sync_locks_lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call keeps the store safe to use from any thread
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _sync_lock(self, owner, repo):
+        with self._sync_locks_lock:
+            return self._sync_locks.setdefault((owner, repo), threading.Lock())
+
+    def get_high_water(self, owner, repo):
+        with self._connect() as conn:
+            row = conn.execute('SELECT high_water FROM sync_state WHERE owner = ? AND repo = ?',
+                               (owner, repo)).fetchone()
+        return row[0] if row else None
+
+    def merge(self, owner, repo, issues, high_water):
+        """Upsert issues and advance the repository's high-water mark in one transaction"""
+        rows = [(
+            owner,
+            repo,
+            issue['number'],
+            (issue.get('milestone') or {}).get('number'),
+            issue['updated_at'],
+            json.dumps(dict(shape_issue(issue), updated_at=issue['updated_at']))
+        ) for issue in issues]
+        with self._connect() as conn:
+            conn.executemany('INSERT OR REPLACE INTO issues (owner, repo, number, milestone, updated_at, data) '
+                             'VALUES (?, ?, ?, ?, ?, ?)', rows)
+            conn.execute('INSERT OR REPLACE INTO sync_state (owner, repo, high_water) VALUES (?, ?, ?)',
+                         (owner, repo, high_water))
+
+    def delete_issue(self, owner, repo, number):
+        """Forget an issue that was deleted or transferred, which `since` never reports"""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM issues WHERE owner = ? AND repo = ? AND number = ?',
+                         (owner.lower(), repo.lower(), number))
+
+    def sync(self, owner, repo):
+        """Fetch issues updated since the high-water mark and merge them into the store"""
+        owner, repo = owner.lower(), repo.lower()
+        with self._sync_lock(owner, repo):
+            high_water = self.get_high_water(owner, repo)
+            params = {
+                'state': 'all',
+                'sort': 'updated',
+                'direction': 'asc'
+            }
+            if high_water:
+                params['since'] = high_water
+
+            url = f"{GITHUB_API}/repos/{owner}/{repo}/issues"
+            issues, status_code, error = fetch_all_pages(url, params, label=f"issues for {owner}/{repo} since {high_water}")
+            if issues is None:
+                return status_code, error
+
+            if issues:
+                # ISO-8601 UTC timestamps order correctly as strings
+                high_water = max([high_water or ''] + [issue['updated_at'] for issue in issues])
+                self.merge(owner, repo, issues, high_water)
+            logger.info(f"Synced {len(issues)} changed issues for {owner}/{repo}, high-water mark {high_water}")
+            return http.HTTPStatus.OK, None
+
+    def read_milestone(self, owner, repo, milestone):
+        """Return stored issues for a milestone number, '*' (any) or 'none', most recently updated first"""
+        owner, repo = owner.lower(), repo.lower()
+        query = 'SELECT data FROM issues WHERE owner = ? AND repo = ?'
+        args = [owner, repo]
+        if milestone == '*':
+            query += ' AND milestone IS NOT NULL'
+        elif milestone == 'none':
+            query += ' AND milestone IS NULL'
+        else:
+            query += ' AND milestone = ?'
+            args.append(int(milestone))
+        query += ' ORDER BY updated_at DESC, number DESC'
+        with self._connect() as conn:
+            return [json.loads(row[0]) for row in conn.execute(query, args)]
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_issue_store():
+    """Return the process-wide issue store, opening it on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                logger.info(f"Opening issue store at {ISSUE_STORE_PATH}")
+                _store = IssueStore(ISSUE_STORE_PATH)
+    return _store
+
+@coalesce
+def get_all_issues_incremental(owner, repo, milestone):
+    """
+    Drop-in replacement for get_all_issues that syncs the repository's
+    changed issues into the local store and reads the milestone from it
+    """
+    store = get_issue_store()
+    status_code, error = store.sync(owner, repo)
+    if error is not None:
+        return None, status_code, error
+    try:
+        return store.read_milestone(owner, repo, milestone), http.HTTPStatus.OK, None
+    except ValueError:
+        return None, http.HTTPStatus.BAD_REQUEST, f"Invalid milestone: {milestone}"
@@ -0,0 +1,171 @@
+import bisect
+import contextvars
+import os
+import threading
+from config import logger
+import timing
+
+# Histogram buckets: seconds for latencies, plain counts for calls and pages
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+def _format_labels(names, values, const=()):
+    """Format a sample's labels, after the (name, value) pairs in const that every sample carries"""
+    if not names and not const:
+        return ''
+    pairs = [f'{name}="{value}"' for name, value in const]
+    for name, value in zip(names, values):
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{escaped}"')
+    return '{' + ','.join(pairs) + '}'
+
+def _label_order(item):
+    # Label values mix types, e.g. status codes and 'error'
+    return tuple(str(value) for value in item[0])
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self, const=()):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items(), key=_label_order):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels, const)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}  # labels -> [per-bucket counts (last is +Inf), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self, const=()):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        labelnames = self.labelnames + ('le',)
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items(), key=_label_order):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                    cumulative += bucket_count
+                    le = bound if bound == '+Inf' else _format_value(bound)
+                    lines.append(f"{self.name}_bucket{_format_labels(labelnames, labels + (le,), const)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels, const)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels, const)} {count}")
+        return lines
+
+class MetricsRegistry:
+    """
+    Counters and histograms rendered in the Prometheus text format.
+    Recording takes one lock and a dict update; everything else happens at
+    scrape time, including collectors that turn existing stats() dicts into
+    samples. Values are per process, so every sample is labelled with the
+    worker's pid: a scrape reaches one gunicorn worker, and without the label
+    its counters would seem to jump or go back from one scrape to the next.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help_text, labelnames=()):
+        metric = Counter(name, help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collect):
+        """Register collect(), returning [(name, type, help, labelnames, [(label_values, value), ...]), ...]"""
+        self._collectors.append(collect)
+
+    def render(self):
+        const = (('worker', os.getpid()),)
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render(const))
+        for collect in self._collectors:
+            try:
+                families = collect()
+            except Exception as e:
+                logger.error(f"Metrics collector failed: {str(e)}")
+                continue
+            for name, metric_type, help_text, labelnames, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labelnames, labels, const)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+registry = MetricsRegistry()
+
+http_requests = registry.counter(
+    'changes_http_requests_total', 'API requests served', ('route', 'method', 'status'))
+http_request_duration = registry.histogram(
+    'changes_http_request_duration_seconds', 'API request latency', ('route', 'method'))
+upstream_requests = registry.counter(
+    'changes_upstream_requests_total', 'Requests sent to GitHub', ('client', 'method', 'status'))
+upstream_request_duration = registry.histogram(
+    'changes_upstream_request_duration_seconds', 'Latency of requests sent to GitHub', ('client', 'method'))
+upstream_retries = registry.counter(
+    'changes_upstream_retries_total', 'Retries of GitHub requests after server errors or rate limits', ('client',))
+upstream_calls_per_request = registry.histogram(
+    'changes_upstream_calls_per_request', 'GitHub requests made while serving one API request', ('route',),
+    COUNT_BUCKETS)
+pages_per_fetch = registry.histogram(
+    'changes_pages_per_fetch', 'Pages fetched by one paginated list fetch', ('kind',), COUNT_BUCKETS)
+
+# Upstream calls of the current API request; worker threads and the event loop share the caller's list
+_request_calls = contextvars.ContextVar('request_upstream_calls', default=None)
+
+def start_request():
+    """Start counting the upstream calls of the current request, returning a token for end_request"""
+    return _request_calls.set([])
+
+def end_request(reset_token, route):
+    calls = _request_calls.get()
+    _request_calls.reset(reset_token)
+    if calls is not None:
+        upstream_calls_per_request.observe(len(calls), route)
+
+def record_upstream(client, method, url, status, seconds, retries=0, params=None):
+    """Record one request sent to GitHub by client ('requests', 'aiohttp' or 'pygithub')"""
+    timing.record_upstream(client, method, url, params, status, seconds)
+    upstream_requests.inc(client, method, status)
+    upstream_request_duration.observe(seconds, client, method)
+    if retries:
+        upstream_retries.inc(client, amount=retries)
+    calls = _request_calls.get()
+    if calls is not None:
+        # list.append is atomic, so threads fetching pages for the same request can share the list
+        calls.append(None)
+
+def render():
+    return registry.render()
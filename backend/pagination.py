@@ -0,0 +1,74 @@
+import base64
+import json
+
+def encode_cursor(kind, key):
+    """Encode the sort key of the last item served as an opaque cursor"""
+    return base64.urlsafe_b64encode(json.dumps([kind, key]).encode('utf-8')).decode('ascii')
+
+# Shape of each listing's sort key (see payloads): a type, or a tuple of types for tuple keys
+KEY_SHAPES = {
+    'branches': (str, str),
+    'issues': int
+}
+
+def key_matches(key, shape):
+    if isinstance(shape, tuple):
+        return isinstance(key, tuple) and len(key) == len(shape) and all(map(key_matches, key, shape))
+    # bool is an int subclass, but never a valid key
+    return isinstance(key, shape) and not isinstance(key, bool)
+
+def decode_cursor(kind, cursor):
+    """Decode a cursor produced by encode_cursor for the same kind, raising ValueError otherwise"""
+    try:
+        cursor_kind, key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError, UnicodeError):
+        raise ValueError('Malformed cursor')
+    if cursor_kind != kind:
+        raise ValueError('Cursor belongs to a different listing')
+    # JSON turns tuple keys into lists
+    key = tuple(key) if isinstance(key, list) else key
+    if kind in KEY_SHAPES and not key_matches(key, KEY_SHAPES[kind]):
+        raise ValueError('Cursor does not hold a key of this listing')
+    return key
+
+def parse_page_params(args, default_limit, max_limit):
+    """
+    Read `limit` and `cursor` from request args.
+    Returns (limit, cursor, None), with limit None when pagination wasn't requested,
+    or (None, None, error message).
+    """
+    limit = args.get('limit')
+    cursor = args.get('cursor')
+    if limit is None and cursor is None:
+        return None, None, None
+    if limit is None:
+        return default_limit, cursor, None
+    if not limit.isdigit() or not 1 <= int(limit) <= max_limit:
+        return None, None, f'limit must be an integer between 1 and {max_limit}'
+    return int(limit), cursor, None
+
+def paginate(items, kind, sort_key, limit, cursor=None):
+    """
+    Return (page, next_cursor) for items already sorted ascending by sort_key.
+
+    Cursors hold the sort key of the last item served rather than an offset,
+    so a page stays correct when the underlying list is refreshed between calls.
+    """
+    start = 0
+    if cursor:
+        after = decode_cursor(kind, cursor)
+        # Binary search for the first item sorting after the cursor
+        low, high = 0, len(items)
+        while low < high:
+            middle = (low + high) // 2
+            if sort_key(items[middle]) <= after:
+                low = middle + 1
+            else:
+                high = middle
+        start = low
+
+    page = items[start:start + limit]
+    next_cursor = None
+    if start + limit < len(items):
+        next_cursor = encode_cursor(kind, sort_key(page[-1]))
+    return page, next_cursor
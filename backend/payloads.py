@@ -0,0 +1,53 @@
+def branch_sort_key(branch):
+    # Case-insensitive, with the exact name breaking ties so the order is total
+    return (branch['name'].lower(), branch['name'])
+
+def issue_sort_key(issue):
+    # Newest issue number first
+    return -issue['number']
+
+def shape_branch(branch):
+    return {'id': branch['name'], 'name': branch['name']}
+
+def shape_milestone(milestone):
+    return {
+        'id': milestone['number'],
+        'title': milestone['title'],
+        'description': milestone['description'],
+        'state': milestone['state']
+    }
+
+def shape_issue(issue):
+    return {
+        'number': issue['number'],
+        'title': issue['title'],
+        'state': issue['state'],
+        'created_at': issue['created_at'],
+        'closed_at': issue['closed_at'],
+        'html_url': issue['html_url'],
+        'body': issue['body']
+    }
+
+ISSUE_FIELDS = ('number', 'title', 'state', 'created_at', 'closed_at', 'html_url', 'body')
+
+def compact_issue(issue):
+    """Shape an issue without its body, which is cached and served separately"""
+    shaped = shape_issue(issue)
+    del shaped['body']
+    return shaped
+
+def project_issue(issue, fields):
+    return {field: issue[field] for field in fields}
+
+def parse_issue_fields(value):
+    """
+    Parse a comma-separated `fields` parameter into a tuple of issue fields.
+    Returns (fields, None), or (None, error message) for unknown fields.
+    """
+    if not value:
+        return ISSUE_FIELDS, None
+    fields = tuple(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in ISSUE_FIELDS]
+    if unknown or not fields:
+        return None, f"Unknown issue fields: {', '.join(unknown)}. Allowed: {', '.join(ISSUE_FIELDS)}"
+    return fields, None
@@ -0,0 +1,266 @@
+import contextvars
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+from config import (RATE_LIMIT_PACE_BELOW, RATE_LIMIT_RESERVE, RATE_LIMIT_MAX_WAIT, RATE_LIMIT_BACKGROUND_MAX_WAIT,
+                    logger)
+
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+
+# Priority of the upstream calls made by the current request or task
+_priority = contextvars.ContextVar('rate_limit_priority', default=INTERACTIVE)
+
+def set_priority(priority):
+    """Set the priority of upstream calls in the current context, returning a token for reset_priority"""
+    return _priority.set(priority)
+
+def reset_priority(reset_token):
+    _priority.reset(reset_token)
+
+@contextmanager
+def background_priority():
+    """Run the enclosed upstream calls as low-priority work, behind user-facing requests"""
+    reset_token = set_priority(BACKGROUND)
+    try:
+        yield
+    finally:
+        reset_priority(reset_token)
+
+def current_priority():
+    return _priority.get()
+
+def token_label(token):
+    """Identify a token in logs and stats without revealing it"""
+    return hashlib.sha256((token or '').encode()).hexdigest()[:8]
+
+class _Budget:
+    """What GitHub last reported about one token's quota for one resource"""
+
+    def __init__(self):
+        self.limit = None
+        self.remaining = None
+        self.reset_at = 0.0  # epoch seconds
+        self.blocked_until = 0.0  # epoch seconds, set by Retry-After on secondary limits
+        self.next_slot = 0.0  # monotonic time before which paced requests must wait
+        self.in_flight = 0
+        self.counts = {'requests': 0, 'paced': 0, 'waited_seconds': 0.0, 'deferred': 0, 'refused': 0, 'limited': 0}
+
+class RateLimitScheduler:
+    """
+    Gates every upstream GitHub call on the remaining quota of the token it
+    uses, as reported by the X-RateLimit-* headers. Requests are paced to
+    spread the remaining budget over the time left until it resets, and
+    background work waits for user-facing requests and never spends the
+    budget reserved for them.
+    """
+
+    def __init__(self, pace_below, reserve, max_wait, background_max_wait):
+        self.pace_below = pace_below
+        self.reserve = reserve
+        self.max_wait = max_wait
+        self.background_max_wait = background_max_wait
+        self._budgets = {}
+        self._interactive_in_flight = 0
+        self._idle_listeners = []
+        self._condition = threading.Condition()
+
+    def _budget(self, token, resource):
+        return self._budgets.setdefault((token_label(token), resource), _Budget())
+
+    def _interval(self, budget, now):
+        """Seconds to leave between requests so the remaining budget lasts until it resets"""
+        if budget.limit is None or budget.remaining is None or budget.reset_at <= now:
+            return 0.0
+        if budget.remaining > budget.limit * self.pace_below:
+            return 0.0
+        return (budget.reset_at - now) / max(budget.remaining, 1)
+
+    def _reserved(self, budget):
+        return budget.limit is not None and budget.remaining is not None and \
+            budget.remaining <= budget.limit * self.reserve
+
+    def acquire(self, token, resource='core', priority=None):
+        """
+        Wait until a request may be sent with token, and count it as in flight.
+        Returns None when the caller may proceed, or an error message when
+        the budget won't allow the request within the maximum wait.
+        """
+        wait, error = self.claim(token, resource, priority)
+        if error:
+            return error
+        if wait > 0:
+            logger.debug(f"Waiting {wait:.2f}s for {resource} budget of token {token_label(token)}")
+            time.sleep(wait)
+        return None
+
+    def interactive_in_flight(self):
+        with self._condition:
+            return self._interactive_in_flight
+
+    def claim(self, token, resource='core', priority=None, defer=True):
+        """
+        Count a request with token as in flight and return (wait, error): how
+        long the caller must wait before sending it, or why it may not be sent.
+        Unlike acquire this never sleeps, so event loops can wait themselves;
+        with defer=False background work doesn't block waiting for
+        interactive requests to finish, and the caller should do so first.
+        """
+        priority = priority or current_priority()
+        max_wait = self.max_wait if priority == INTERACTIVE else self.background_max_wait
+        deadline = time.monotonic() + max_wait
+
+        with self._condition:
+            budget = self._budget(token, resource)
+            if priority == BACKGROUND:
+                if self._reserved(budget):
+                    budget.counts['refused'] += 1
+                    return None, f"GitHub {resource} budget is reserved for interactive requests ({budget.remaining} remaining)"
+                # Background work yields to user-facing requests already in flight
+                if self._interactive_in_flight and defer:
+                    budget.counts['deferred'] += 1
+                while self._interactive_in_flight and defer:
+                    remaining_wait = deadline - time.monotonic()
+                    if remaining_wait <= 0:
+                        budget.counts['refused'] += 1
+                        return None, "Background request deferred too long behind interactive requests"
+                    self._condition.wait(remaining_wait)
+
+            now = time.time()
+            wait = 0.0
+            if budget.blocked_until > now:
+                wait = budget.blocked_until - now
+            elif budget.remaining is not None and budget.remaining <= 0 and budget.reset_at > now:
+                wait = budget.reset_at - now
+            interval = self._interval(budget, now)
+            if interval:
+                slot = max(budget.next_slot, time.monotonic())
+                budget.next_slot = slot + interval
+                wait = max(wait, slot - time.monotonic())
+                budget.counts['paced'] += 1
+
+            if time.monotonic() + wait > deadline:
+                budget.counts['refused'] += 1
+                return None, (f"GitHub rate limit exhausted for {resource} requests, "
+                              f"resets in {int(max(budget.reset_at, budget.blocked_until) - now)} seconds")
+
+            # Count the request against the budget now so concurrent callers see it
+            if budget.remaining is not None:
+                budget.remaining -= 1
+            budget.in_flight += 1
+            budget.counts['requests'] += 1
+            budget.counts['waited_seconds'] += wait
+            if priority == INTERACTIVE:
+                self._interactive_in_flight += 1
+        return wait, None
+
+    def release(self, token, resource='core', priority=None):
+        priority = priority or current_priority()
+        idle = False
+        with self._condition:
+            self._budget(token, resource).in_flight -= 1
+            if priority == INTERACTIVE:
+                self._interactive_in_flight -= 1
+                self._condition.notify_all()
+                idle = self._interactive_in_flight == 0
+        if idle:
+            for listener in self._idle_listeners:
+                listener()
+
+    def add_idle_listener(self, listener):
+        """
+        Call listener() whenever the last interactive request in flight is
+        released, for background work that waits outside claim(), e.g. on an event loop
+        """
+        self._idle_listeners.append(listener)
+
+    @contextmanager
+    def request(self, token, resource='core'):
+        """Hold a request slot for token, yielding None or the error that prevented it"""
+        priority = current_priority()
+        error = self.acquire(token, resource, priority)
+        if error:
+            yield error
+            return
+        try:
+            yield None
+        finally:
+            self.release(token, resource, priority)
+
+    def budget_left(self, token, resource='core'):
+        """Return the requests token has left for resource, or None if unknown or already reset"""
+        with self._condition:
+            budget = self._budgets.get((token_label(token), resource))
+            if budget is None or budget.remaining is None or budget.reset_at <= time.time():
+                return None
+            return budget.remaining
+
+    def record(self, token, remaining, limit, reset_at, resource='core'):
+        """Record the quota GitHub reported for token"""
+        with self._condition:
+            budget = self._budget(token, resource)
+            if reset_at > budget.reset_at:
+                # A new window started, so the reported budget replaces ours
+                budget.remaining = remaining
+            elif budget.remaining is None or remaining < budget.remaining:
+                # Responses arrive out of order; the lowest count within a window is the latest
+                budget.remaining = remaining
+            budget.limit = limit
+            budget.reset_at = max(budget.reset_at, reset_at)
+
+    def update(self, token, status_code, headers, resource=None):
+        """
+        Record the X-RateLimit-* headers of a response and return an error
+        message if the response was rejected by a primary or secondary rate limit
+        """
+        resource = resource or headers.get('X-RateLimit-Resource', 'core')
+        try:
+            remaining = int(headers['X-RateLimit-Remaining'])
+            self.record(token, remaining, int(headers['X-RateLimit-Limit']), float(headers['X-RateLimit-Reset']), resource)
+        except (KeyError, TypeError, ValueError):
+            remaining = None
+
+        if status_code not in (403, 429):
+            return None
+        retry_after = headers.get('Retry-After')
+        if retry_after is None and remaining != 0 and status_code == 403:
+            # A plain 403 is a permissions problem, not a rate limit
+            return None
+
+        with self._condition:
+            budget = self._budget(token, resource)
+            budget.counts['limited'] += 1
+            if retry_after is not None:
+                try:
+                    budget.blocked_until = time.time() + float(retry_after)
+                except ValueError:
+                    pass
+            wait = max(budget.reset_at, budget.blocked_until) - time.time()
+        logger.warning(f"GitHub {resource} rate limit hit for token {token_label(token)}, retry in {max(int(wait), 0)} seconds")
+        return f"GitHub rate limit exceeded, retry in {max(int(wait), 0)} seconds"
+
+    def headroom(self):
+        """Report each token's remaining budget, pacing and wait statistics"""
+        now = time.time()
+        with self._condition:
+            tokens = {}
+            for (label, resource), budget in self._budgets.items():
+                tokens.setdefault(label, {})[resource] = {
+                    'remaining': budget.remaining,
+                    'limit': budget.limit,
+                    'resets_in': max(int(budget.reset_at - now), 0) if budget.reset_at else None,
+                    'blocked_for': max(int(budget.blocked_until - now), 0),
+                    'pacing_interval': round(self._interval(budget, now), 3),
+                    'in_flight': budget.in_flight,
+                    **{name: round(value, 3) for name, value in budget.counts.items()}
+                }
+            return {
+                'interactive_in_flight': self._interactive_in_flight,
+                'pace_below': self.pace_below,
+                'reserve': self.reserve,
+                'tokens': tokens
+            }
+
+rate_limiter = RateLimitScheduler(RATE_LIMIT_PACE_BELOW, RATE_LIMIT_RESERVE, RATE_LIMIT_MAX_WAIT,
+                                  RATE_LIMIT_BACKGROUND_MAX_WAIT)
@@ -0,0 +1,95 @@
+import threading
+from config import REFRESH_WORKERS, REFRESH_MAX_PENDING, logger
+from rate_limit import background_priority
+
+# Request counts are halved once they add up to this, so popularity follows recent traffic
+DECAY_AFTER_REQUESTS = 10000
+
+class BackgroundRefresher:
+    """
+    Refreshes stale cache entries, and prefetches ones likely to be
+    requested soon, on a bounded pool of worker threads.
+    Each key is queued at most once, and when workers are busy the most
+    requested keys are refreshed first. Refreshes run at background
+    priority, behind user-facing upstream calls.
+    """
+
+    def __init__(self, workers, max_pending):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._pending = {}  # key -> refresh function
+        self._running = set()
+        self._requests = {}  # key -> recent request count
+        self._total_requests = 0
+        self._threads = []
+        self._condition = threading.Condition()
+        self._counts = {'scheduled': 0, 'refreshed': 0, 'failed': 0, 'dropped': 0}
+
+    def record_request(self, key):
+        """Count a request for key, raising its refresh priority"""
+        with self._condition:
+            self._requests[key] = self._requests.get(key, 0) + 1
+            self._total_requests += 1
+            if self._total_requests >= DECAY_AFTER_REQUESTS:
+                self._requests = {key: count // 2 for key, count in self._requests.items() if count > 1}
+                self._total_requests = sum(self._requests.values())
+
+    def schedule(self, key, refresh_fn):
+        """
+        Queue refresh_fn(), which returns (data, status_code, error), to refresh
+        key unless it is already queued or running or the queue is full
+        """
+        with self._condition:
+            if key in self._pending or key in self._running:
+                return False
+            if len(self._pending) >= self.max_pending:
+                self._counts['dropped'] += 1
+                logger.warning(f"Refresh queue is full, not refreshing {key}")
+                return False
+            self._pending[key] = refresh_fn
+            self._counts['scheduled'] += 1
+            if len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f"cache-refresh-{len(self._threads)}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+            self._condition.notify()
+            return True
+
+    def _next(self):
+        with self._condition:
+            while not self._pending:
+                self._condition.wait()
+            key = max(self._pending, key=lambda pending_key: self._requests.get(pending_key, 0))
+            self._running.add(key)
+            return key, self._pending.pop(key)
+
+    def _work(self):
+        while True:
+            key, refresh_fn = self._next()
+            logger.info(f"Refreshing cache entry {key}")
+            try:
+                with background_priority():
+                    _, status_code, error = refresh_fn()
+                outcome = 'failed' if error else 'refreshed'
+                if error:
+                    logger.warning(f"Background refresh of {key} failed with {status_code}: {error}")
+            except Exception as e:
+                outcome = 'failed'
+                logger.error(f"Background refresh of {key} raised: {str(e)}")
+            with self._condition:
+                self._running.discard(key)
+                self._counts[outcome] += 1
+
+    def stats(self):
+        with self._condition:
+            stats = dict(self._counts)
+            stats.update({
+                'workers': len(self._threads),
+                'max_workers': self.workers,
+                'pending': len(self._pending),
+                'running': len(self._running),
+                'tracked_keys': len(self._requests)
+            })
+            return stats
+
+refresher = BackgroundRefresher(REFRESH_WORKERS, REFRESH_MAX_PENDING)
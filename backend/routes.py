@@ -1,14 +1,159 @@
-from flask import Blueprint, request, jsonify
-from config import GITHUB_TOKEN, GITHUB_API, REQUEST_TIMEOUT, logger 
-from controllers import get_all_branches, get_all_milestones, get_all_issues
+from flask import Blueprint, Response, request, jsonify, stream_with_context, g as request_globals
+from config import (GITHUB_TOKEN, GITHUB_API, GITHUB_WEBHOOK_SECRET, REQUEST_TIMEOUT, FETCH_CONCURRENCY,
+                    RESPONSE_CACHE_TTLS, RESPONSE_CACHE_STALE_TTLS, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES,
+                    ISSUE_BODY_CACHE_MAX_ENTRIES, ISSUE_BODY_CACHE_MAX_BYTES, MAX_ISSUE_BODIES_PER_REQUEST,
+                    RESPONSE_CACHE_BACKEND, SHARED_CACHE_DIR, PREFETCH_MILESTONES, PREFETCH_REPOS,
+                    DEFAULT_PAGE_LIMIT, MAX_PAGE_LIMIT, MAX_BATCH_REPOS, BATCH_CONCURRENCY,
+                    ISSUE_SYNC_MODE, ISSUE_FETCH_ENGINE, UPSTREAM_ENGINE, request_id, logger)
+from controllers import (get_all_branches, get_all_milestones, get_milestone, get_all_issues, get_issue,
+                         iter_issue_pages, conditional_cache)
+from http_client import get_pool_stats
+from rate_limit import rate_limiter
+from token_pool import token_pool
+from github_registry import github_registry
+from cache import ResponseCache
+from shared_cache import SharedResponseCache
+from payloads import (ISSUE_FIELDS, branch_sort_key, issue_sort_key, shape_branch, shape_milestone, shape_issue,
+                      compact_issue, project_issue, parse_issue_fields)
+from pagination import parse_page_params, paginate
+from webhooks import verify_signature, apply_webhook_event
+from issue_store import get_all_issues_incremental, get_issue_store
+from graphql_engine import get_all_issues_graphql, get_milestones_issues_graphql
+from git_data import set_version, create_changelog_commit, create_branch
+from changelog import changelog_engine
+from single_flight import single_flight
+from refresher import refresher
+import metrics
+import timing
+import async_engine
 import http
-from github import GithubException, Github, Gist, InputFileContent
+from github import GithubException, Gist, InputFileContent
+import contextvars
+import json
+import os
 import re
 import time
+import uuid
+from datetime import datetime, timezone
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
 
 # Create a Blueprint for our API routes
 api = Blueprint('api', __name__)
 
+# The asyncio engine keeps every upstream REST request of this process on one event loop
+use_async_engine = UPSTREAM_ENGINE == 'asyncio'
+if use_async_engine and not async_engine.available():
+    logger.error("UPSTREAM_ENGINE is 'asyncio' but aiohttp is not installed; falling back to threads")
+    use_async_engine = False
+fetch_branches = async_engine.get_all_branches if use_async_engine else get_all_branches
+fetch_milestones = async_engine.get_all_milestones if use_async_engine else get_all_milestones
+
+# Incremental mode reads milestones from the local issue store instead of refetching them;
+# otherwise the deployment picks the REST or GraphQL fetch engine
+if ISSUE_SYNC_MODE == 'incremental':
+    fetch_issues = get_all_issues_incremental
+elif ISSUE_FETCH_ENGINE == 'graphql':
+    fetch_issues = get_all_issues_graphql
+elif use_async_engine:
+    fetch_issues = async_engine.get_all_issues
+else:
+    fetch_issues = get_all_issues
+
+def create_response_cache(name, max_entries, max_bytes):
+    """Create a response cache on the configured backend"""
+    if RESPONSE_CACHE_BACKEND == 'sqlite':
+        path = os.path.join(SHARED_CACHE_DIR, f"{name}.db")
+        logger.info(f"Sharing the {name} cache between workers at {path}")
+        return SharedResponseCache(path, RESPONSE_CACHE_TTLS, max_entries, max_bytes, RESPONSE_CACHE_STALE_TTLS)
+    return ResponseCache(RESPONSE_CACHE_TTLS, max_entries, max_bytes, RESPONSE_CACHE_STALE_TTLS)
+
+# Shaped payloads of the list endpoints, shared by every request in this process (or host, with sqlite)
+response_cache = create_response_cache('responses', RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES)
+# Issue bodies dominate issue payloads, so they are cached per issue and served on demand
+body_cache = create_response_cache('issue_bodies', ISSUE_BODY_CACHE_MAX_ENTRIES, ISSUE_BODY_CACHE_MAX_BYTES)
+
+def github_client(base_url=GITHUB_API, write=False):
+    """
+    Check out a shared PyGithub client. Reads use the pooled token with the
+    most quota left; writes use the write token. Each call the client makes
+    waits for the rate limiter, and the request holds the client until it ends.
+    """
+    token = token_pool.write_token if write else token_pool.read_token()
+    client = github_registry.checkout(base_url, token)
+    request_globals.setdefault('github_clients', {})[id(client)] = (client, base_url, token)
+    return client
+
+def authenticated_login(client):
+    """Return the login of the client's token, validated with GitHub at most once per TTL"""
+    _, base_url, token = request_globals.github_clients[id(client)]
+    return github_registry.authenticated_login(client, base_url, token)
+
+def get_repo_handle(client, full_name):
+    """Return a Repository handle for full_name, fetched from GitHub at most once per TTL"""
+    _, base_url, token = request_globals.github_clients[id(client)]
+    return github_registry.get_repo(client, base_url, token, full_name)
+
+# Request IDs sent by a proxy or the frontend are kept if they are safe to log
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+@api.before_request
+def start_request_trace():
+    """Give the request an ID for its log records and start timing its phases"""
+    incoming = request.headers.get('X-Request-ID', '')
+    request_globals.request_id = incoming if REQUEST_ID_PATTERN.match(incoming) else uuid.uuid4().hex[:16]
+    request_globals.request_id_token = request_id.set(request_globals.request_id)
+    request_globals.timing_token = timing.start_request()
+
+@api.after_request
+def add_trace_headers(response):
+    if 'timing_token' in request_globals:
+        response.headers['X-Request-ID'] = request_globals.request_id
+        response.headers['Server-Timing'] = timing.server_timing()
+    return response
+
+@api.teardown_request
+def end_request_trace(exc=None):
+    if 'timing_token' not in request_globals:
+        return
+    status = request_globals.get('response_status', http.HTTPStatus.INTERNAL_SERVER_ERROR.value)
+    timing.log_if_slow(request.method, request.full_path.rstrip('?'), status)
+    timing.end_request(request_globals.pop('timing_token'))
+    request_id.reset(request_globals.pop('request_id_token'))
+
+@api.before_request
+def start_request_metrics():
+    request_globals.started_at = time.perf_counter()
+    request_globals.metrics_token = metrics.start_request()
+
+@api.after_request
+def record_response_status(response):
+    request_globals.response_status = response.status_code
+    return response
+
+@api.teardown_request
+def check_in_github_clients(exc=None):
+    """Return the request's PyGithub clients to the registry"""
+    for client, base_url, token in request_globals.pop('github_clients', {}).values():
+        github_registry.checkin(base_url, token, client)
+
+@api.teardown_request
+def end_request_metrics(exc=None):
+    """Record the request's latency, status and upstream calls under its route pattern"""
+    if 'metrics_token' not in request_globals:
+        return
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    # after_request is skipped when the view raised, and Flask answers with a 500
+    status = request_globals.get('response_status', http.HTTPStatus.INTERNAL_SERVER_ERROR.value)
+    metrics.http_requests.inc(route, request.method, status)
+    metrics.http_request_duration.observe(time.perf_counter() - request_globals.started_at, route, request.method)
+    metrics.end_request(request_globals.pop('metrics_token'), route)
+
+def valid_repo_name(value):
+    """Check that an owner or repository name only uses characters GitHub allows"""
+    return bool(value) and all(c.isalnum() or c in '-_.' for c in value)
+
+@timing.timed('validate')
 def validate_repo_params():
     """Validate common repository parameters"""
     repo_owner = request.args.get('owner', '').strip()
@@ -21,7 +166,7 @@ def validate_repo_params():
         return None, (jsonify({'error': error_msg}), http.HTTPStatus.BAD_REQUEST)
     
     # Validate characters in repo owner and name
-    if not all(c.isalnum() or c in '-_.' for c in repo_owner) or not all(c.isalnum() or c in '-_.' for c in repo_name):
+    if not valid_repo_name(repo_owner) or not valid_repo_name(repo_name):
         error_msg = 'Repository owner and name can only contain alphanumeric characters, hyphens, underscores, and dots'
         logger.error(f"Validation failed: {error_msg}. Received owner='{repo_owner}', repo='{repo_name}'")
         return None, (jsonify({'error': error_msg}), http.HTTPStatus.BAD_REQUEST)
@@ -33,6 +178,25 @@ def validate_repo_params():
     
     return (repo_owner, repo_name), None
 
+def cached_payload(kind, repo_owner, repo_name, milestone, refresh_fn):
+    """
+    Return a payload from the response cache, or None. A stale payload is
+    still returned, and refresh_fn() is queued to refresh it in the background.
+    """
+    key = response_cache.make_key(kind, repo_owner, repo_name, milestone)
+    refresher.record_request(key)
+    payload, stale = response_cache.lookup(kind, repo_owner, repo_name, milestone)
+    if stale:
+        refresher.schedule(key, refresh_fn)
+    return payload
+
+def refresh_requested():
+    """Check whether the caller asked to bypass the response cache with ?refresh=true"""
+    if request.args.get('refresh', 'false').lower() == 'true':
+        response_cache.record_bypass()
+        return True
+    return False
+
 @api.route('/branches', methods=['GET'])
 def get_branches():
     """Get all branches for a repository"""
@@ -41,21 +205,45 @@ def get_branches():
         return error
     
     repo_owner, repo_name = params
-    logger.info(f"Fetching all branches for {repo_owner}/{repo_name}")
-    
-    branches, status_code, error_message = get_all_branches(repo_owner, repo_name)
-    
-    if branches is None:
+    limit, cursor, error_msg = parse_page_params(request.args, DEFAULT_PAGE_LIMIT, MAX_PAGE_LIMIT)
+    if error_msg:
+        logger.error(f"Validation failed: {error_msg}")
+        return jsonify({'error': error_msg}), http.HTTPStatus.BAD_REQUEST
+
+    branch_list, status_code, error_message = load_branches(repo_owner, repo_name, refresh_requested())
+    if branch_list is None:
         return jsonify({
             'error': 'Failed to fetch branches',
             'details': error_message
         }), status_code
+
+    if limit is not None:
+        return paginated_response(branch_list, 'branches', branch_sort_key, limit, cursor)
+    return jsonify(branch_list)
+
+def load_branches(repo_owner, repo_name, refresh=False):
+    """Return (branches, status_code, error) for a repository, from the response cache when possible"""
+    if not refresh:
+        cached = cached_payload('branches', repo_owner, repo_name, None,
+                                lambda: load_branches(repo_owner, repo_name, True))
+        if cached is not None:
+            logger.info(f"Serving {len(cached)} cached branches for {repo_owner}/{repo_name}")
+            return cached, http.HTTPStatus.OK, None
+
+    logger.info(f"Fetching all branches for {repo_owner}/{repo_name}")
     
-    branches.sort(key=lambda x: x['name'].lower())
-    branch_list = [{'id': branch['name'], 'name': branch['name']} for branch in branches]
+    branches, status_code, error_message = fetch_branches(repo_owner, repo_name)
+    
+    if branches is None:
+        return None, status_code, error_message
+    
+    with timing.phase('reshape'):
+        # Sorted once here; cached lists are already in order
+        branch_list = [shape_branch(branch) for branch in sorted(branches, key=branch_sort_key)]
+    response_cache.set('branches', repo_owner, repo_name, branch_list)
     
     logger.info(f"Successfully fetched {len(branch_list)} branches")
-    return jsonify(branch_list)
+    return branch_list, http.HTTPStatus.OK, None
 
 @api.route('/milestones', methods=['GET'])
 def get_milestones():
@@ -65,25 +253,200 @@ def get_milestones():
         return error
     
     repo_owner, repo_name = params
-    logger.info(f"Fetching all milestones for {repo_owner}/{repo_name}")
-    
-    milestones, status_code, error_message = get_all_milestones(repo_owner, repo_name)
-    
-    if milestones is None:
+    milestone_list, status_code, error_message = load_milestones(repo_owner, repo_name, refresh_requested())
+    if milestone_list is None:
         return jsonify({
             'error': 'Failed to fetch milestones',
             'details': error_message
         }), status_code
+    # The user picks a milestone next, so its issues are likely to be requested soon
+    prefetch_issues(repo_owner, repo_name, milestone_list)
+    return jsonify(milestone_list)
+
+def prefetch_issues(repo_owner, repo_name, milestone_list):
+    """Queue background fetches of the issues of the newest open milestones that aren't cached"""
+    open_milestones = [milestone['id'] for milestone in milestone_list if milestone['state'] == 'open']
+    missing = [milestone for milestone in sorted(open_milestones, reverse=True)[:PREFETCH_MILESTONES]
+               if response_cache.get('issues', repo_owner, repo_name, milestone) is None]
+    if batches_milestones() and len(missing) > 1:
+        # One query reads every missing milestone
+        refresher.schedule(('issues', repo_owner.lower(), repo_name.lower(), tuple(missing)),
+                           lambda: fetch_and_cache_milestones_issues(repo_owner, repo_name, missing))
+        return
+    for milestone in missing:
+        refresher.schedule(response_cache.make_key('issues', repo_owner, repo_name, milestone),
+                           lambda milestone=milestone: fetch_and_cache_issues(repo_owner, repo_name, milestone))
+
+def warm_repo(repo_owner, repo_name):
+    """Load a repository's branches and milestones into the cache and prefetch its milestones' issues"""
+    branch_list, status_code, error_message = load_branches(repo_owner, repo_name)
+    if branch_list is None:
+        return None, status_code, error_message
+    milestone_list, status_code, error_message = load_milestones(repo_owner, repo_name)
+    if milestone_list is None:
+        return None, status_code, error_message
+    prefetch_issues(repo_owner, repo_name, milestone_list)
+    return milestone_list, http.HTTPStatus.OK, None
+
+def warm_configured_repos():
+    """Queue warmup of every repository in PREFETCH_REPOS on the background refresh workers"""
+    for full_name in PREFETCH_REPOS:
+        repo_owner, _, repo_name = full_name.partition('/')
+        if not valid_repo_name(repo_owner) or not valid_repo_name(repo_name):
+            logger.error(f"Ignoring invalid repository in PREFETCH_REPOS: {full_name}")
+            continue
+        logger.info(f"Queueing warmup of {repo_owner}/{repo_name}")
+        refresher.schedule(('warmup', repo_owner.lower(), repo_name.lower()),
+                           lambda repo_owner=repo_owner, repo_name=repo_name: warm_repo(repo_owner, repo_name))
+
+def load_milestones(repo_owner, repo_name, refresh=False):
+    """Return (milestones, status_code, error) for a repository, from the response cache when possible"""
+    if not refresh:
+        cached = cached_payload('milestones', repo_owner, repo_name, None,
+                                lambda: load_milestones(repo_owner, repo_name, True))
+        if cached is not None:
+            logger.info(f"Serving {len(cached)} cached milestones for {repo_owner}/{repo_name}")
+            return cached, http.HTTPStatus.OK, None
+
+    logger.info(f"Fetching all milestones for {repo_owner}/{repo_name}")
+    
+    milestones, status_code, error_message = fetch_milestones(repo_owner, repo_name)
     
-    milestone_list = [{
-        'id': milestone['number'],
-        'title': milestone['title'],
-        'description': milestone['description'],
-        'state': milestone['state']
-    } for milestone in milestones]
+    if milestones is None:
+        return None, status_code, error_message
+    
+    with timing.phase('reshape'):
+        milestone_list = [shape_milestone(milestone) for milestone in milestones]
+    response_cache.set('milestones', repo_owner, repo_name, milestone_list)
     
     logger.info(f"Successfully fetched {len(milestone_list)} milestones")
-    return jsonify(milestone_list)
+    return milestone_list, http.HTTPStatus.OK, None
+
+def iter_fetched_issue_pages(repo_owner, repo_name, milestone):
+    """Yield (issues, status_code, error) pages from the configured fetch engine as they arrive"""
+    if fetch_issues is get_all_issues:
+        return iter_issue_pages(repo_owner, repo_name, milestone)
+    # The store, GraphQL and asyncio engines assemble the milestone in one piece
+    return iter([fetch_issues(repo_owner, repo_name, milestone)])
+
+def cache_issues(repo_owner, repo_name, milestone, issue_list):
+    """Cache a milestone's shaped issues without bodies, caching each body separately"""
+    body_cache.set_many('issue_body', repo_owner, repo_name,
+                        {issue['number']: {'body': issue['body']} for issue in issue_list})
+    response_cache.set('issues', repo_owner, repo_name, [compact_issue(issue) for issue in issue_list], milestone)
+
+def fetch_and_cache_issues(repo_owner, repo_name, milestone):
+    """Return (issues, status_code, error) fetched from the configured engine, caching the shaped issues"""
+    logger.info(f"Fetching issues for {repo_owner}/{repo_name}, milestone: {milestone}")
+    
+    issues, status_code, error_message = fetch_issues(repo_owner, repo_name, milestone)
+    
+    if issues is None:
+        return None, status_code, error_message
+    
+    with timing.phase('reshape'):
+        issue_list = [shape_issue(issue) for issue in issues]
+    cache_issues(repo_owner, repo_name, milestone, issue_list)
+    logger.info(f"Successfully fetched {len(issue_list)} issues")
+    return issue_list, http.HTTPStatus.OK, None
+
+def batches_milestones():
+    """Whether the fetch engine can read several milestones of a repository in one request"""
+    return fetch_issues is get_all_issues_graphql
+
+def fetch_and_cache_milestones_issues(repo_owner, repo_name, milestones):
+    """
+    Return ({milestone: issues}, status_code, error) for several numbered
+    milestones read in one batched GraphQL query, caching each milestone's shaped issues
+    """
+    logger.info(f"Fetching issues for {repo_owner}/{repo_name}, milestones: {', '.join(map(str, milestones))}")
+    results, status_code, error_message = get_milestones_issues_graphql(repo_owner, repo_name, milestones)
+    if results is None:
+        return None, status_code, error_message
+
+    issue_lists = {}
+    for milestone, issues in results.items():
+        with timing.phase('reshape'):
+            issue_lists[milestone] = [shape_issue(issue) for issue in issues]
+        cache_issues(repo_owner, repo_name, milestone, issue_lists[milestone])
+    logger.info(f"Successfully fetched {sum(map(len, issue_lists.values()))} issues of {len(issue_lists)} milestones")
+    return issue_lists, http.HTTPStatus.OK, None
+
+def load_issues(repo_owner, repo_name, milestone, refresh=False):
+    """Return (issues, status_code, error) for a milestone, from the response cache when possible"""
+    if not refresh:
+        issue_list = get_cached_issues(repo_owner, repo_name, milestone, True)
+        if issue_list is not None:
+            logger.info(f"Serving {len(issue_list)} cached issues for {repo_owner}/{repo_name}, milestone: {milestone}")
+            return issue_list, http.HTTPStatus.OK, None
+    return fetch_and_cache_issues(repo_owner, repo_name, milestone)
+
+def get_cached_issues(repo_owner, repo_name, milestone, with_body):
+    """Return the cached milestone, with bodies if asked, or None if it or a needed body isn't cached"""
+    refresh_fn = lambda: fetch_and_cache_issues(repo_owner, repo_name, milestone)
+    compact = cached_payload('issues', repo_owner, repo_name, milestone, refresh_fn)
+    if compact is None or not with_body:
+        return compact
+
+    issue_list = []
+    stale_bodies = False
+    cached_bodies = body_cache.lookup_many('issue_body', repo_owner, repo_name, [issue['number'] for issue in compact])
+    with timing.phase('reshape'):
+        for issue in compact:
+            cached_body, stale = cached_bodies[issue['number']]
+            if cached_body is None:
+                # Bodies are evicted independently; refetch the milestone rather than serve it partially
+                return None
+            stale_bodies = stale_bodies or stale
+            issue_list.append(dict(issue, body=cached_body['body']))
+    if stale_bodies:
+        # Refetching the milestone refreshes its bodies too
+        refresher.schedule(response_cache.make_key('issues', repo_owner, repo_name, milestone), refresh_fn)
+    return issue_list
+
+def paginated_response(items, kind, sort_key, limit, cursor, transform=None):
+    """Serve one page of items as {'items', 'next_cursor'}"""
+    try:
+        with timing.phase('reshape'):
+            page, next_cursor = paginate(items, kind, sort_key, limit, cursor)
+    except ValueError as e:
+        error_msg = f'Invalid cursor: {str(e)}'
+        logger.error(error_msg)
+        return jsonify({'error': error_msg}), http.HTTPStatus.BAD_REQUEST
+    if transform:
+        with timing.phase('reshape'):
+            page = [transform(item) for item in page]
+    return jsonify({'items': page, 'next_cursor': next_cursor})
+
+def stream_issues(repo_owner, repo_name, milestone, fields):
+    """Stream a milestone's issues as NDJSON, one line per issue, page by page"""
+    pages = iter_fetched_issue_pages(repo_owner, repo_name, milestone)
+
+    # Fetch the first page up front so an immediate failure still gets a proper status code
+    first_page, status_code, error_message = next(pages)
+    if first_page is None:
+        return jsonify({
+            'error': 'Failed to fetch issues',
+            'details': error_message
+        }), status_code
+
+    # The request context, and with it the request's priority, timings and metrics, is kept until the
+    # stream ends, so teardown records every page; Server-Timing was sent with the headers and covers page 1
+    @stream_with_context
+    def generate():
+        count = 0
+        for page, status_code, error_message in chain([(first_page, http.HTTPStatus.OK, None)], pages):
+            if page is None:
+                # Headers are already sent, so report the failure in-band
+                logger.error(f"Issue stream for {repo_owner}/{repo_name} milestone {milestone} failed after {count} issues: {error_message}")
+                yield json.dumps({'error': 'Failed to fetch issues', 'details': error_message, 'status': int(status_code)}) + '\n'
+                return
+            for issue in page:
+                yield json.dumps(project_issue(shape_issue(issue), fields)) + '\n'
+            count += len(page)
+        logger.info(f"Successfully streamed {count} issues")
+
+    return Response(generate(), mimetype='application/x-ndjson')
 
 @api.route('/issues', methods=['GET'])
 def get_issues():
@@ -99,29 +462,297 @@ def get_issues():
         error_msg = 'Missing milestone parameter'
         logger.error(f"{error_msg}. owner: {repo_owner}, repo: {repo_name}")
         return jsonify({'error': error_msg}), http.HTTPStatus.BAD_REQUEST
+
+    fields, error_msg = parse_issue_fields(request.args.get('fields'))
+    if error_msg:
+        logger.error(f"Validation failed: {error_msg}")
+        return jsonify({'error': error_msg}), http.HTTPStatus.BAD_REQUEST
     
-    logger.info(f"Fetching issues for {repo_owner}/{repo_name}, milestone: {milestone}")
-    
-    issues, status_code, error_message = get_all_issues(repo_owner, repo_name, milestone)
-    
+    limit, cursor, error_msg = parse_page_params(request.args, DEFAULT_PAGE_LIMIT, MAX_PAGE_LIMIT)
+    stream = request.args.get('stream') == 'ndjson'
+    if not error_msg and stream and limit is not None:
+        error_msg = 'limit and cursor cannot be combined with stream'
+    if error_msg:
+        logger.error(f"Validation failed: {error_msg}")
+        return jsonify({'error': error_msg}), http.HTTPStatus.BAD_REQUEST
+
+    issue_list = None
+    if not refresh_requested():
+        issue_list = get_cached_issues(repo_owner, repo_name, milestone, 'body' in fields)
+        if issue_list is not None:
+            logger.info(f"Serving {len(issue_list)} cached issues for {repo_owner}/{repo_name}, milestone: {milestone}")
+            if stream:
+                return Response((json.dumps(project_issue(issue, fields)) + '\n' for issue in issue_list),
+                                mimetype='application/x-ndjson')
+
+    if issue_list is None:
+        if stream:
+            # Streamed issues are never buffered, so they are not added to the response cache
+            logger.info(f"Streaming issues for {repo_owner}/{repo_name}, milestone: {milestone}")
+            return stream_issues(repo_owner, repo_name, milestone, fields)
+
+        issue_list, status_code, error_message = fetch_and_cache_issues(repo_owner, repo_name, milestone)
+        if issue_list is None:
+            return jsonify({
+                'error': 'Failed to fetch issues',
+                'details': error_message
+            }), status_code
+
+    if limit is not None:
+        with timing.phase('reshape'):
+            # Pages are ordered by issue number, which unlike update time never changes between pages
+            issue_list = sorted(issue_list, key=issue_sort_key)
+        return paginated_response(issue_list, 'issues', issue_sort_key, limit, cursor,
+                                  lambda issue: project_issue(issue, fields))
+    if fields != ISSUE_FIELDS:
+        with timing.phase('reshape'):
+            issue_list = [project_issue(issue, fields) for issue in issue_list]
+    return jsonify(issue_list) 
+
+def get_issue_bodies(repo_owner, repo_name, numbers):
+    """
+    Return {'bodies': {number: body}, 'missing': [number, ...]} for the given
+    issue numbers, fetching bodies missing from the body cache concurrently.
+    Issues GitHub doesn't have are listed as missing rather than failing the batch.
+    """
+    bodies = {}
+    uncached = []
+    for number in numbers:
+        cached_body = body_cache.get('issue_body', repo_owner, repo_name, number)
+        if cached_body is None:
+            uncached.append(number)
+        else:
+            bodies[number] = cached_body['body']
+
+    not_found = []
+    if uncached:
+        if use_async_engine:
+            results = async_engine.get_issues(repo_owner, repo_name, uncached)
+        else:
+            with ThreadPoolExecutor(max_workers=min(FETCH_CONCURRENCY, len(uncached))) as executor:
+                # Workers run in copies of the request's context, keeping its ID, timings and priority
+                futures = [executor.submit(contextvars.copy_context().run, get_issue, repo_owner, repo_name, number)
+                           for number in uncached]
+                results = [future.result() for future in futures]
+        fetched = {number: {'body': issue['body']} for number, (issue, _, _) in zip(uncached, results) if issue}
+        body_cache.set_many('issue_body', repo_owner, repo_name, fetched)
+        for number, (issue, status_code, error_message) in zip(uncached, results):
+            if issue is None and status_code == http.HTTPStatus.NOT_FOUND:
+                not_found.append(number)
+            elif issue is None:
+                return None, status_code, error_message
+        bodies.update((number, entry['body']) for number, entry in fetched.items())
+
+    return {
+        'bodies': {number: bodies[number] for number in numbers if number in bodies},
+        'missing': [number for number in numbers if number in not_found]
+    }, http.HTTPStatus.OK, None
+
+@api.route('/issues/<int:issue_number>/body', methods=['GET'])
+def get_issue_body(issue_number):
+    """Get the body of a single issue"""
+    params, error = validate_repo_params()
+    if error:
+        return error
+
+    repo_owner, repo_name = params
+    result, status_code, error_message = get_issue_bodies(repo_owner, repo_name, [issue_number])
+    if result is not None and result['missing']:
+        result, status_code, error_message = None, http.HTTPStatus.NOT_FOUND, "Resource not found"
+    if result is None:
+        return jsonify({
+            'error': 'Failed to fetch issue body',
+            'details': error_message
+        }), status_code
+    return jsonify({'number': issue_number, 'body': result['bodies'][issue_number]})
+
+@api.route('/issues/bodies', methods=['GET'])
+def get_issue_bodies_batch():
+    """Get the bodies of several issues, given as ?numbers=1,2,3, listing numbers GitHub doesn't have as missing"""
+    params, error = validate_repo_params()
+    if error:
+        return error
+
+    repo_owner, repo_name = params
+    try:
+        numbers = list(dict.fromkeys(int(number) for number in request.args.get('numbers', '').split(',') if number.strip()))
+    except ValueError:
+        numbers = None
+    if not numbers or len(numbers) > MAX_ISSUE_BODIES_PER_REQUEST:
+        error_msg = f'numbers must be a comma-separated list of 1 to {MAX_ISSUE_BODIES_PER_REQUEST} issue numbers'
+        logger.error(f"Validation failed: {error_msg}. Received numbers='{request.args.get('numbers', '')}'")
+        return jsonify({'error': error_msg}), http.HTTPStatus.BAD_REQUEST
+
+    result, status_code, error_message = get_issue_bodies(repo_owner, repo_name, numbers)
+    if result is None:
+        return jsonify({
+            'error': 'Failed to fetch issue bodies',
+            'details': error_message
+        }), status_code
+
+    logger.info(f"Served {len(result['bodies'])} issue bodies for {repo_owner}/{repo_name}, "
+                f"{len(result['missing'])} not found")
+    return jsonify(result)
+
+@api.route('/changelog', methods=['GET'])
+def get_changelog():
+    """Render the CHANGES.md section for a milestone's issues"""
+    params, error = validate_repo_params()
+    if error:
+        return error
+
+    repo_owner, repo_name = params
+    milestone = request.args.get('milestone', '').strip()
+    if not milestone.isdigit():
+        error_msg = 'milestone must be a milestone number'
+        logger.error(f"Validation failed: {error_msg}. Received milestone='{milestone}'")
+        return jsonify({'error': error_msg}), http.HTTPStatus.BAD_REQUEST
+
+    selected = None
+    if request.args.get('issues'):
+        try:
+            selected = {int(number) for number in request.args['issues'].split(',') if number.strip()}
+        except ValueError:
+            error_msg = 'issues must be a comma-separated list of issue numbers'
+            logger.error(f"Validation failed: {error_msg}. Received issues='{request.args['issues']}'")
+            return jsonify({'error': error_msg}), http.HTTPStatus.BAD_REQUEST
+
+    title = request.args.get('title', '').strip()
+    if not title:
+        milestone_data, status_code, error_message = get_milestone(repo_owner, repo_name, milestone)
+        if milestone_data is None:
+            return jsonify({
+                'error': 'Failed to fetch milestone',
+                'details': error_message
+            }), status_code
+        title = milestone_data['title']
+
+    # Raw issues carry updated_at, which keys the per-issue memo
+    issues, status_code, error_message = fetch_issues(repo_owner, repo_name, milestone)
     if issues is None:
         return jsonify({
             'error': 'Failed to fetch issues',
             'details': error_message
         }), status_code
-    
-    issue_list = [{
-        'number': issue['number'],
-        'title': issue['title'],
-        'state': issue['state'],
-        'created_at': issue['created_at'],
-        'closed_at': issue['closed_at'],
-        'html_url': issue['html_url'],
-        'body': issue['body']
-    } for issue in issues]
-    
-    logger.info(f"Successfully fetched {len(issue_list)} issues")
-    return jsonify(issue_list) 
+    if selected is not None:
+        issues = [issue for issue in issues if issue['number'] in selected]
+
+    date = request.args.get('date') or datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    content, invalid_notes = changelog_engine.render(repo_owner, repo_name, issues, title, date,
+                                                     request.args.get('important', ''),
+                                                     request.args.get('announcement', ''))
+    if content is None:
+        error_msg = 'No valid release notes found in the selected issues'
+        logger.error(f"{error_msg} for {repo_owner}/{repo_name} milestone {milestone}")
+        return jsonify({'error': error_msg, 'invalid_notes': invalid_notes}), http.HTTPStatus.UNPROCESSABLE_ENTITY
+
+    logger.info(f"Rendered changelog for {repo_owner}/{repo_name} milestone {milestone} from {len(issues)} issues")
+    return jsonify({'content': content, 'title': title, 'date': date, 'invalid_notes': invalid_notes})
+
+@timing.timed('validate')
+def parse_batch_entries(payload):
+    """Validate a batch request body, returning ([(owner, repo, milestone), ...], error)"""
+    entries = payload.get('repos') if isinstance(payload, dict) else None
+    if not isinstance(entries, list) or not 0 < len(entries) <= MAX_BATCH_REPOS:
+        return None, f'repos must be a list of 1 to {MAX_BATCH_REPOS} {{owner, repo, milestone}} entries'
+
+    parsed = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            return None, f'Invalid batch entry: {entry!r}'
+        repo_owner = str(entry.get('owner', '')).strip()
+        repo_name = str(entry.get('repo', '')).strip()
+        if not valid_repo_name(repo_owner) or not valid_repo_name(repo_name):
+            return None, f"Invalid repository '{repo_owner}/{repo_name}'"
+        milestone = entry.get('milestone')
+        parsed.append((repo_owner, repo_name, str(milestone) if milestone not in (None, '') else None))
+    return parsed, None
+
+def prefetch_batch_issues(executor, entries, refresh):
+    """
+    Fetch the issues of the milestones that batch entries ask for in the
+    same repository with one query per repository, when the engine can.
+    Returns {(owner, repo, milestone): issues} for the milestones fetched.
+    """
+    if not batches_milestones():
+        return {}
+    wanted = {}
+    for repo_owner, repo_name, milestone in entries:
+        # Milestone filters such as '*' and 'none' have no GraphQL equivalent
+        if milestone is None or not milestone.isdigit():
+            continue
+        if refresh or response_cache.get('issues', repo_owner, repo_name, milestone) is None:
+            milestones = wanted.setdefault((repo_owner, repo_name), [])
+            if milestone not in milestones:
+                milestones.append(milestone)
+
+    # A single milestone goes through the configured engine, where concurrent fetches of it are coalesced
+    groups = [(repo_owner, repo_name, milestones)
+              for (repo_owner, repo_name), milestones in wanted.items() if len(milestones) > 1]
+    futures = [executor.submit(contextvars.copy_context().run, fetch_and_cache_milestones_issues, *group)
+               for group in groups]
+    prefetched = {}
+    for (repo_owner, repo_name, milestones), future in zip(groups, futures):
+        issue_lists, status_code, error_message = future.result()
+        if issue_lists is None:
+            # Each entry is retried on its own, so it reports its own failure
+            logger.warning(f"Batched issue fetch for {repo_owner}/{repo_name} failed with {status_code}: {error_message}")
+            continue
+        prefetched.update({(repo_owner, repo_name, milestone): issues for milestone, issues in issue_lists.items()})
+    return prefetched
+
+def load_batch_entry(repo_owner, repo_name, milestone, refresh, issue_list=None):
+    """
+    Load one batch entry's milestones and, if asked, issues, reporting a
+    failure in the result. issue_list is the milestone's issues if they were already fetched.
+    """
+    result = {'owner': repo_owner, 'repo': repo_name}
+    milestone_list, status_code, error_message = load_milestones(repo_owner, repo_name, refresh)
+    if milestone_list is None:
+        result.update({'error': 'Failed to fetch milestones', 'details': error_message, 'status': int(status_code)})
+        return result
+    result['milestones'] = milestone_list
+
+    if milestone is not None:
+        result['milestone'] = milestone
+        if issue_list is None:
+            issue_list, status_code, error_message = load_issues(repo_owner, repo_name, milestone, refresh)
+        if issue_list is None:
+            result.update({'error': 'Failed to fetch issues', 'details': error_message, 'status': int(status_code)})
+            return result
+        result['issues'] = issue_list
+    return result
+
+@api.route('/batch', methods=['POST'])
+def get_batch():
+    """
+    Get milestones, and issues where a milestone is given, for several
+    repositories at once from {"repos": [{"owner", "repo", "milestone"}, ...]}
+    """
+    if not GITHUB_TOKEN:
+        error_msg = 'GitHub token is not configured'
+        logger.error(error_msg)
+        return jsonify({'error': error_msg}), http.HTTPStatus.UNAUTHORIZED
+
+    entries, error_msg = parse_batch_entries(request.get_json(silent=True))
+    if error_msg:
+        logger.error(f"Validation failed: {error_msg}")
+        return jsonify({'error': error_msg}), http.HTTPStatus.BAD_REQUEST
+
+    refresh = refresh_requested()
+    workers = min(BATCH_CONCURRENCY, len(entries))
+    logger.info(f"Fetching batch of {len(entries)} repositories with {workers} workers")
+    # Each repository fails on its own, so a slow or broken one never holds back the others' results
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        prefetched = prefetch_batch_issues(executor, entries, refresh)
+        futures = [executor.submit(contextvars.copy_context().run, load_batch_entry, *entry, refresh,
+                                   prefetched.get(entry))
+                   for entry in entries]
+        results = [future.result() for future in futures]
+
+    failed = sum(1 for result in results if 'error' in result)
+    logger.info(f"Batch finished: {len(results) - failed} succeeded, {failed} failed")
+    return jsonify({'results': results})
 
 @api.route('/push-content', methods=['POST'])
 def push_content():
@@ -167,16 +798,12 @@ def push_content():
         try:
             # Initialize GitHub with token from environment
             logger.debug("Initializing GitHub client")
-            g = Github(
-                base_url=GITHUB_API,
-                login_or_token=GITHUB_TOKEN,
-                timeout=REQUEST_TIMEOUT
-            )
+            g = github_client(write=True)
             
             # First verify the authenticated user
             try:
-                user = g.get_user()
-                logger.info(f"Successfully authenticated as: {user.login}")
+                login = authenticated_login(g)
+                logger.info(f"Successfully authenticated as: {login}")
             except GithubException as e:
                 error_msg = f'Authentication failed: {str(e)}. Please check your access token.'
                 logger.error(f"Authentication error: {str(e)}")
@@ -187,7 +814,7 @@ def push_content():
             # Try to get the repository
             try:
                 logger.info(f"Attempting to access repository: {repo_owner}/{repo_name}")
-                repo = g.get_repo(f"{repo_owner}/{repo_name}")
+                repo = get_repo_handle(g, f"{repo_owner}/{repo_name}")
             except GithubException as e:
                 if e.status == 404:
                     error_msg = f'Repository {repo_owner}/{repo_name} not found. Please check the repository owner and name.'
@@ -294,14 +921,10 @@ def fetch_content():
 
         try:
             # Initialize GitHub with token from environment
-            g = Github(
-                base_url=GITHUB_API,
-                login_or_token=GITHUB_TOKEN,
-                timeout=REQUEST_TIMEOUT
-            )
+            g = github_client()
             
             # Get the repository
-            repo = g.get_repo(f"{owner}/{repo_name}")
+            repo = get_repo_handle(g, f"{owner}/{repo_name}")
             
             # Get the file content
             file_content = repo.get_contents(file_name, ref=branch)
@@ -352,16 +975,12 @@ def update_version():
         new_version = data['version'].strip()
         commit_message = data['commitMessage'].strip()
 
-        # Initialize GitHub client
-        g = Github(
-            base_url=GITHUB_API,
-            login_or_token=GITHUB_TOKEN,
-            timeout=REQUEST_TIMEOUT
-        )
-
         try:
+            # Initialize GitHub client
+            g = github_client(write=True)
+
             # Get the repository
-            repo = g.get_repo(f"{repo_owner}/{repo_name}")
+            repo = get_repo_handle(g, f"{repo_owner}/{repo_name}")
             
             # Use the hardcoded path for __init__.py
             file_path = 'auditree-central/__init__.py'
@@ -373,30 +992,7 @@ def update_version():
                 file_path = 'auditree_central/__init__.py'
                 file = repo.get_contents(file_path, ref=branch_name)
             
-            # Read current content
-            current_content = file.decoded_content.decode('utf-8')
-            
-            # Find docstring position if it exists
-            docstring_end = current_content.find('"""', current_content.find('"""') + 3) if '"""' in current_content else -1
-            
-            # Remove all version declarations
-            cleaned_content = re.sub(r"__version__\s*=\s*['\"]([^'\"]+)['\"]", "", current_content)
-            
-            # Determine where to insert the version
-            if docstring_end != -1:
-                # Find position after docstring
-                insert_position = docstring_end + 3
-                while insert_position < len(cleaned_content) and cleaned_content[insert_position] in ['\n', '\r', ' ', '\t']:
-                    insert_position += 1
-                
-                # Insert version after docstring with proper spacing
-                new_content = cleaned_content[:insert_position] + f"\n\n__version__ = '{new_version}'" + cleaned_content[insert_position:]
-            else:
-                # No docstring found, add at beginning
-                new_content = f"__version__ = '{new_version}'\n\n" + cleaned_content
-            
-            # Clean up any excessive newlines
-            new_content = re.sub(r'\n{3,}', '\n\n', new_content)
+            new_content = set_version(file.decoded_content.decode('utf-8'), new_version)
             
             # Update the file
             result = repo.update_file(
@@ -406,6 +1002,8 @@ def update_version():
                 sha=file.sha,
                 branch=branch_name
             )
+            response_cache.invalidate_repo(repo_owner, repo_name)
+            body_cache.invalidate_repo(repo_owner, repo_name)
 
             logger.info(f"Successfully updated version to {new_version}")
             return jsonify({
@@ -459,143 +1057,25 @@ def create_pull_request():
         pr_body = data['prBody'].strip()
         milestone = data['milestone'].strip()
 
-        # Initialize GitHub client
-        g = Github(
-            base_url=GITHUB_API,
-            login_or_token=GITHUB_TOKEN,
-            timeout=REQUEST_TIMEOUT
-        )
-
         try:
-            # Get the repository
-            repo = g.get_repo(f"{repo_owner}/{repo_name}")
+            # Initialize GitHub client
+            g = github_client(write=True)
+
+            # Lazy: the repository is only addressed by name, so no request is made for it
+            repo = g.get_repo(f"{repo_owner}/{repo_name}", lazy=True)
+            
+            # Both file changes go into one commit built with the Git Data API
+            commit, init_path = create_changelog_commit(repo, base_branch, new_content, new_version)
             
             # Create a new branch for the PR using milestone instead of timestamp
             # Sanitize milestone for branch name (remove spaces and special characters)
             sanitized_milestone = ''.join(c if c.isalnum() else '-' for c in milestone)
-            new_branch_name = f"update-changelog-{sanitized_milestone}"
-            
-            # Check if branch already exists, if so, add timestamp for uniqueness
-            try:
-                repo.get_branch(new_branch_name)
-                # Branch exists, add timestamp to make it unique
-                timestamp = int(time.time())
-                new_branch_name = f"update-changelog-{sanitized_milestone}-{timestamp}"
-                logger.info(f"Branch already exists, using unique name: {new_branch_name}")
-            except GithubException as e:
-                if e.status != 404:  # Error other than "not found"
-                    raise e
-                # If 404, branch doesn't exist which is what we want
-                pass
-            
-            # Get the reference to the base branch
-            base_ref = repo.get_git_ref(f"heads/{base_branch}")
-            base_sha = base_ref.object.sha
-            
-            # Create new branch
-            repo.create_git_ref(f"refs/heads/{new_branch_name}", base_sha)
+            new_branch_name = create_branch(repo, f"update-changelog-{sanitized_milestone}", commit.sha)
             logger.info(f"Created new branch: {new_branch_name}")
-            
-            # Update CHANGES.md in the new branch
-            try:
-                # Try to get the existing file
-                changes_file = repo.get_contents("CHANGES.md", ref=new_branch_name)
-                existing_content = changes_file.decoded_content.decode('utf-8')
-                
-                # Ensure new_content is properly formatted
-                new_content = new_content.strip()
-                
-                # Log content lengths for debugging
-                logger.info(f"New content length: {len(new_content)}")
-                logger.info(f"Existing content length: {len(existing_content)}")
-                
-                # Prepend new content to existing content with proper spacing
-                updated_content = f"{new_content}\n\n{existing_content}"
-                
-                # Update existing file
-                repo.update_file(
-                    path="CHANGES.md",
-                    message="Update CHANGES.md",
-                    content=updated_content,
-                    sha=changes_file.sha,
-                    branch=new_branch_name
-                )
-                logger.info("Updated CHANGES.md file with prepended content")
-            except GithubException as e:
-                if e.status == 404:  # File not found
-                    # Create new file with just the new content
-                    repo.create_file(
-                        path="CHANGES.md",
-                        message="Create CHANGES.md",
-                        content=new_content,
-                        branch=new_branch_name
-                    )
-                    logger.info("Created CHANGES.md file")
-                else:
-                    raise e
-            
-            # Update __init__.py in the new branch if version is provided
-            if new_version:
-                try:
-                    # Try different possible paths for __init__.py
-                    possible_paths = [
-                        'auditree-central/__init__.py',
-                        'auditree_central/__init__.py',
-                        '__init__.py'
-                    ]
-                    
-                    init_file = None
-                    file_path = None
-                    
-                    # Try each path until we find the file
-                    for path in possible_paths:
-                        try:
-                            init_file = repo.get_contents(path, ref=new_branch_name)
-                            file_path = path
-                            break
-                        except GithubException:
-                            continue
-                    
-                    if init_file and file_path:
-                        # Read current content
-                        current_content = init_file.decoded_content.decode('utf-8')
-                        
-                        # Find docstring position if it exists
-                        docstring_end = current_content.find('"""', current_content.find('"""') + 3) if '"""' in current_content else -1
-                        
-                        # Remove all version declarations
-                        cleaned_content = re.sub(r"__version__\s*=\s*['\"]([^'\"]+)['\"]", "", current_content)
-                        
-                        # Determine where to insert the version
-                        if docstring_end != -1:
-                            # Find position after docstring
-                            insert_position = docstring_end + 3
-                            while insert_position < len(cleaned_content) and cleaned_content[insert_position] in ['\n', '\r', ' ', '\t']:
-                                insert_position += 1
-                            
-                            # Insert version after docstring with proper spacing
-                            new_content_init = cleaned_content[:insert_position] + f"\n\n__version__ = '{new_version}'" + cleaned_content[insert_position:]
-                        else:
-                            # No docstring found, add at beginning
-                            new_content_init = f"__version__ = '{new_version}'\n\n" + cleaned_content
-                        
-                        # Clean up any excessive newlines
-                        new_content_init = re.sub(r'\n{3,}', '\n\n', new_content_init)
-                        
-                        # Update the file
-                        repo.update_file(
-                            path=file_path,
-                            message=f"Update version to {new_version}",
-                            content=new_content_init,
-                            sha=init_file.sha,
-                            branch=new_branch_name
-                        )
-                        logger.info(f"Updated version to {new_version} in {file_path}")
-                    else:
-                        logger.warning("Could not find __init__.py file in any of the expected locations")
-                except GithubException as e:
-                    logger.error(f"Error updating __init__.py: {str(e)}")
-                    # Continue with PR creation even if version update fails
+            response_cache.invalidate_repo(repo_owner, repo_name)
+            body_cache.invalidate_repo(repo_owner, repo_name)
+            if new_version and init_path:
+                logger.info(f"Updated version to {new_version} in {init_path}")
             
             # Create the pull request
             pr = repo.create_pull(
@@ -641,11 +1121,7 @@ def create_gist_link():
 
         try:
             # Initialize GitHub client
-            g = Github(
-                base_url=GITHUB_API,
-                login_or_token=GITHUB_TOKEN, # Use your standard GITHUB_TOKEN
-                timeout=REQUEST_TIMEOUT
-            )
+            g = github_client(write=True)
             user = g.get_user() # Authenticate to ensure token is valid
 
             # Create a new Gist
@@ -712,16 +1188,12 @@ def fetch_gist():
                 logger.info(f"Switching to enterprise GitHub API: {api_base_url}")
                 
             logger.info(f"Using GitHub API URL: {api_base_url}")
-            g = Github(
-                base_url=api_base_url,
-                login_or_token=GITHUB_TOKEN,
-                timeout=REQUEST_TIMEOUT
-            )
+            g = github_client(api_base_url)
             
             # Try to get the user to verify authentication
             try:
-                user = g.get_user()
-                logger.info(f"Authenticated as: {user.login}")
+                login = authenticated_login(g)
+                logger.info(f"Authenticated as: {login}")
             except GithubException as e:
                 error_msg = f'Authentication failed: {str(e)}. Please check your GitHub token.'
                 logger.error(error_msg)
@@ -778,3 +1250,105 @@ def fetch_gist():
         logger.error(error_msg, exc_info=True)
         return jsonify({'error': error_msg}), http.HTTPStatus.INTERNAL_SERVER_ERROR
 
+@api.route('/webhooks/github', methods=['POST'])
+def github_webhook():
+    """Receive GitHub webhook deliveries and patch cached repository data"""
+    if not GITHUB_WEBHOOK_SECRET:
+        error_msg = 'GitHub webhook secret is not configured'
+        logger.error(error_msg)
+        return jsonify({'error': error_msg}), http.HTTPStatus.SERVICE_UNAVAILABLE
+
+    body = request.get_data()
+    if not verify_signature(GITHUB_WEBHOOK_SECRET, body, request.headers.get('X-Hub-Signature-256')):
+        error_msg = 'Invalid webhook signature'
+        logger.error(f"{error_msg} for delivery {request.headers.get('X-GitHub-Delivery')}")
+        return jsonify({'error': error_msg}), http.HTTPStatus.UNAUTHORIZED
+
+    event = request.headers.get('X-GitHub-Event', '')
+    if event == 'ping':
+        return jsonify({'message': 'pong'})
+
+    payload = request.get_json(silent=True)
+    if not payload:
+        error_msg = 'Webhook payload must be JSON'
+        logger.error(error_msg)
+        return jsonify({'error': error_msg}), http.HTTPStatus.BAD_REQUEST
+
+    try:
+        changed = apply_webhook_event(response_cache, event, payload, body_cache)
+    except (KeyError, TypeError, AttributeError) as e:
+        error_msg = f'Malformed {event} webhook payload: {str(e)}'
+        logger.error(error_msg)
+        return jsonify({'error': error_msg}), http.HTTPStatus.BAD_REQUEST
+
+    if ISSUE_SYNC_MODE == 'incremental' and event == 'issues' and payload.get('action') in ('deleted', 'transferred'):
+        get_issue_store().delete_issue(payload['repository']['owner']['login'], payload['repository']['name'],
+                                       payload['issue']['number'])
+
+    if changed is None:
+        logger.debug(f"Ignoring unsupported webhook event: {event}")
+        return jsonify({'event': event, 'status': 'ignored'})
+
+    return jsonify({'event': event, 'status': 'processed', 'cache_entries_changed': changed})
+
+@api.route('/rate-limit', methods=['GET'])
+def get_rate_limit():
+    """Report the upstream rate limit headroom of each GitHub token"""
+    return jsonify(dict(rate_limiter.headroom(), token_pool=token_pool.stats()))
+
+@api.route('/stats', methods=['GET'])
+def get_stats():
+    """Report runtime statistics for the upstream fetch layer"""
+    return jsonify({
+        'http_pool': get_pool_stats(),
+        'conditional_cache': conditional_cache.stats(),
+        'response_cache': response_cache.stats(),
+        'issue_body_cache': body_cache.stats(),
+        'github_clients': github_registry.stats(),
+        'changelog_memo': changelog_engine.stats(),
+        'single_flight': single_flight.stats(),
+        'refresher': refresher.stats()
+    })
+
+# Counter-like fields of the caches' stats(), exported as changes_cache_events_total{cache,event}
+CACHE_EVENTS = ('hits', 'stale_hits', 'misses', 'expired', 'revalidations', 'evictions', 'bypassed', 'invalidations')
+
+def collect_cache_metrics():
+    """Export cache, single-flight, refresh and rate limit stats at scrape time"""
+    caches = {
+        'conditional': conditional_cache.stats(),
+        'response': response_cache.stats(),
+        'issue_body': body_cache.stats(),
+        'changelog_memo': changelog_engine.stats()
+    }
+    events = [((name, event), stats[event]) for name, stats in caches.items() for event in CACHE_EVENTS if event in stats]
+    saved = single_flight.stats()
+    refreshes = refresher.stats()
+    pool = get_pool_stats()
+    budgets = [((label, resource), budget['remaining'])
+               for label, resources in rate_limiter.headroom()['tokens'].items()
+               for resource, budget in resources.items() if budget['remaining'] is not None]
+    return [
+        ('changes_cache_events_total', 'counter', 'Cache lookups and maintenance by outcome', ('cache', 'event'), events),
+        ('changes_cache_entries', 'gauge', 'Entries held by each cache', ('cache',),
+         [((name,), stats['entries']) for name, stats in caches.items()]),
+        ('changes_cache_bytes', 'gauge', 'Approximate size of each cache', ('cache',),
+         [((name,), stats['bytes']) for name, stats in caches.items()]),
+        ('changes_single_flight_saved_total', 'counter', 'Upstream fetches saved by joining an identical fetch', (),
+         [((), saved['saved_upstream_fetches'])]),
+        ('changes_refreshes_total', 'counter', 'Background cache refreshes and prefetches by outcome', ('outcome',),
+         [((outcome,), refreshes[outcome]) for outcome in ('refreshed', 'failed', 'dropped')]),
+        ('changes_http_pool_connections_total', 'counter', 'Pooled connections checked out by outcome', ('outcome',),
+         [((outcome,), pool[outcome]) for outcome in ('opened', 'reused', 'waited', 'overflowed')]),
+        ('changes_rate_limit_remaining', 'gauge', 'GitHub requests left in the current window', ('token', 'resource'),
+         budgets)
+    ]
+
+metrics.registry.register_collector(collect_cache_metrics)
+
+def get_metrics():
+    """
+    Expose request, upstream and cache metrics in the Prometheus text format.
+    Served at /metrics on the app rather than the api blueprint, so scrapes aren't counted as API requests.
+    """
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,257 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# Bumped whenever the tables change; a cache file with another version is emptied and rebuilt
+SCHEMA_VERSION = 1
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    kind TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    repo TEXT NOT NULL,
+    milestone TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    stale_until REAL NOT NULL,
+    PRIMARY KEY (kind, owner, repo, milestone)
+);
+CREATE INDEX IF NOT EXISTS entries_by_staleness ON entries (stale_until, size);
+-- Running totals of entries, kept by triggers so the bounds check after a write is a single row read
+CREATE TABLE IF NOT EXISTS totals (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    entries INTEGER NOT NULL,
+    bytes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO totals (id, entries, bytes) VALUES (0, 0, 0);
+CREATE TRIGGER IF NOT EXISTS totals_after_insert AFTER INSERT ON entries BEGIN
+    UPDATE totals SET entries = entries + 1, bytes = bytes + NEW.size;
+END;
+CREATE TRIGGER IF NOT EXISTS totals_after_update AFTER UPDATE OF size ON entries BEGIN
+    UPDATE totals SET bytes = bytes + NEW.size - OLD.size;
+END;
+CREATE TRIGGER IF NOT EXISTS totals_after_delete AFTER DELETE ON entries BEGIN
+    UPDATE totals SET entries = entries - 1, bytes = bytes - OLD.size;
+END;
+"""
+
+# Fraction of the bounds an eviction pass frees the cache down to
+EVICT_TO = 0.9
+
+class SharedResponseCache:
+    """
+    ResponseCache with the same interface, stored in a SQLite file so every
+    worker process on the host reads what any one of them fetched. Expiry
+    times are wall-clock seconds since they are compared across processes.
+    When over its bounds the entries closest to going stale are evicted
+    first, down to EVICT_TO of the bounds.
+    Hit and miss counts are per process.
+    """
+
+    def __init__(self, path, ttls, max_entries, max_bytes, stale_ttls=None):
+        self.path = path
+        self.ttls = ttls
+        self.stale_ttls = stale_ttls or {}
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._counts = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'expired': 0, 'bypassed': 0, 'invalidations': 0,
+                        'evictions': 0}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            if conn.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+                conn.execute('DROP TABLE IF EXISTS entries')
+                conn.execute('DROP TABLE IF EXISTS totals')
+                conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call keeps the cache safe to use from any thread
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(kind, owner, repo, milestone=None):
+        # GitHub owner and repository names are case-insensitive
+        return (kind, owner.lower(), repo.lower(), str(milestone) if milestone is not None else '')
+
+    def _record(self, name, count=1):
+        with self._lock:
+            self._counts[name] += count
+
+    def lookup(self, kind, owner, repo, milestone=None):
+        """
+        Return (payload, stale): the payload with stale=False within its TTL,
+        with stale=True within its stale TTL, or (None, False) otherwise
+        """
+        with self._connect() as conn:
+            row = conn.execute('SELECT payload, expires_at, stale_until FROM entries '
+                               'WHERE kind = ? AND owner = ? AND repo = ? AND milestone = ?',
+                               self.make_key(kind, owner, repo, milestone)).fetchone()
+        if row is None:
+            self._record('misses')
+            return None, False
+        now = time.time()
+        if row[1] > now:
+            self._record('hits')
+            return json.loads(row[0]), False
+        if row[2] > now:
+            self._record('stale_hits')
+            return json.loads(row[0]), True
+        # Expired rows are removed by the next set() from any worker
+        self._record('expired')
+        return None, False
+
+    def lookup_many(self, kind, owner, repo, milestones):
+        """Return {milestone: (payload, stale)} like lookup() for each milestone, over one connection"""
+        results, counts = {}, {}
+        now = time.time()
+        with self._connect() as conn:
+            for milestone in milestones:
+                row = conn.execute('SELECT payload, expires_at, stale_until FROM entries '
+                                   'WHERE kind = ? AND owner = ? AND repo = ? AND milestone = ?',
+                                   self.make_key(kind, owner, repo, milestone)).fetchone()
+                if row is None:
+                    outcome, results[milestone] = 'misses', (None, False)
+                elif row[1] > now:
+                    outcome, results[milestone] = 'hits', (json.loads(row[0]), False)
+                elif row[2] > now:
+                    outcome, results[milestone] = 'stale_hits', (json.loads(row[0]), True)
+                else:
+                    outcome, results[milestone] = 'expired', (None, False)
+                counts[outcome] = counts.get(outcome, 0) + 1
+        with self._lock:
+            for name, count in counts.items():
+                self._counts[name] += count
+        return results
+
+    def get(self, kind, owner, repo, milestone=None):
+        """Return the cached payload, or None if it is missing, stale or expired"""
+        payload, stale = self.lookup(kind, owner, repo, milestone)
+        return None if stale else payload
+
+    def _write(self, conn, key, payload, expires_at, stale_until):
+        serialized = json.dumps(payload)
+        if len(serialized) > self.max_bytes:
+            # Never cache something that would flush the whole cache on its own
+            conn.execute('DELETE FROM entries WHERE kind = ? AND owner = ? AND repo = ? AND milestone = ?', key)
+            return
+        # An upsert rather than INSERT OR REPLACE, whose implicit delete wouldn't fire the totals trigger
+        conn.execute('INSERT INTO entries (kind, owner, repo, milestone, payload, size, expires_at, stale_until) '
+                     'VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (kind, owner, repo, milestone) DO UPDATE SET '
+                     'payload = excluded.payload, size = excluded.size, expires_at = excluded.expires_at, '
+                     'stale_until = excluded.stale_until',
+                     key + (serialized, len(serialized), expires_at, stale_until))
+
+    def _evict(self, conn):
+        now = time.time()
+        removed = conn.execute('DELETE FROM entries WHERE stale_until <= ?', (now,)).rowcount
+        entries, size = conn.execute('SELECT entries, bytes FROM totals').fetchone()
+        if entries <= self.max_entries and size <= self.max_bytes:
+            if removed:
+                self._record('evictions', removed)
+            return
+        # Keep the entries with the most time left that fit within EVICT_TO of both bounds, so the next
+        # writes don't each have to evict again
+        removed += conn.execute(
+            'DELETE FROM entries WHERE rowid IN ('
+            '  SELECT rowid FROM ('
+            '    SELECT rowid, ROW_NUMBER() OVER w AS position, SUM(size) OVER w AS running_bytes FROM entries'
+            '    WINDOW w AS (ORDER BY stale_until DESC ROWS UNBOUNDED PRECEDING)'
+            '  ) WHERE position > ? OR running_bytes > ?'
+            ')', (int(self.max_entries * EVICT_TO), int(self.max_bytes * EVICT_TO))).rowcount
+        if removed:
+            self._record('evictions', removed)
+
+    def set(self, kind, owner, repo, payload, milestone=None):
+        """Cache payload for the TTL configured for kind"""
+        with self._connect() as conn:
+            expires_at = time.time() + self.ttls[kind]
+            self._write(conn, self.make_key(kind, owner, repo, milestone), payload, expires_at,
+                        expires_at + self.stale_ttls.get(kind, 0))
+            self._evict(conn)
+
+    def set_many(self, kind, owner, repo, payloads):
+        """Cache {milestone: payload} in one transaction, e.g. every issue body of a milestone"""
+        with self._connect() as conn:
+            expires_at = time.time() + self.ttls[kind]
+            stale_until = expires_at + self.stale_ttls.get(kind, 0)
+            for milestone, payload in payloads.items():
+                self._write(conn, self.make_key(kind, owner, repo, milestone), payload, expires_at, stale_until)
+            self._evict(conn)
+
+    def patch(self, kind, owner, repo, patch_fn):
+        """
+        Apply patch_fn(milestone, payload) to every cached payload of kind for
+        a repository, keeping each entry's expiry time. patch_fn returns the
+        new payload, the same payload when nothing changed, or None to evict
+        the entry. Returns the number of entries changed.
+        """
+        owner, repo = owner.lower(), repo.lower()
+        changed = 0
+        with self._connect() as conn:
+            # Hold the write lock so no worker stores a payload between the read and the patch
+            conn.execute('BEGIN IMMEDIATE')
+            rows = conn.execute('SELECT milestone, payload, expires_at, stale_until FROM entries '
+                                'WHERE kind = ? AND owner = ? AND repo = ? AND stale_until > ?',
+                                (kind, owner, repo, time.time())).fetchall()
+            for milestone, serialized, expires_at, stale_until in rows:
+                cached = json.loads(serialized)
+                payload = patch_fn(milestone or None, cached)
+                if payload is cached:
+                    continue
+                key = (kind, owner, repo, milestone)
+                if payload is None:
+                    conn.execute('DELETE FROM entries WHERE kind = ? AND owner = ? AND repo = ? AND milestone = ?', key)
+                else:
+                    self._write(conn, key, payload, expires_at, stale_until)
+                changed += 1
+        return changed
+
+    def delete(self, kind, owner, repo, milestone=None):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM entries WHERE kind = ? AND owner = ? AND repo = ? AND milestone = ?',
+                         self.make_key(kind, owner, repo, milestone))
+
+    def record_bypass(self):
+        self._record('bypassed')
+
+    def invalidate_repo(self, owner, repo):
+        """Drop every cached payload for a repository"""
+        with self._connect() as conn:
+            removed = conn.execute('DELETE FROM entries WHERE owner = ? AND repo = ?',
+                                   (owner.lower(), repo.lower())).rowcount
+        self._record('invalidations', removed)
+        return removed
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM entries')
+
+    def stats(self):
+        with self._connect() as conn:
+            entries, size = conn.execute('SELECT entries, bytes FROM totals').fetchone()
+        with self._lock:
+            stats = dict(self._counts)
+        stats.update({
+            'backend': 'sqlite',
+            'path': self.path,
+            'entries': entries,
+            'bytes': size,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'ttls': dict(self.ttls),
+            'stale_ttls': dict(self.stale_ttls)
+        })
+        return stats
@@ -0,0 +1,100 @@
+import functools
+import threading
+from config import logger
+from rate_limit import BACKGROUND, INTERACTIVE, current_priority
+
+class _Call:
+    """One in-progress fetch and the callers waiting on it"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+def _freeze(result):
+    """Store a shared (data, ...) result with its list as a tuple, so no caller can change it"""
+    data, *rest = result
+    return (tuple(data) if isinstance(data, list) else data, *rest)
+
+def _thaw(result):
+    """Give a caller its own list, since callers sort and extend what they get"""
+    data, *rest = result
+    return (list(data) if isinstance(data, tuple) else data, *rest)
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: while one caller runs a fetch,
+    callers with the same key wait for it and share its result or exception
+    instead of fetching again.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._counts = {}  # name -> {'calls', 'executed', 'shared'}
+
+    def do(self, name, key, fn, join_keys=()):
+        """
+        Return fn(), or the result of the identical call already running for
+        (name, key) or, failing that, for one of join_keys
+        """
+        with self._lock:
+            counts = self._counts.setdefault(name, {'calls': 0, 'executed': 0, 'shared': 0})
+            counts['calls'] += 1
+            call = next(filter(None, (self._calls.get((name, k)) for k in (key, *join_keys))), None)
+            if call is None:
+                call = self._calls[(name, key)] = _Call()
+                counts['executed'] += 1
+                leader = True
+            else:
+                call.waiters += 1
+                counts['shared'] += 1
+                leader = False
+
+        if leader:
+            try:
+                # Frozen before waiters are released, so the leader can't change the list they copy
+                call.result = _freeze(fn())
+            except Exception as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[(name, key)]
+                call.done.set()
+            return _thaw(call.result)
+
+        logger.debug(f"Joining in-flight {name} call for {key}")
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return _thaw(call.result)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'saved_upstream_fetches': sum(counts['shared'] for counts in self._counts.values()),
+                'functions': {name: dict(counts) for name, counts in self._counts.items()}
+            }
+
+single_flight = SingleFlight()
+
+def coalesce(func):
+    """
+    Decorate a fetch returning (data, status_code, error) so concurrent
+    identical calls share one fetch. The fetch runs at its leader's rate
+    limit priority, so interactive callers never join background fetches,
+    which may be deferred or refused; background callers join either.
+    """
+    name = f"{func.__module__}.{func.__name__}"
+
+    @functools.wraps(func)
+    def wrapper(*args):
+        # GitHub owner and repository names are case-insensitive, and milestone 1 is "1"
+        args_key = tuple(str(arg).lower() for arg in args)
+        priority = current_priority()
+        join_keys = ((INTERACTIVE, *args_key),) if priority == BACKGROUND else ()
+        return single_flight.do(name, (priority, *args_key), lambda: func(*args), join_keys)
+    return wrapper
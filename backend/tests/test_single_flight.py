@@ -0,0 +1,85 @@
+import os
+import sys
+import threading
+import time
+import unittest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+os.environ.setdefault('LOG_LEVEL', 'CRITICAL')
+
+from rate_limit import BACKGROUND, INTERACTIVE, RateLimitScheduler, background_priority, current_priority
+from single_flight import coalesce
+
+TOKEN = 'test-token'
+
+class CoalescePriorityTest(unittest.TestCase):
+    """Interactive callers must not inherit the deferral or refusal of a background fetch they overlap"""
+
+    def setUp(self):
+        self.scheduler = RateLimitScheduler(pace_below=0.0, reserve=0.1, max_wait=1, background_max_wait=1)
+        # 50 of 5000 left is inside the 10% reserve, so only interactive requests may spend it
+        self.scheduler.record(TOKEN, 50, 5000, time.time() + 3600)
+        self.leader_entered = threading.Event()
+        self.release_leader = threading.Event()
+        self.priorities = []
+
+        @coalesce
+        def fetch_issues(owner, repo, milestone):
+            self.priorities.append(current_priority())
+            if len(self.priorities) == 1:
+                self.leader_entered.set()
+                self.release_leader.wait(5)
+            with self.scheduler.request(TOKEN) as limit_error:
+                if limit_error:
+                    return None, 429, limit_error
+                return [{'number': 1}], 200, None
+        self.fetch_issues = fetch_issues
+
+    def run_in_thread(self, fn, results, name):
+        thread = threading.Thread(target=lambda: results.__setitem__(name, fn()))
+        thread.start()
+        return thread
+
+    def test_interactive_joiner_runs_its_own_fetch_under_the_reserve(self):
+        results = {}
+
+        def background_fetch():
+            with background_priority():
+                return self.fetch_issues('Octo-Org', 'widgets', 3)
+
+        leader = self.run_in_thread(background_fetch, results, 'background')
+        self.assertTrue(self.leader_entered.wait(5))
+        joiner = self.run_in_thread(lambda: self.fetch_issues('octo-org', 'widgets', '3'), results, 'interactive')
+        joiner.join(5)
+        self.release_leader.set()
+        leader.join(5)
+
+        self.assertEqual(results['interactive'], ([{'number': 1}], 200, None))
+        self.assertEqual(results['background'][1], 429)
+        self.assertIn('reserved for interactive requests', results['background'][2])
+        self.assertEqual(self.priorities, [BACKGROUND, INTERACTIVE])
+
+    def test_background_joiner_shares_an_interactive_fetch(self):
+        results = {}
+        leader = self.run_in_thread(lambda: self.fetch_issues('octo-org', 'widgets', 3), results, 'interactive')
+        self.assertTrue(self.leader_entered.wait(5))
+
+        def background_fetch():
+            with background_priority():
+                return self.fetch_issues('octo-org', 'widgets', 3)
+
+        joiner = self.run_in_thread(background_fetch, results, 'background')
+        # The joiner blocks on the leader's call, which is still waiting to be released
+        joiner.join(0.2)
+        self.release_leader.set()
+        leader.join(5)
+        joiner.join(5)
+
+        self.assertEqual(results['interactive'], ([{'number': 1}], 200, None))
+        self.assertEqual(results['background'], ([{'number': 1}], 200, None))
+        self.assertEqual(self.priorities, [INTERACTIVE])
+
+if __name__ == '__main__':
+    unittest.main()
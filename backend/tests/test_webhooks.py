@@ -0,0 +1,193 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Read by config at import time; no request below reaches GitHub
+os.environ.update(RESPONSE_CACHE_BACKEND='memory', ISSUE_SYNC_MODE='full', PREFETCH_REPOS='', LOG_LEVEL='CRITICAL')
+
+from app import create_app
+from payloads import branch_sort_key, shape_branch
+import routes
+from webhooks import sign_payload
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'webhooks')
+OWNER, REPO = 'octo-org', 'widgets'
+SECRET = 'replay-secret'
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+        return f.read()
+
+def cached_issue(number, title, state='open', closed_at=None):
+    return {
+        'number': number,
+        'title': title,
+        'state': state,
+        'created_at': '2024-04-11T08:02:13Z',
+        'closed_at': closed_at,
+        'html_url': f"https://github.ibm.com/{OWNER}/{REPO}/issues/{number}"
+    }
+
+class WebhookReplayTest(unittest.TestCase):
+    """Replay recorded GitHub deliveries through the app and check the cache they leave behind"""
+
+    @classmethod
+    def setUpClass(cls):
+        # Patched rather than set in the environment, since another test may have imported config first
+        cls.secret_patch = mock.patch.object(routes, 'GITHUB_WEBHOOK_SECRET', SECRET)
+        cls.secret_patch.start()
+        cls.client = create_app().test_client()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.secret_patch.stop()
+
+    def setUp(self):
+        routes.response_cache.clear()
+        routes.body_cache.clear()
+        branches = [shape_branch({'name': name}) for name in ('main', 'feature/csv-export', 'develop')]
+        routes.response_cache.set('branches', OWNER, REPO, sorted(branches, key=branch_sort_key))
+        routes.response_cache.set('milestones', OWNER, REPO, [
+            {'id': 3, 'title': 'v1.4', 'description': 'Spring release', 'state': 'open'},
+            {'id': 2, 'title': 'v1.3', 'description': 'Winter release', 'state': 'open'}
+        ])
+        routes.response_cache.set('issues', OWNER, REPO, [cached_issue(97, 'Branch list is not sorted'),
+                                                          cached_issue(120, 'Slow milestone list')], 3)
+        routes.response_cache.set('issues', OWNER, REPO, [cached_issue(88, 'Token rotation')], 2)
+        routes.body_cache.set('issue_body', OWNER, REPO, {'body': 'Old body'}, 97)
+
+    def replay(self, event, fixture, secret=None, body=None):
+        """POST a recorded delivery signed like GitHub would sign it"""
+        payload = load_fixture(fixture)
+        return self.client.post('/api/webhooks/github', data=payload if body is None else body, headers={
+            'Content-Type': 'application/json',
+            'X-GitHub-Event': event,
+            'X-GitHub-Delivery': f"replay-{fixture}",
+            'X-Hub-Signature-256': sign_payload(secret or SECRET, payload)
+        })
+
+    def cached(self, kind, milestone=None):
+        return routes.response_cache.get(kind, OWNER, REPO, milestone)
+
+    def issue_numbers(self, milestone):
+        return [issue['number'] for issue in self.cached('issues', milestone)]
+
+    def branch_names(self):
+        return [branch['name'] for branch in self.cached('branches')]
+
+    def assert_processed(self, response, changed):
+        self.assertEqual(response.status_code, 200, response.get_json())
+        self.assertEqual(response.get_json()['status'], 'processed')
+        self.assertEqual(response.get_json()['cache_entries_changed'], changed)
+
+    def test_rejects_unsigned_delivery(self):
+        response = self.client.post('/api/webhooks/github', data=load_fixture('issues_opened.json'),
+                                    headers={'Content-Type': 'application/json', 'X-GitHub-Event': 'issues'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.issue_numbers(3), [97, 120])
+
+    def test_rejects_delivery_signed_with_another_secret(self):
+        response = self.replay('issues', 'issues_opened.json', secret='not-the-secret')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.issue_numbers(3), [97, 120])
+
+    def test_rejects_tampered_body(self):
+        body = load_fixture('issues_opened.json').replace(b'Export fails', b'Export works')
+        response = self.replay('issues', 'issues_opened.json', body=body)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.issue_numbers(3), [97, 120])
+        self.assertIsNone(routes.body_cache.get('issue_body', OWNER, REPO, 128))
+
+    def test_ping(self):
+        response = self.replay('ping', 'ping.json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {'message': 'pong'})
+
+    def test_unsupported_event_is_ignored(self):
+        response = self.replay('star', 'issues_opened.json')
+        self.assertEqual(response.get_json()['status'], 'ignored')
+        self.assertEqual(self.issue_numbers(3), [97, 120])
+
+    def test_malformed_payload(self):
+        response = self.replay('issues', 'create_branch.json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.issue_numbers(3), [97, 120])
+
+    def test_issue_opened(self):
+        self.assert_processed(self.replay('issues', 'issues_opened.json'), 1)
+        self.assertEqual(self.issue_numbers(3), [128, 97, 120])
+        self.assertNotIn('body', self.cached('issues', 3)[0])
+        self.assertTrue(routes.body_cache.get('issue_body', OWNER, REPO, 128)['body'].startswith('Exporting'))
+        self.assertEqual(self.issue_numbers(2), [88])
+
+    def test_issue_closed(self):
+        self.assert_processed(self.replay('issues', 'issues_closed.json'), 1)
+        self.assertEqual(self.issue_numbers(3), [97, 120])
+        issue = self.cached('issues', 3)[0]
+        self.assertEqual((issue['state'], issue['closed_at']), ('closed', '2024-05-02T17:03:29Z'))
+        self.assertEqual(routes.body_cache.get('issue_body', OWNER, REPO, 97),
+                         {'body': '## Release Note\nBranches are listed alphabetically.'})
+
+    def test_issue_demilestoned(self):
+        self.assert_processed(self.replay('issues', 'issues_demilestoned.json'), 1)
+        self.assertEqual(self.issue_numbers(3), [120])
+
+    def test_issue_deleted(self):
+        self.replay('issues', 'issues_opened.json')
+        self.assert_processed(self.replay('issues', 'issues_deleted.json'), 1)
+        self.assertEqual(self.issue_numbers(3), [97, 120])
+        self.assertIsNone(routes.body_cache.get('issue_body', OWNER, REPO, 128))
+
+    def test_milestone_created(self):
+        # The payload doesn't say where the milestone sorts, so the list is refetched
+        self.assert_processed(self.replay('milestone', 'milestone_created.json'), 1)
+        self.assertIsNone(self.cached('milestones'))
+        self.assertEqual(self.issue_numbers(3), [97, 120])
+
+    def test_milestone_edited(self):
+        self.assert_processed(self.replay('milestone', 'milestone_edited.json'), 1)
+        self.assertEqual([milestone['description'] for milestone in self.cached('milestones')],
+                         ['Spring release, now with exports', 'Winter release'])
+
+    def test_milestone_closed(self):
+        self.assert_processed(self.replay('milestone', 'milestone_closed.json'), 1)
+        self.assertEqual([milestone['id'] for milestone in self.cached('milestones')], [2])
+        self.assertEqual(self.issue_numbers(3), [97, 120])
+
+    def test_milestone_deleted(self):
+        self.assert_processed(self.replay('milestone', 'milestone_deleted.json'), 2)
+        self.assertEqual([milestone['id'] for milestone in self.cached('milestones')], [2])
+        self.assertIsNone(self.cached('issues', 3))
+        self.assertEqual(self.issue_numbers(2), [88])
+
+    def test_branch_created(self):
+        self.assert_processed(self.replay('create', 'create_branch.json'), 1)
+        self.assertEqual(self.branch_names(), ['develop', 'feature/csv-export', 'main', 'release/1.4'])
+
+    def test_tag_created(self):
+        self.assert_processed(self.replay('create', 'create_tag.json'), 0)
+        self.assertEqual(self.branch_names(), ['develop', 'feature/csv-export', 'main'])
+
+    def test_branch_deleted(self):
+        self.assert_processed(self.replay('delete', 'delete_branch.json'), 1)
+        self.assertEqual(self.branch_names(), ['develop', 'main'])
+
+    def test_push_creating_branch(self):
+        self.assert_processed(self.replay('push', 'push_branch_created.json'), 1)
+        self.assertEqual(self.branch_names(), ['develop', 'feature/csv-export', 'hotfix/export-timeout', 'main'])
+
+    def test_push_deleting_branch(self):
+        self.replay('push', 'push_branch_created.json')
+        self.assert_processed(self.replay('push', 'push_branch_deleted.json'), 1)
+        self.assertEqual(self.branch_names(), ['develop', 'feature/csv-export', 'main'])
+
+    def test_push_of_commits(self):
+        self.assert_processed(self.replay('push', 'push_commits.json'), 0)
+        self.assertEqual(self.branch_names(), ['develop', 'feature/csv-export', 'main'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from urllib.parse import urlparse, parse_qs
+from flask.json.provider import DefaultJSONProvider
+from config import GITHUB_API, SERVER_TIMING_MAX_UPSTREAM, SLOW_REQUEST_THRESHOLD, logger
+
+_API_PATH = urlparse(GITHUB_API).path
+
+class RequestTimings:
+    """Phase durations and upstream calls of one API request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}  # phase -> seconds, in the order phases first ran
+        self.upstream = []  # (seconds, client, method, target, status)
+        self._lock = threading.Lock()
+
+    def add_phase(self, name, seconds):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def add_upstream(self, seconds, client, method, target, status):
+        # Pages of one list are fetched concurrently, so several threads record into the same request
+        with self._lock:
+            self.upstream.append((seconds, client, method, target, status))
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def slowest_upstream(self):
+        with self._lock:
+            return sorted(self.upstream, key=lambda call: call[0], reverse=True)[:SERVER_TIMING_MAX_UPSTREAM]
+
+    def server_timing(self):
+        """
+        Build the Server-Timing header: one entry per phase, the summed
+        upstream time and the slowest upstream calls. Concurrent upstream
+        calls overlap, so their sum can exceed the total.
+        """
+        with self._lock:
+            phases = dict(self.phases)
+            upstream_total, upstream_count = sum(call[0] for call in self.upstream), len(self.upstream)
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in phases.items()]
+        if upstream_count:
+            entries.append(f'upstream;dur={upstream_total * 1000:.1f};desc="{upstream_count} calls"')
+        for index, (seconds, client, method, target, status) in enumerate(self.slowest_upstream(), 1):
+            description = f"{method} {target} {status}".replace('\\', '\\\\').replace('"', '\\"')
+            entries.append(f'upstream-{index};dur={seconds * 1000:.1f};desc="{description}"')
+        entries.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ', '.join(entries)
+
+    def summary(self):
+        """Describe where the request spent its time, for the slow request log"""
+        with self._lock:
+            phases = ', '.join(f"{name}={seconds:.3f}s" for name, seconds in self.phases.items())
+            upstream_count = len(self.upstream)
+        slowest = '; '.join(f"{method} {target} -> {status} in {seconds:.3f}s ({client})"
+                            for seconds, client, method, target, status in self.slowest_upstream())
+        return f"phases: {phases or 'none'}; {upstream_count} upstream calls, slowest: {slowest or 'none'}"
+
+_current = contextvars.ContextVar('request_timings', default=None)
+
+def start_request():
+    """Start collecting timings for the current request, returning a token for end_request"""
+    return _current.set(RequestTimings())
+
+def end_request(reset_token):
+    _current.reset(reset_token)
+
+@contextmanager
+def phase(name):
+    """Add the time spent in the block to the current request's named phase"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add_phase(name, time.perf_counter() - started)
+
+def timed(name):
+    """Decorator form of phase()"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def upstream_target(url, params=None):
+    """Shorten an upstream URL to its API path and page number"""
+    parsed = urlparse(url)
+    path = parsed.path[len(_API_PATH):] if _API_PATH and parsed.path.startswith(_API_PATH) else parsed.path
+    page = (params or {}).get('page') or parse_qs(parsed.query).get('page', [None])[0]
+    return f"{path}?page={page}" if page else path
+
+def record_upstream(client, method, url, params, status, seconds):
+    timings = _current.get()
+    if timings is not None:
+        timings.add_upstream(seconds, client, method, upstream_target(url, params), status)
+
+def server_timing():
+    """Return the current request's Server-Timing header value, or None outside a request"""
+    timings = _current.get()
+    return timings.server_timing() if timings else None
+
+def log_if_slow(method, path, status):
+    """Log the current request's timing breakdown if it took longer than SLOW_REQUEST_THRESHOLD"""
+    timings = _current.get()
+    if timings is None or not SLOW_REQUEST_THRESHOLD:
+        return
+    elapsed = timings.elapsed()
+    if elapsed >= SLOW_REQUEST_THRESHOLD:
+        logger.warning(f"Slow request {method} {path} -> {status} took {elapsed:.3f}s; {timings.summary()}")
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Count JSON serialization of responses as the request's serialize phase"""
+
+    def dumps(self, obj, **kwargs):
+        with phase('serialize'):
+            return super().dumps(obj, **kwargs)
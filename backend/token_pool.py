@@ -0,0 +1,69 @@
+import itertools
+import threading
+import time
+from config import GITHUB_TOKENS, GITHUB_WRITE_TOKEN, TOKEN_QUARANTINE_SECONDS, logger
+from rate_limit import rate_limiter, token_label
+
+class TokenPool:
+    """
+    Spreads read traffic across every configured GitHub token, preferring
+    the one with the most quota left, and keeps writes on one token.
+    A token whose credentials GitHub rejects with a 401 is taken out of
+    rotation for a while.
+    """
+
+    def __init__(self, tokens, write_token, quarantine_seconds, scheduler):
+        self.tokens = list(tokens)
+        self.write_token = write_token
+        self.quarantine_seconds = quarantine_seconds
+        self._scheduler = scheduler
+        self._quarantined = {}  # token -> time.monotonic() it may be used again
+        self._round_robin = itertools.count()
+        self._lock = threading.Lock()
+
+    def _active(self):
+        now = time.monotonic()
+        with self._lock:
+            for token, until in list(self._quarantined.items()):
+                if until <= now:
+                    del self._quarantined[token]
+                    logger.info(f"Returning token {token_label(token)} to rotation")
+            return [token for token in self.tokens if token not in self._quarantined]
+
+    def read_token(self, resource='core', exclude=()):
+        """Return the active token with the most remaining budget for resource, or None if there is none"""
+        candidates = [token for token in self._active() if token not in exclude]
+        if not candidates:
+            return None
+        # A token GitHub hasn't reported on yet is assumed to have its whole budget
+        budgets = {token: self._scheduler.budget_left(token, resource) for token in candidates}
+        best = max(float('inf') if left is None else left for left in budgets.values())
+        tied = [token for token in candidates if (float('inf') if budgets[token] is None else budgets[token]) == best]
+        # Rotate between equally good tokens so their budgets drain evenly
+        return tied[next(self._round_robin) % len(tied)]
+
+    def report_rejected(self, token, status_code):
+        """Take a token out of rotation after GitHub rejected its credentials"""
+        if status_code != 401:
+            # A 403 that isn't a rate limit is SSO enforcement or no access to one repository;
+            # the token is fine for everything else, so it stays in rotation
+            logger.warning(f"Token {token_label(token)} got {status_code}; keeping it in rotation")
+            return
+        with self._lock:
+            if token in self._quarantined or len(self.tokens) - len(self._quarantined) <= 1:
+                # Keep the last token in rotation; without it every read would fail
+                return
+            self._quarantined[token] = time.monotonic() + self.quarantine_seconds
+        logger.warning(f"Token {token_label(token)} got {status_code}; out of rotation for {self.quarantine_seconds} seconds")
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            quarantined = {token_label(token): max(int(until - now), 0) for token, until in self._quarantined.items()}
+        return {
+            'tokens': [token_label(token) for token in self.tokens],
+            'write_token': token_label(self.write_token) if self.write_token else None,
+            'quarantined': quarantined
+        }
+
+token_pool = TokenPool(GITHUB_TOKENS, GITHUB_WRITE_TOKEN, TOKEN_QUARANTINE_SECONDS, rate_limiter)
@@ -0,0 +1,115 @@
+import hashlib
+import hmac
+from config import logger
+from payloads import branch_sort_key, shape_branch, shape_milestone, compact_issue
+
+SUPPORTED_EVENTS = ('issues', 'milestone', 'create', 'delete', 'push')
+
+def sign_payload(secret, body):
+    """Compute the X-Hub-Signature-256 header value GitHub sends for body"""
+    return 'sha256=' + hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+
+def verify_signature(secret, body, signature_header):
+    """Check an X-Hub-Signature-256 header against the raw request body"""
+    if not secret or not signature_header:
+        return False
+    return hmac.compare_digest(sign_payload(secret, body), signature_header)
+
+def _add_branch(cache, owner, repo, name):
+    def patch(_, branches):
+        if any(branch['name'] == name for branch in branches):
+            return branches
+        return sorted(branches + [shape_branch({'name': name})], key=branch_sort_key)
+    return cache.patch('branches', owner, repo, patch)
+
+def _remove_branch(cache, owner, repo, name):
+    def patch(_, branches):
+        remaining = [branch for branch in branches if branch['name'] != name]
+        return remaining if len(remaining) != len(branches) else branches
+    return cache.patch('branches', owner, repo, patch)
+
+def _handle_issues(cache, owner, repo, payload, body_cache):
+    issue = payload['issue']
+    number = issue['number']
+    milestone = (issue.get('milestone') or {}).get('number')
+    if payload.get('action') in ('deleted', 'transferred'):
+        milestone = None
+        if body_cache is not None:
+            body_cache.delete('issue_body', owner, repo, number)
+    elif body_cache is not None:
+        body_cache.set('issue_body', owner, repo, {'body': issue['body']}, number)
+    shaped = compact_issue(issue)
+
+    def patch(cached_milestone, issues):
+        remaining = [cached for cached in issues if cached['number'] != number]
+        if milestone is not None and str(milestone) == cached_milestone:
+            # Lists are ordered by most recently updated first
+            return [shaped] + remaining
+        return remaining if len(remaining) != len(issues) else issues
+    return cache.patch('issues', owner, repo, patch)
+
+def _handle_milestone(cache, owner, repo, payload):
+    milestone = payload['milestone']
+    number = milestone['number']
+    changed = 0
+
+    if payload.get('action') == 'deleted':
+        changed += cache.patch('issues', owner, repo,
+                               lambda cached_milestone, issues: None if cached_milestone == str(number) else issues)
+
+    # Only open milestones are listed; a closed or deleted one drops out
+    keep = payload.get('action') != 'deleted' and milestone.get('state') == 'open'
+
+    def patch(_, milestones):
+        positions = [i for i, cached in enumerate(milestones) if cached['id'] == number]
+        if not keep:
+            return [cached for cached in milestones if cached['id'] != number] if positions else milestones
+        if not positions:
+            # The list is ordered by due date, which the payload doesn't keep; refetch it
+            return None
+        patched = list(milestones)
+        patched[positions[0]] = shape_milestone(milestone)
+        return patched
+    return changed + cache.patch('milestones', owner, repo, patch)
+
+def _handle_ref(cache, owner, repo, event, payload):
+    if payload.get('ref_type') != 'branch':
+        return 0
+    if event == 'create':
+        return _add_branch(cache, owner, repo, payload['ref'])
+    return _remove_branch(cache, owner, repo, payload['ref'])
+
+def _handle_push(cache, owner, repo, payload):
+    ref = payload['ref']
+    if not ref.startswith('refs/heads/'):
+        return 0
+    name = ref[len('refs/heads/'):]
+    if payload.get('deleted'):
+        return _remove_branch(cache, owner, repo, name)
+    if payload.get('created'):
+        return _add_branch(cache, owner, repo, name)
+    return 0
+
+def apply_webhook_event(cache, event, payload, body_cache=None):
+    """
+    Patch or evict cached payloads affected by a webhook delivery, and
+    refresh the issue body cache when one is given.
+    Returns the number of cache entries changed, or None for unsupported events.
+    """
+    if event not in SUPPORTED_EVENTS:
+        return None
+
+    owner = payload['repository']['owner']['login']
+    repo = payload['repository']['name']
+
+    if event == 'issues':
+        changed = _handle_issues(cache, owner, repo, payload, body_cache)
+    elif event == 'milestone':
+        changed = _handle_milestone(cache, owner, repo, payload)
+    elif event in ('create', 'delete'):
+        changed = _handle_ref(cache, owner, repo, event, payload)
+    else:
+        changed = _handle_push(cache, owner, repo, payload)
+
+    logger.info(f"Webhook {event}/{payload.get('action', '-')} for {owner}/{repo} changed {changed} cache entries")
+    return changed
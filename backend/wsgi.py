@@ -0,0 +1,4 @@
+from app import create_app
+
+# Entry point for production WSGI servers: gunicorn -c gunicorn.conf.py wsgi:app
+app = create_app()